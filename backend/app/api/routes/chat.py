@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from app.db.database import get_db
+from app.core.config import settings
 from app.core.security import get_current_active_user
 from app.models.models import User, Conversation, Message, Citation
 from app.schemas.schemas import (
@@ -14,7 +15,7 @@ router = APIRouter()
 
 
 @router.post("/", response_model=ChatResponse)
-async def chat(
+def chat(
     request: ChatRequest,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -49,7 +50,11 @@ async def chat(
         db.flush()  # Flush to get the ID without committing
         
         # Generate response using RAG
-        rag_result = rag_service.chat(db, current_user.id, request.message)
+        rag_result = rag_service.chat(
+            db, current_user.id, request.message,
+            mmr_lambda=request.mmr_lambda,
+            duplicate_threshold=request.duplicate_threshold
+        )
         
         # Save assistant message
         assistant_message = Message(
@@ -163,7 +168,7 @@ async def delete_conversation(
 
 
 @router.post("/search", response_model=List[SearchResult])
-async def search_documents(
+def search_documents(
     request: SearchRequest,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -171,9 +176,18 @@ async def search_documents(
     """Search through user's documents"""
     
     # Search using RAG service
-    similar_chunks = rag_service.search_similar_chunks(
-        db, request.query, current_user.id, request.limit
-    )
+    if request.mmr_lambda is None and request.duplicate_threshold is None:
+        similar_chunks = rag_service.search_similar_chunks(
+            db, request.query, current_user.id, request.limit
+        )
+    else:
+        candidates = rag_service.search_similar_chunks(
+            db, request.query, current_user.id, max(request.limit, settings.MMR_CANDIDATES)
+        )
+        similar_chunks = rag_service.diversify(
+            db, request.query, current_user.id, candidates, request.limit,
+            request.mmr_lambda, request.duplicate_threshold
+        )
     
     # Convert to SearchResult format
     results = []
@@ -1,10 +1,9 @@
 import os
 import uuid
-import json
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from pathlib import Path
 try:
     import PyPDF2
@@ -16,67 +15,25 @@ except ImportError:
     DocxDocument = None
 from app.db.database import get_db
 from app.core.security import get_current_active_user
-from app.models.models import User, Document, DocumentChunk, ChunkEmbedding
+from app.models.models import User, Document
 from app.schemas.schemas import Document as DocumentSchema, DocumentCreate
-from app.services.document_service import document_processor
+from app.services.corpus_version import bump_corpus_version
+from app.services.job_queue import job_queue
+from app.services.keyword_index import keyword_index
+from app.services.vector_index import vector_index
 from app.core.config import settings
+from app.utils.hashing import bytes_hash
 
 router = APIRouter()
 
 
-def process_document_background(document_id: int, file_path: str, file_type: str, db: Session):
-    """Background task to process document"""
-    try:
-        # Process the document
-        result = document_processor.process_document(file_path, file_type)
-        
-        # Update document status
-        document = db.query(Document).filter(Document.id == document_id).first()
-        
-        if result['success']:
-            # Save chunks and embeddings
-            for chunk_data in result['chunks']:
-                # Create chunk
-                chunk = DocumentChunk(
-                    document_id=document_id,
-                    content=chunk_data['content'],
-                    chunk_index=chunk_data['chunk_index'],
-                    doc_metadata=chunk_data['metadata']
-                )
-                db.add(chunk)
-                db.flush()  # Get the chunk ID
-                
-                # Create embedding
-                embedding = ChunkEmbedding(
-                    chunk_id=chunk.id,
-                    embedding=json.dumps(chunk_data['embedding'])
-                )
-                db.add(embedding)
-            
-            document.status = "completed"
-        else:
-            document.status = "failed"
-        
-        db.commit()
-        
-    except Exception as e:
-        # Update document status to failed
-        document = db.query(Document).filter(Document.id == document_id).first()
-        if document:
-            document.status = "failed"
-            db.commit()
-
+async def save_upload(file: UploadFile, db: Session, user_id: int) -> Tuple[str, str, str]:
+    """Validate and store an uploaded file; returns ``(file_path, file_type, content_hash)``
 
-@router.post("/upload", response_model=DocumentSchema)
-async def upload_document(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    title: str = Form(...),
-    description: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    """Upload a new document"""
+    Every document gets a path of its own, so deleting one never removes
+    another's file. Content the user already uploaded is hard-linked rather
+    than written again.
+    """
     
     # Validate file type
     if file.content_type not in ["application/pdf", "text/plain", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
@@ -86,27 +43,67 @@ async def upload_document(
     if file.size > settings.MAX_FILE_SIZE:
         raise HTTPException(status_code=400, detail="File too large")
     
-    # Generate unique filename
+    # Determine file type
     file_extension = Path(file.filename).suffix.lower()
+    file_type_mapping = {
+        ".pdf": "pdf",
+        ".txt": "txt",
+        ".md": "md",
+        ".docx": "docx"
+    }
+    file_type = file_type_mapping.get(file_extension, "unknown")
+    
+    content = await file.read()
+    content_hash = bytes_hash(content)
+    
+    # Generate unique filename
     unique_filename = f"{uuid.uuid4()}{file_extension}"
     file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
     
     # Ensure upload directory exists
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     
+    # Identical content is stored once on disk
+    existing = db.query(Document).filter(
+        Document.user_id == user_id,
+        Document.content_hash == content_hash,
+        Document.file_type == file_type
+    ).first()
+    if existing:
+        try:
+            os.link(existing.file_path, file_path)
+            return file_path, file_type, content_hash
+        except OSError:
+            pass  # Deleted meanwhile, or the filesystem has no hard links
+    
     # Save file
     with open(file_path, "wb") as buffer:
-        content = await file.read()
         buffer.write(content)
     
-    # Determine file type
-    file_type_mapping = {
-        ".pdf": "pdf",
-        ".txt": "txt",
-        ".md": "md",
-        ".docx": "docx"
-    }
-    file_type = file_type_mapping.get(file_extension, "unknown")
+    return file_path, file_type, content_hash
+
+
+def remove_unreferenced_file(db: Session, file_path: str):
+    """Delete a stored file once no document points at it any more (older uploads may share paths)"""
+    if db.query(Document).filter(Document.file_path == file_path).first():
+        return
+    try:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    except Exception:
+        pass  # Continue even if file deletion fails
+
+
+@router.post("/upload", response_model=DocumentSchema)
+async def upload_document(
+    file: UploadFile = File(...),
+    title: str = Form(...),
+    description: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Upload a new document"""
+    file_path, file_type, content_hash = await save_upload(file, db, current_user.id)
     
     # Create document record
     document = Document(
@@ -117,15 +114,56 @@ async def upload_document(
         file_path=file_path,
         file_type=file_type,
         file_size=file.size,
-        status="processing"
+        status="processing",
+        content_hash=content_hash
     )
     
     db.add(document)
+    db.flush()  # Get the document ID
+    
+    # Queue it for the ingestion workers; committed together with the document.
+    # A file identical to a processed document reuses its chunks and embeddings
+    job_queue.enqueue(db, document.id)
+    db.commit()
+    db.refresh(document)
+    
+    return document
+
+
+@router.put("/{document_id}/file", response_model=DocumentSchema)
+async def replace_document_file(
+    document_id: int,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Upload a new version of a document; only chunks that changed are re-embedded"""
+    document = db.query(Document).filter(
+        Document.id == document_id,
+        Document.user_id == current_user.id
+    ).first()
+    
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    file_path, file_type, content_hash = await save_upload(file, db, current_user.id)
+    if content_hash == document.content_hash and document.status == "completed":
+        os.remove(file_path)
+        return document
+    
+    old_file_path = document.file_path
+    document.filename = file.filename
+    document.file_path = file_path
+    document.file_type = file_type
+    document.file_size = file.size
+    document.content_hash = content_hash
+    document.status = "processing"
+    job_queue.enqueue(db, document.id)
     db.commit()
     db.refresh(document)
     
-    # Process document in background
-    background_tasks.add_task(process_document_background, document.id, file_path, file_type, db)
+    if old_file_path != file_path:
+        remove_unreferenced_file(db, old_file_path)
     
     return document
 
@@ -178,17 +216,21 @@ async def delete_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Delete file from filesystem
-    try:
-        if os.path.exists(document.file_path):
-            os.remove(document.file_path)
-    except Exception:
-        pass  # Continue even if file deletion fails
-    
     # Delete from database (cascades to chunks and embeddings)
+    file_path = document.file_path
     db.delete(document)
     db.commit()
     
+    # Delete file from filesystem, unless an identical upload shares it
+    remove_unreferenced_file(db, file_path)
+    
+    vector_index.remove_document(current_user.id, document_id)
+    keyword_index.remove_document(current_user.id, document_id)
+    version = bump_corpus_version(db, current_user.id)
+    db.commit()
+    keyword_index.advance_version(current_user.id, version)
+    vector_index.advance_version(current_user.id, version)
+    
     return {"message": "Document deleted successfully"}
 
 
@@ -24,9 +24,72 @@ class Settings(BaseSettings):
     # AI/ML Settings
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     LLM_MODEL_PATH: str = "models/llama-3-8b-instruct"
-    MAX_CHUNK_SIZE: int = 512
-    CHUNK_OVERLAP: int = 50
+    QA_MODEL: str = "distilbert-base-uncased-distilled-squad"
+    EXPLANATION_MODEL: str = "microsoft/DialoGPT-small"
+    INFERENCE_BACKEND: str = "torch"  # "torch" or "onnx" (ONNX Runtime, see requirements-onnx.txt) for the embedding and QA models
+    ONNX_QUANTIZE: bool = True  # Dynamic int8 quantization of exported ONNX models
+    ONNX_CACHE_DIR: Optional[str] = None  # Exported models; defaults to "onnx_models" next to UPLOAD_DIR
+    ONNX_THREADS: int = 0  # ONNX Runtime intra-op threads; 0 lets it decide
+    MODEL_IDLE_TIMEOUT_SECONDS: int = 0  # Unload idle models after this long; 0 keeps them loaded
+    EXPLANATION_MODEL_IDLE_TIMEOUT_SECONDS: int = 300
+    MODEL_LOAD_RETRY_SECONDS: int = 300  # Wait before retrying a model that failed to load
+    MICROBATCH_ENABLED: bool = True  # Batch concurrent query embeddings and QA calls
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0  # Longest a query waits for others to join its batch
+    QA_BATCH_MAX_SIZE: int = 8
+    QA_BATCH_MAX_WAIT_MS: float = 10.0
+    INGEST_EMBEDDING_WORKERS: int = 1  # Processes embedding uploaded documents, each with its own model copy, per ingestion worker; 0 = one per core, 1 = in-process
+    INGEST_EMBEDDING_BATCH_SIZE: int = 64  # Chunk texts per worker task
+    INGEST_CHUNK_BATCH_SIZE: int = 512  # Chunks embedded and written per step; bounds ingestion memory
+    INGEST_TORCH_THREADS: int = 0  # Intra-op threads per worker; 0 = cores / workers
+    EMBEDDING_CACHE_ENABLED: bool = True  # Reuse chunk embeddings of identical text across documents and users
+    EMBEDDING_CACHE_MAX_ROWS: int = 1_000_000  # Stored embeddings; least recently used are evicted beyond this
+    EMBEDDING_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024  # In-process LRU in front of the embedding_cache table
+    PDF_EXTRACTION_WORKERS: int = 2  # Processes extracting large PDFs, per ingestion worker; 0 = one per core, 1 = in-process
+    PDF_PARALLEL_MIN_PAGES: int = 100  # Smaller PDFs are extracted in-process
+    PDF_PAGES_PER_TASK: int = 25  # Pages per worker task
+    INGESTION_WORKERS: int = 1  # Queue worker processes; 0 = one worker thread inside the API process
+    INGESTION_WORKERS_IN_API: bool = True  # Start the workers with the API; False when run via app.services.ingestion_worker
+    INGESTION_POLL_INTERVAL_SECONDS: float = 1.0  # Idle workers check the queue this often
+    INGESTION_VISIBILITY_TIMEOUT_SECONDS: int = 300  # A claimed job returns to the queue if its lease is not extended
+    INGESTION_MAX_ATTEMPTS: int = 5  # Then the document is marked failed
+    INGESTION_RETRY_BASE_SECONDS: float = 10.0  # Backoff doubles after each failed attempt
+    INGESTION_RETRY_MAX_SECONDS: float = 600.0
+    WARMUP_ON_STARTUP: bool = True  # Load and exercise models in the background; /ready reports progress
+    MAX_CHUNK_TOKENS: int = 256  # Embedding tokenizer tokens per chunk; all-MiniLM-L6-v2 truncates at 256
+    CHUNK_OVERLAP_TOKENS: int = 32  # Tokens of the previous chunk repeated at the start of the next
     VECTOR_DIMENSION: int = 384  # Dimension for all-MiniLM-L6-v2
+    SIMILARITY_THRESHOLD: float = 0.2  # Minimum cosine similarity for dense search hits
+    VECTOR_DATA_DIR: Optional[str] = None  # Embedding shards; defaults to "vector_data" next to UPLOAD_DIR
+    VECTOR_SHARD_COMPACTION_RATIO: float = 0.3  # Rewrite a shard once this share of rows is deleted
+    VECTOR_INDEX_TYPE: str = "flat"  # "flat" (exact search) or "ivf" (approximate)
+    ANN_MIN_ROWS: int = 20000  # Users with fewer chunks always get exact, unquantized search
+    IVF_NLIST: int = 0  # Number of IVF lists; 0 picks 4 * sqrt(rows)
+    IVF_NPROBE: int = 16  # Lists scanned per query; higher is slower but more accurate
+    IVF_RETRAIN_GROWTH: float = 4.0  # Retrain centroids/quantizers once a shard grows this much
+    VECTOR_QUANTIZATION: str = "none"  # "none", "int8" (4x smaller) or "pq" (product quantization)
+    PQ_SUBSPACES: int = 48  # PQ code bytes per vector; must divide VECTOR_DIMENSION
+    RESCORE_CANDIDATES: int = 100  # Quantized hits re-scored with exact float32 vectors
+    KEYWORD_SEARCH_BACKEND: str = "bm25"  # "bm25" (in-process index) or "database" (tsvector / FTS5)
+    HYBRID_FUSION: str = "rrf"  # "rrf" (reciprocal rank fusion) or "weighted" (normalized scores)
+    HYBRID_RRF_K: int = 60
+    HYBRID_DENSE_WEIGHT: float = 0.5  # Lexical leg gets 1 - HYBRID_DENSE_WEIGHT
+    HYBRID_CANDIDATES: int = 20  # Results requested from each leg before fusion
+    DENSE_LEG_TIMEOUT_MS: int = 1500
+    LEXICAL_LEG_TIMEOUT_MS: int = 1000
+    RETRIEVAL_WORKERS: int = 8  # Threads shared by all concurrent retrieval legs
+    QUERY_CACHE_MAX_BYTES: int = 16 * 1024 * 1024  # Query embedding cache size
+    QUERY_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_MAX_BYTES_PER_USER: int = 2 * 1024 * 1024  # Cached /chat results per user
+    ANSWER_CACHE_MAX_USERS: int = 1000  # Least recently active users are evicted first
+    ANSWER_CACHE_TTL_SECONDS: int = 24 * 3600
+    RERANK_ENABLED: bool = False  # Rerank chat candidates with a cross-encoder
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 20  # First-stage hits scored by the cross-encoder
+    RERANK_BUDGET_MS: int = 300  # Keep first-stage order if reranking takes longer
+    MMR_LAMBDA: float = 0.7  # 1.0 ranks purely by relevance, lower values favour diverse chunks
+    DUPLICATE_SIMILARITY_THRESHOLD: float = 0.9  # Drop chunks at least this similar to a selected one
+    MMR_CANDIDATES: int = 20  # Retrieved chunks considered for diversification
 
     # File upload settings
     MAX_FILE_SIZE: int = 50000000  # 50MB
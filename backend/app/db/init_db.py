@@ -1,6 +1,7 @@
 from sqlalchemy import text
 from app.db.database import engine
 from app.models.models import Base
+from app.db.migrations import run_migrations
 
 
 def init_db():
@@ -16,6 +17,7 @@ def init_db():
 
     # Create all tables
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     print("Database tables created successfully!")
 
 
@@ -0,0 +1,169 @@
+"""Lightweight, idempotent schema migrations run by ``init_db``.
+
+``Base.metadata.create_all`` only creates missing tables, so columns added to
+existing tables and data conversions live here.
+"""
+import json
+from sqlalchemy import inspect, text, Integer, LargeBinary, String
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+from app.utils.embeddings import encode_embedding
+from app.utils.hashing import text_hash
+
+
+def add_column_if_missing(engine: Engine, table: str, column: str, column_type) -> bool:
+    """Add a nullable column to an existing table; returns True if it was added"""
+    columns = {col["name"] for col in inspect(engine).get_columns(table)}
+    if column in columns:
+        return False
+    ddl_type = column_type.compile(dialect=engine.dialect)
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    return True
+
+
+def migrate_embeddings_to_binary(engine: Engine, batch_size: int = 1000) -> int:
+    """Convert JSON-encoded rows in ``chunk_embeddings.embedding`` to binary float32"""
+    add_column_if_missing(engine, "chunk_embeddings", "embedding_vector", LargeBinary())
+
+    converted = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text("""
+                SELECT id, embedding
+                FROM chunk_embeddings
+                WHERE id > :last_id
+                AND embedding_vector IS NULL
+                AND embedding IS NOT NULL
+                ORDER BY id
+                LIMIT :batch_size
+            """), {"last_id": last_id, "batch_size": batch_size}).fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                try:
+                    blob = encode_embedding(json.loads(row.embedding))
+                except (ValueError, TypeError) as e:
+                    print(f"⚠️ Skipping unreadable embedding {row.id}: {e}")
+                    continue
+                updates.append({"id": row.id, "vector": blob})
+
+            if updates:
+                connection.execute(text("""
+                    UPDATE chunk_embeddings
+                    SET embedding_vector = :vector, embedding = NULL
+                    WHERE id = :id
+                """), updates)
+            converted += len(updates)
+            last_id = rows[-1].id
+
+    return converted
+
+
+def add_content_hashes(engine: Engine, batch_size: int = 1000) -> int:
+    """Add the content hash columns and hash chunks stored before they existed"""
+    for table in ("documents", "document_chunks"):
+        add_column_if_missing(engine, table, "content_hash", String(64))
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_content_hash ON {table} (content_hash)"
+            ))
+
+    hashed = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text("""
+                SELECT id, content
+                FROM document_chunks
+                WHERE id > :last_id
+                AND content_hash IS NULL
+                ORDER BY id
+                LIMIT :batch_size
+            """), {"last_id": last_id, "batch_size": batch_size}).fetchall()
+            if not rows:
+                break
+            connection.execute(text("UPDATE document_chunks SET content_hash = :hash WHERE id = :id"),
+                               [{"id": row.id, "hash": text_hash(row.content)} for row in rows])
+            hashed += len(rows)
+            last_id = rows[-1].id
+
+    return hashed
+
+
+def create_fulltext_index(engine: Engine):
+    """Full-text index on ``document_chunks.content`` for the "database" keyword backend.
+
+    Postgres gets a generated ``tsvector`` column with a GIN index; SQLite gets
+    an external-content FTS5 table kept in sync by triggers.
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.execute(text("""
+                ALTER TABLE document_chunks
+                ADD COLUMN IF NOT EXISTS content_tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED
+            """))
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_document_chunks_content_tsv
+                ON document_chunks USING GIN (content_tsv)
+            """))
+    elif engine.dialect.name == "sqlite":
+        exists = "document_chunks_fts" in inspect(engine).get_table_names()
+        with engine.begin() as connection:
+            connection.execute(text("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks_fts USING fts5(
+                    content,
+                    content='document_chunks',
+                    content_rowid='id',
+                    tokenize='porter unicode61'
+                )
+            """))
+            connection.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS document_chunks_fts_ai AFTER INSERT ON document_chunks BEGIN
+                    INSERT INTO document_chunks_fts(rowid, content) VALUES (new.id, new.content);
+                END
+            """))
+            connection.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS document_chunks_fts_ad AFTER DELETE ON document_chunks BEGIN
+                    INSERT INTO document_chunks_fts(document_chunks_fts, rowid, content)
+                    VALUES ('delete', old.id, old.content);
+                END
+            """))
+            connection.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS document_chunks_fts_au AFTER UPDATE ON document_chunks BEGIN
+                    INSERT INTO document_chunks_fts(document_chunks_fts, rowid, content)
+                    VALUES ('delete', old.id, old.content);
+                    INSERT INTO document_chunks_fts(rowid, content) VALUES (new.id, new.content);
+                END
+            """))
+            if not exists:
+                # Index the chunks that were stored before the table existed
+                connection.execute(text("INSERT INTO document_chunks_fts(document_chunks_fts) VALUES ('rebuild')"))
+    else:
+        print(f"⚠️ No full-text index support for {engine.dialect.name}")
+
+
+def run_migrations(engine: Engine):
+    """Apply all pending migrations"""
+    add_column_if_missing(engine, "users", "corpus_version", Integer())
+    add_column_if_missing(engine, "documents", "corpus_version", Integer())
+
+    converted = migrate_embeddings_to_binary(engine)
+    if converted:
+        print(f"✅ Converted {converted} embeddings to binary float32")
+
+    hashed = add_content_hashes(engine)
+    if hashed:
+        print(f"✅ Hashed {hashed} existing chunks")
+
+    if settings.KEYWORD_SEARCH_BACKEND == "database":
+        create_fulltext_index(engine)
+
+
+if __name__ == "__main__":
+    from app.db.database import engine
+    run_migrations(engine)
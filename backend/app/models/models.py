@@ -16,6 +16,7 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     full_name = Column(String)
     is_active = Column(Boolean, default=True)
+    corpus_version = Column(Integer, default=0)  # Bumped whenever the user's searchable documents change
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -36,6 +37,8 @@ class Document(Base):
     file_type = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)
     status = Column(String, default="processing")  # processing, completed, failed
+    content_hash = Column(String(64), index=True)  # SHA-256 of the file; identical uploads share chunks
+    corpus_version = Column(Integer)  # User's corpus version when last published; indexes reload only newer documents
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -43,6 +46,26 @@ class Document(Base):
     owner = relationship("User", back_populates="documents")
     chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
     citations = relationship("Citation", back_populates="document", cascade="all, delete-orphan")
+    jobs = relationship("IngestionJob", back_populates="document", cascade="all, delete-orphan")
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    status = Column(String, default="queued", index=True)  # queued, running, succeeded, failed
+    attempts = Column(Integer, default=0)
+    # Scheduling times are epoch seconds so they compare the same way on every database
+    available_at = Column(Float, nullable=False)  # Earliest time the job may be (re)claimed
+    locked_by = Column(String)  # "<hostname>:<pid>" of the worker running the job
+    locked_until = Column(Float)  # Visibility timeout; other workers may claim the job afterwards
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relationships
+    document = relationship("Document", back_populates="jobs")
 
 
 class DocumentChunk(Base):
@@ -51,8 +74,11 @@ class DocumentChunk(Base):
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
     content = Column(Text, nullable=False)
+    # Negative (minus the id) for a chunk a new version replaced but a citation still points at;
+    # such retired chunks keep their content and are never searched
     chunk_index = Column(Integer, nullable=False)
     doc_metadata = Column(Text)  # JSON string containing metadata
+    content_hash = Column(String(64), index=True)  # SHA-256 of content; unchanged chunks keep their embedding
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -67,13 +93,26 @@ class ChunkEmbedding(Base):
     id = Column(Integer, primary_key=True, index=True)
     chunk_id = Column(Integer, ForeignKey("document_chunks.id"), nullable=False)
     # embedding = Column(Vector(settings.VECTOR_DIMENSION))  # Commented out for now
-    embedding = Column(Text)  # Store as JSON text for now
+    embedding = Column(Text)  # Legacy JSON encoding, migrated to embedding_vector
+    embedding_vector = Column(LargeBinary)  # Little-endian float32, see app.utils.embeddings
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     chunk = relationship("DocumentChunk", back_populates="embedding")
 
 
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    # SHA-256 of the model and the normalized text, so entries are shared across documents and users
+    cache_key = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    embedding_vector = Column(LargeBinary, nullable=False)  # Little-endian float32, see app.utils.embeddings
+    hits = Column(Integer, default=0, nullable=False)
+    last_used_at = Column(Float, nullable=False, index=True)  # Epoch seconds; least recently used rows are evicted
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class Conversation(Base):
     __tablename__ = "conversations"
 
@@ -149,6 +149,8 @@ class TokenData(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     conversation_id: Optional[int] = None
+    mmr_lambda: Optional[float] = Field(None, ge=0, le=1)
+    duplicate_threshold: Optional[float] = Field(None, ge=0, le=1)
 
 
 class ChatResponse(BaseModel):
@@ -162,6 +164,9 @@ class ChatResponse(BaseModel):
 class SearchRequest(BaseModel):
     query: str
     limit: int = 10
+    # Results are only diversified when either of these is given
+    mmr_lambda: Optional[float] = Field(None, ge=0, le=1)
+    duplicate_threshold: Optional[float] = Field(None, ge=0, le=1)
 
 
 class SearchResult(BaseModel):
@@ -0,0 +1,170 @@
+"""Approximate nearest neighbour search with an inverted-file (IVF) index.
+
+Vectors are assigned to the nearest of ``nlist`` centroids found with
+spherical k-means. A query only scores the rows of its ``nprobe`` closest
+lists, which turns an O(n) scan into roughly O(n * nprobe / nlist).
+
+The index stores row numbers into an embedding matrix (an embedding shard
+generation) rather than the vectors themselves, so it adds 4 bytes per row.
+"""
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.utils.vectors import normalize_rows, top_k
+
+
+def default_nlist(rows: int) -> int:
+    """Rule-of-thumb list count: about 4 * sqrt(n), at least 1"""
+    return max(1, int(4 * np.sqrt(rows)))
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    k: int,
+    iterations: int = 10,
+    seed: int = 0
+) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity and return normalized centroids"""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = min(k, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], size=k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        # Per-cluster sums via one sort + reduceat (much faster than np.add.at)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=k)
+        present = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts[present])[:-1]])
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(vectors[order], starts, axis=0)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters with random points
+            sums[empty] = vectors[rng.choice(vectors.shape[0], size=int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over the rows of an embedding matrix"""
+
+    def __init__(self, dimension: int, nlist: int):
+        self.dimension = dimension
+        self.nlist = nlist
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.trained_rows = 0
+        self.generation: Optional[int] = None
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def size(self) -> int:
+        return self.assignments.shape[0]
+
+    def train(self, vectors: np.ndarray, iterations: int = 10, sample_size: int = None, seed: int = 0):
+        """Learn the coarse quantizer from (a sample of) ``vectors``"""
+        rows = vectors.shape[0]
+        if sample_size is None:
+            sample_size = min(rows, self.nlist * 32)
+        rng = np.random.default_rng(seed)
+        if sample_size < rows:
+            sample = np.asarray(vectors[np.sort(rng.choice(rows, size=sample_size, replace=False))])
+        else:
+            sample = np.asarray(vectors)
+        self.centroids = spherical_kmeans(normalize_rows(sample), self.nlist, iterations, seed)
+        self.nlist = self.centroids.shape[0]
+        self.trained_rows = rows
+
+    def assign(self, vectors: np.ndarray, block: int = 16384) -> np.ndarray:
+        """Nearest centroid for each row, computed in blocks to bound memory"""
+        assignments = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], block):
+            chunk = np.asarray(vectors[start:start + block], dtype=np.float32)
+            assignments[start:start + block] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignments
+
+    def add(self, vectors: np.ndarray):
+        """Append rows; they get the next row numbers after the current size"""
+        if vectors.shape[0] == 0:
+            return
+        self.assignments = np.concatenate([self.assignments, self.assign(vectors)])
+        self._lists = None
+
+    def reset(self, vectors: np.ndarray):
+        """Re-assign every row, keeping the trained centroids"""
+        self.assignments = self.assign(vectors)
+        self._lists = None
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        lists = self._lists
+        if lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            offsets = np.searchsorted(self.assignments[order], np.arange(self.nlist + 1))
+            lists = self._lists = (order, offsets)
+        return lists
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Row numbers stored in the ``nprobe`` lists closest to ``query``"""
+        order, offsets = self._inverted_lists()
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([order[offsets[p]:offsets[p + 1]] for p in probes])
+
+    def search(
+        self,
+        matrix: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        nprobe: int,
+        alive: np.ndarray = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(rows, scores)`` of the approximate top-k rows of ``matrix``"""
+        query = normalize_rows(query)[0]
+        rows = self.candidates(query, nprobe)
+        # Rows appended after ``matrix`` was snapshotted are not visible to this search
+        rows = rows[rows < matrix.shape[0]]
+        if alive is not None:
+            rows = rows[alive[rows]]
+        if rows.size == 0:
+            return rows, np.empty(0, dtype=np.float32)
+        rows.sort()  # sequential access pattern for memory-mapped matrices
+        scores = np.asarray(matrix[rows]) @ query
+        best = top_k(scores, k)
+        return rows[best], scores[best]
+
+    def save(self, path: str):
+        """Persist atomically next to the shard it indexes"""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            assignments=self.assignments,
+            trained_rows=np.int64(self.trained_rows),
+            generation=np.int64(-1 if self.generation is None else self.generation),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IVFIndex"]:
+        try:
+            with np.load(path) as data:
+                centroids = data["centroids"]
+                index = cls(centroids.shape[1], centroids.shape[0])
+                index.centroids = centroids
+                index.assignments = data["assignments"].astype(np.int32, copy=False)
+                index.trained_rows = int(data["trained_rows"])
+                generation = int(data["generation"])
+                index.generation = None if generation < 0 else generation
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+        return index
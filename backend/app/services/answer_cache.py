@@ -0,0 +1,94 @@
+"""Cache of ``/chat`` results that can never serve answers from an old corpus.
+
+Every user has a ``corpus_version`` counter in the database (see
+``app.services.corpus_version``) that is bumped once a document finishes
+processing or is deleted, after the search indexes have been updated.
+Cached results are keyed by (user_id, normalized query,
+corpus version), so a bump makes all of the user's earlier entries
+unreachable in every worker process; the local entries are dropped as soon
+as the new version is seen.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.cache import LRUCache
+
+
+class AnswerCache:
+    """Per-user LRU caches of chat results, plus an LRU over the users themselves"""
+
+    def __init__(self, max_bytes_per_user: int, max_users: int, ttl_seconds: Optional[float] = None):
+        self.max_bytes_per_user = max_bytes_per_user
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        # user_id -> (corpus version, that user's entries)
+        self._users: "OrderedDict[int, Tuple[int, LRUCache]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _user_cache(self, user_id: int, version: int, create: bool) -> Optional[LRUCache]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] == version:
+                self._users.move_to_end(user_id)
+                return entry[1]
+            if entry is not None and entry[0] > version:
+                # A request that read the version before a concurrent bump
+                return None
+            if not create:
+                if entry is not None:
+                    # Corpus changed: nothing cached for the old version can be used again
+                    del self._users[user_id]
+                return None
+            cache = LRUCache(self.max_bytes_per_user, self.ttl_seconds)
+            self._users[user_id] = (version, cache)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return cache
+
+    def get(self, user_id: int, query: str, version: int) -> Optional[Dict[str, Any]]:
+        cache = self._user_cache(user_id, version, create=False)
+        result = cache.get(query) if cache is not None else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def set(self, user_id: int, query: str, version: int, result: Dict[str, Any]):
+        cache = self._user_cache(user_id, version, create=True)
+        if cache is not None:
+            cache.set(query, result)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            caches = [cache for _, cache in self._users.values()]
+            hits, misses = self.hits, self.misses
+        return {
+            "users": len(caches),
+            "entries": sum(len(cache) for cache in caches),
+            "bytes": sum(cache.size_bytes for cache in caches),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+# Global instance
+answer_cache = AnswerCache(
+    max_bytes_per_user=settings.ANSWER_CACHE_MAX_BYTES_PER_USER,
+    max_users=settings.ANSWER_CACHE_MAX_USERS,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,129 @@
+"""Dynamic micro-batching in front of the shared models.
+
+Concurrent requests each need a single-item forward pass (one query
+embedding, one QA span), which uses a CPU's matrix units poorly. A
+``MicroBatcher`` queues those items and a worker thread runs them as one
+batch once ``max_batch`` items are waiting or the oldest has waited
+``max_wait_ms``. Every caller gets its own result back through a future.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Every batcher in the process, for metrics
+batchers: Dict[str, "MicroBatcher"] = {}
+
+
+class MicroBatcher:
+    """Groups single items into batched calls of ``process``"""
+
+    def __init__(
+        self,
+        name: str,
+        process: Callable[[List[Any]], List[Any]],
+        max_batch: int,
+        max_wait_ms: float,
+        enabled: bool = True
+    ):
+        self.name = name
+        self.process = process
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.enabled = enabled and self.max_batch > 1
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.retried_batches = 0  # Failed batches whose items were retried one at a time
+        self.max_queue_depth = 0
+        self.busy_seconds = 0.0
+        batchers[name] = self
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item; the future resolves to its result"""
+        future: Future = Future()
+        if not self.enabled:
+            self._run([(item, future)])
+            return future
+        self._ensure_worker()
+        self._queue.put((item, future))
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return future
+
+    def __call__(self, item: Any, timeout: Optional[float] = None) -> Any:
+        return self.submit(item).result(timeout=timeout)
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._loop, name=f"batch-{self.name}", daemon=True)
+                    self._worker.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run(batch)
+
+    def _run(self, batch: List[Tuple[Any, Future]]):
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.monotonic()
+        error = self._settle(batch)
+        if error is not None and len(batch) > 1:
+            # Retry one at a time, so one bad item does not fail the requests batched with it
+            self.retried_batches += 1
+            for item, future in batch:
+                item_error = self._settle([(item, future)])
+                if item_error is not None:
+                    future.set_exception(item_error)
+        elif error is not None:
+            batch[0][1].set_exception(error)
+        self.busy_seconds += time.monotonic() - started
+        self.batches += 1
+        self.items += len(batch)
+
+    def _settle(self, batch: List[Tuple[Any, Future]]) -> Optional[Exception]:
+        """Resolve the batch's futures from one ``process`` call, or return its error untouched"""
+        try:
+            results = self.process([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name} batch of {len(batch)} items returned {len(results)} results")
+        except Exception as e:
+            return e
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "retried_batches": self.retried_batches,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+def batching_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: batcher.stats() for name, batcher in batchers.items()}
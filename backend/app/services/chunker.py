@@ -0,0 +1,211 @@
+"""Token-aware, streaming text chunker.
+
+Chunks are sized in tokens of the embedding model's tokenizer, so the model
+never silently truncates one. Text arrives in sections (PDF pages, text file
+blocks). Sentence spans are found with precompiled regexes and every complete
+sentence of a section is tokenized in one batch call of the fast tokenizer,
+whose character offsets are then used for all sizing and splitting: sentences
+longer than a chunk are cut at word boundaries, and a chunk repeats up to
+``overlap`` tokens of the previous one, starting at a word. Chunk text is
+assembled once, by joining sentence slices.
+"""
+import re
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.services.model_registry import embedding_max_seq_length, model_registry
+
+SENTENCE = re.compile(r'[^.!?]+(?:[.!?]+|$)')
+WHITESPACE = re.compile(r'\s+')
+SPECIAL_CHARACTERS = re.compile(r'[^\w\s.,!?;:()\-\'"]')
+# Word pieces of at most 4 characters, so the estimate errs high: WordPiece splits rare words and numbers
+APPROXIMATE_TOKEN = re.compile(r'\w{1,4}|[^\w\s]')
+SPECIAL_TOKENS = 2  # [CLS] and [SEP], added by the embedding model to every input
+UNBOUNDED_LENGTH = 1_000_000  # Tokenizers without a configured limit report a huge model_max_length
+
+_warned_limits = set()
+_warned_lock = threading.Lock()
+
+Offsets = Sequence[Tuple[int, int]]
+TokenOffsets = Callable[[List[str]], List[Offsets]]
+
+
+def approximate_token_offsets(texts: List[str]) -> List[Offsets]:
+    """Short word pieces and punctuation; a stand-in when the model tokenizer is unavailable"""
+    return [[match.span() for match in APPROXIMATE_TOKEN.finditer(text)] for text in texts]
+
+
+def embedding_token_offsets(texts: List[str]) -> List[Offsets]:
+    """Character offsets of each text's tokens under the embedding model's tokenizer"""
+    tokenizer = model_registry.try_get("tokenizer")
+    if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+        return approximate_token_offsets(texts)
+    return tokenizer(
+        texts,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+        verbose=False
+    )["offset_mapping"]
+
+
+def model_token_limit() -> Optional[int]:
+    """Longest input, special tokens included, the embedding model reads in full; None if unknown.
+
+    The model's ``max_seq_length`` (256 for all-MiniLM-L6-v2) can be below its
+    tokenizer's ``model_max_length`` (512), so the tokenizer is only the fallback.
+    """
+    limit = embedding_max_seq_length()
+    if limit:
+        return limit
+    limit = getattr(model_registry.try_get("tokenizer"), "model_max_length", None)
+    return limit if isinstance(limit, int) and 0 < limit < UNBOUNDED_LENGTH else None
+
+
+def clamp_to_model(max_tokens: int) -> int:
+    """``max_tokens``, reduced to the model's limit so no chunk is truncated when embedded"""
+    limit = model_token_limit()
+    if limit is None or max_tokens <= limit:
+        return max_tokens
+    with _warned_lock:
+        if (max_tokens, limit) not in _warned_limits:
+            _warned_limits.add((max_tokens, limit))
+            print(f"⚠️ Chunk size of {max_tokens} tokens exceeds the embedding model's limit; using {limit}")
+    return limit
+
+
+class _Piece(NamedTuple):
+    """Tokens ``[first, last)`` of a sentence"""
+    sentence: str
+    offsets: Offsets
+    first: int
+    last: int
+    page: Optional[int]
+
+    @property
+    def tokens(self) -> int:
+        return self.last - self.first
+
+    @property
+    def text(self) -> str:
+        return self.sentence[self.offsets[self.first][0]:self.offsets[self.last - 1][1]]
+
+    @property
+    def ends_sentence(self) -> bool:
+        return self.last == len(self.offsets)
+
+
+def _starts_word(offsets: Offsets, token: int) -> bool:
+    # Sub-word tokens continue right where the previous token ended
+    return token == 0 or offsets[token][0] > offsets[token - 1][1]
+
+
+class TokenChunker:
+    """Splits streamed ``(page, text)`` sections into token-budgeted chunks"""
+
+    def __init__(self, max_tokens: int, overlap_tokens: int, token_offsets: TokenOffsets = embedding_token_offsets):
+        self.budget = max(clamp_to_model(max_tokens) - SPECIAL_TOKENS, 1)
+        self.overlap = min(max(overlap_tokens, 0), self.budget // 2)
+        self.token_offsets = token_offsets
+        # An unpunctuated run this long is chunked without waiting for its end
+        self.max_pending_chars = self.budget * 16
+
+    def iter_chunks(self, sections: Iterable[Tuple[Optional[int], str]]) -> Iterator[Dict[str, Any]]:
+        pieces: List[_Piece] = []
+        tokens = 0
+        chunk_index = 0
+        pending, pending_page = "", None
+        boundary_space = False
+
+        def add(sentences: List[str], pages: List[Optional[int]]) -> Iterator[Dict[str, Any]]:
+            nonlocal pieces, tokens, chunk_index
+            for sentence, offsets, page in zip(sentences, self.token_offsets(sentences), pages):
+                for piece in self._split(sentence, offsets, page):
+                    if pieces and tokens + piece.tokens > self.budget:
+                        yield self._chunk(pieces, tokens, chunk_index)
+                        chunk_index += 1
+                        pieces = self._overlap_tail(pieces)
+                        tokens = sum(overlap_piece.tokens for overlap_piece in pieces)
+                        if tokens + piece.tokens > self.budget:
+                            pieces, tokens = [], 0
+                    pieces.append(piece)
+                    tokens += piece.tokens
+
+        for page, raw_text in sections:
+            cleaned = SPECIAL_CHARACTERS.sub(' ', raw_text)
+            text = WHITESPACE.sub(' ', cleaned).strip()
+            if not text:
+                boundary_space = boundary_space or bool(cleaned)
+                continue
+            first_page = page
+            if pending:
+                # Sections may split a word, e.g. text file blocks
+                text = pending + (" " if boundary_space or cleaned[0].isspace() else "") + text
+                first_page = pending_page
+            boundary_space = cleaned[-1].isspace()
+
+            sentences = [text[start + (text[start] == ' '):end] for start, end in
+                         (match.span() for match in SENTENCE.finditer(text))]
+            # The last sentence (or its terminator run) may continue in the next section
+            pending = sentences.pop() if sentences else ""
+            if len(pending) > self.max_pending_chars:
+                # Keep only the last, possibly unfinished, word waiting
+                cut = pending.rfind(' ') + 1
+                if cut:
+                    sentences.append(pending[:cut].rstrip())
+                    pending = pending[cut:]
+            pending_page = first_page if not sentences else page
+            pages = [first_page] + [page] * (len(sentences) - 1)
+            yield from add(sentences, pages)
+
+        if pending:
+            yield from add([pending], [pending_page])
+        if pieces:
+            yield self._chunk(pieces, tokens, chunk_index)
+
+    def _split(self, sentence: str, offsets: Offsets, page: Optional[int]) -> Iterator[_Piece]:
+        """The sentence as one piece, or several word-aligned pieces if it exceeds the budget"""
+        first, count = 0, len(offsets)
+        while count - first > self.budget:
+            cut = first + self.budget
+            while cut > first and not _starts_word(offsets, cut):
+                cut -= 1
+            if cut == first:
+                # A single word longer than the budget
+                cut = first + self.budget
+            yield _Piece(sentence, offsets, first, cut, page)
+            first = cut
+        if count > first:
+            yield _Piece(sentence, offsets, first, count, page)
+
+    def _overlap_tail(self, pieces: List[_Piece]) -> List[_Piece]:
+        """The last ``overlap`` tokens of a chunk, starting at a word boundary"""
+        tail: List[_Piece] = []
+        remaining = self.overlap
+        for piece in reversed(pieces):
+            if piece.tokens <= remaining:
+                tail.append(piece)
+                remaining -= piece.tokens
+                continue
+            start = piece.last - remaining
+            while start < piece.last and not _starts_word(piece.offsets, start):
+                start += 1
+            if start < piece.last:
+                tail.append(piece._replace(first=start))
+            break
+        tail.reverse()
+        return tail
+
+    def _chunk(self, pieces: List[_Piece], tokens: int, chunk_index: int) -> Dict[str, Any]:
+        content = " ".join(piece.text for piece in pieces)
+        sentences = sum(1 for piece in pieces if piece.ends_sentence)
+        # Fixed keys and integer values: formatting is much cheaper than json.dumps
+        metadata = f'{{"length": {len(content)}, "tokens": {tokens}, "sentences": {sentences}'
+        if pieces[0].page is not None:
+            metadata += f', "page_start": {pieces[0].page}, "page_end": {pieces[-1].page}'
+        return {
+            'content': content,
+            'chunk_index': chunk_index,
+            'metadata': metadata + '}'
+        }
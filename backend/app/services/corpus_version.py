@@ -0,0 +1,32 @@
+"""Per-user corpus version: a counter bumped whenever a user's searchable
+documents change (a document finished processing or was deleted).
+
+Anything derived from the corpus and held in process memory (cached
+answers, the BM25 index) records the version it was built from and can
+tell it is stale by comparing with the database, whichever process made
+the change.
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+def get_corpus_version(db: Session, user_id: int) -> int:
+    """Current corpus version of a user's documents"""
+    version = db.execute(
+        text("SELECT corpus_version FROM users WHERE id = :user_id"),
+        {'user_id': user_id}
+    ).scalar()
+    return version or 0
+
+
+def bump_corpus_version(db: Session, user_id: int) -> int:
+    """Mark a user's corpus as changed and return the new version; takes effect when the caller commits"""
+    version = db.execute(
+        text("""
+            UPDATE users SET corpus_version = COALESCE(corpus_version, 0) + 1
+            WHERE id = :user_id
+            RETURNING corpus_version
+        """),
+        {'user_id': user_id}
+    ).scalar()
+    return version or 0
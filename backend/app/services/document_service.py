@@ -1,185 +1,144 @@
 import os
 import uuid
-from typing import List, Dict, Any
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
-import PyPDF2
-import fitz  # PyMuPDF
-from docx import Document as DocxDocument
-from sentence_transformers import SentenceTransformer
-import json
-import re
+import numpy as np
 from app.core.config import settings
+from app.services.chunker import SPECIAL_CHARACTERS, WHITESPACE, TokenChunker
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_pool import embedding_pool
+from app.services.model_registry import model_registry
+from app.services.pdf_extraction import pdf_extraction_pool
+
+TEXT_BLOCK_SIZE = 1024 * 1024  # Characters read from a text file at a time
 
 
 class DocumentProcessor:
-    def __init__(self):
-        self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
-        
-    def extract_text_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file"""
+    @property
+    def embedding_model(self):
+        """Sentence embedding model shared through the model registry"""
+        return model_registry.get("embedding")
+
+    def iter_pdf_pages(self, file_path: str) -> Iterator[Tuple[int, str]]:
+        """Yield ``(page_number, text)`` for each PDF page, a page range in memory at a time"""
         try:
-            # Try PyMuPDF first (better OCR support)
-            doc = fitz.open(file_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            
-            if text.strip():
-                return text
-            
-            # Fallback to PyPDF2
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-            
-            return text
+            # PyMuPDF first (better OCR support), PyPDF2 for the pages it finds no text on;
+            # large PDFs are extracted on several processes
+            yield from pdf_extraction_pool.iter_pages(file_path)
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
 
-    def extract_text_from_docx(self, file_path: str) -> str:
-        """Extract text from DOCX file"""
+    def iter_docx_paragraphs(self, file_path: str) -> Iterator[Tuple[Optional[int], str]]:
+        """Yield the paragraphs of a DOCX file (DOCX has no fixed pages)"""
+        from docx import Document as DocxDocument
         try:
             doc = DocxDocument(file_path)
-            text = ""
             for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+                yield None, paragraph.text + "\n"
         except Exception as e:
             raise Exception(f"Error extracting text from DOCX: {str(e)}")
 
-    def extract_text_from_txt(self, file_path: str) -> str:
-        """Extract text from TXT file"""
+    def _text_encoding(self, file_path: str) -> str:
+        """UTF-8 if the whole file decodes as UTF-8, else latin-1"""
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+                while file.read(TEXT_BLOCK_SIZE):
+                    pass
+            return 'utf-8'
         except UnicodeDecodeError:
-            # Try different encodings
-            try:
-                with open(file_path, 'r', encoding='latin-1') as file:
-                    return file.read()
-            except Exception as e:
-                raise Exception(f"Error reading text file: {str(e)}")
+            return 'latin-1'
+
+    def iter_txt_blocks(self, file_path: str) -> Iterator[Tuple[Optional[int], str]]:
+        """Yield a text file in fixed-size blocks"""
+        try:
+            encoding = self._text_encoding(file_path)
+            with open(file_path, 'r', encoding=encoding) as file:
+                while True:
+                    block = file.read(TEXT_BLOCK_SIZE)
+                    if not block:
+                        return
+                    yield None, block
         except Exception as e:
             raise Exception(f"Error extracting text from TXT: {str(e)}")
 
-    def extract_text(self, file_path: str, file_type: str) -> str:
-        """Extract text based on file type"""
+    def iter_sections(self, file_path: str, file_type: str) -> Iterator[Tuple[Optional[int], str]]:
+        """Stream ``(page_number, text)`` sections based on file type; page is None if unknown"""
         if file_type.lower() == 'pdf':
-            return self.extract_text_from_pdf(file_path)
+            return self.iter_pdf_pages(file_path)
         elif file_type.lower() == 'docx':
-            return self.extract_text_from_docx(file_path)
+            return self.iter_docx_paragraphs(file_path)
         elif file_type.lower() in ['txt', 'md']:
-            return self.extract_text_from_txt(file_path)
+            return self.iter_txt_blocks(file_path)
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
 
+    def extract_text(self, file_path: str, file_type: str) -> str:
+        """Extract the whole text based on file type"""
+        return "".join(text for _, text in self.iter_sections(file_path, file_type))
+
     def preprocess_text(self, text: str) -> str:
         """Clean and preprocess text"""
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        # Remove special characters but keep punctuation
-        text = re.sub(r'[^\w\s.,!?;:()\-\'"]', ' ', text)
-        # Remove extra spaces
-        text = ' '.join(text.split())
-        return text.strip()
+        # Remove special characters but keep punctuation, then collapse whitespace
+        text = SPECIAL_CHARACTERS.sub(' ', text)
+        return WHITESPACE.sub(' ', text).strip()
+
+    def iter_chunks(
+        self,
+        sections: Iterable[Tuple[Optional[int], str]],
+        chunk_size: int = None,
+        overlap: int = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Split streamed sections into chunks of at most ``chunk_size`` embedding tokens"""
+        if chunk_size is None:
+            chunk_size = settings.MAX_CHUNK_TOKENS
+        if overlap is None:
+            overlap = settings.CHUNK_OVERLAP_TOKENS
+        return TokenChunker(chunk_size, overlap).iter_chunks(sections)
+
+    def iter_chunk_batches(
+        self,
+        sections: Iterable[Tuple[Optional[int], str]],
+        batch_size: int = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """``iter_chunks`` in lists of at most ``batch_size`` chunks"""
+        chunks = self.iter_chunks(sections)
+        batch_size = batch_size or settings.INGEST_CHUNK_BATCH_SIZE
+        while True:
+            batch = list(islice(chunks, batch_size))
+            if not batch:
+                return
+            yield batch
 
     def chunk_text(self, text: str, chunk_size: int = None, overlap: int = None) -> List[Dict[str, Any]]:
         """Split text into chunks with overlap"""
-        if chunk_size is None:
-            chunk_size = settings.MAX_CHUNK_SIZE
-        if overlap is None:
-            overlap = settings.CHUNK_OVERLAP
-
-        # Clean text
-        text = self.preprocess_text(text)
-        
-        # Split by sentences first
-        sentences = re.split(r'[.!?]+', text)
-        chunks = []
-        current_chunk = ""
-        chunk_index = 0
-
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
-                
-            # Check if adding this sentence would exceed chunk size
-            if len(current_chunk) + len(sentence) + 1 > chunk_size:
-                if current_chunk:
-                    chunks.append({
-                        'content': current_chunk.strip(),
-                        'chunk_index': chunk_index,
-                        'metadata': json.dumps({
-                            'length': len(current_chunk),
-                            'sentences': current_chunk.count('.') + current_chunk.count('!') + current_chunk.count('?')
-                        })
-                    })
-                    chunk_index += 1
-                    
-                    # Start new chunk with overlap
-                    if overlap > 0 and len(current_chunk) > overlap:
-                        current_chunk = current_chunk[-overlap:] + " " + sentence
-                    else:
-                        current_chunk = sentence
-                else:
-                    current_chunk = sentence
-            else:
-                current_chunk = current_chunk + " " + sentence if current_chunk else sentence
-
-        # Add the last chunk
-        if current_chunk.strip():
-            chunks.append({
-                'content': current_chunk.strip(),
-                'chunk_index': chunk_index,
-                'metadata': json.dumps({
-                    'length': len(current_chunk),
-                    'sentences': current_chunk.count('.') + current_chunk.count('!') + current_chunk.count('?')
-                })
-            })
-
-        return chunks
-
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts"""
+        return list(self.iter_chunks([(None, text)], chunk_size, overlap))
+
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Generate float32 embeddings for a list of texts, one row per text"""
         try:
-            embeddings = self.embedding_model.encode(texts)
-            return embeddings.tolist()
+            # Only texts the embedding cache has never seen reach the model
+            return embedding_cache.embed(texts, embedding_pool.encode)
         except Exception as e:
             raise Exception(f"Error generating embeddings: {str(e)}")
 
     def process_document(self, file_path: str, file_type: str) -> Dict[str, Any]:
         """Complete document processing pipeline"""
         try:
-            # Extract text
-            text = self.extract_text(file_path, file_type)
-            
-            if not text.strip():
-                raise ValueError("No text could be extracted from the document")
-
-            # Create chunks
-            chunks = self.chunk_text(text)
+            # Extract, chunk and embed a batch at a time; the whole text is never held in memory
+            chunks = []
+            for batch in self.iter_chunk_batches(self.iter_sections(file_path, file_type)):
+                for chunk, embedding in zip(batch, self.generate_embeddings([c['content'] for c in batch])):
+                    chunk['embedding'] = embedding
+                chunks.extend(batch)
             
             if not chunks:
-                raise ValueError("No chunks could be created from the document")
-
-            # Generate embeddings
-            chunk_texts = [chunk['content'] for chunk in chunks]
-            embeddings = self.generate_embeddings(chunk_texts)
-
-            # Combine chunks with embeddings
-            for i, chunk in enumerate(chunks):
-                chunk['embedding'] = embeddings[i]
+                raise ValueError("No text could be extracted from the document")
 
             return {
                 'success': True,
-                'text': text,
                 'chunks': chunks,
-                'total_chunks': len(chunks),
-                'total_characters': len(text)
+                'total_chunks': len(chunks)
             }
 
         except Exception as e:
@@ -0,0 +1,213 @@
+"""Content-addressed store of chunk embeddings, shared by all documents and users.
+
+Boilerplate such as headers, disclaimers and standard clauses recurs across
+many documents. Each embedding is stored under the SHA-256 of the model
+identity and the whitespace-normalized text, so a text embedded once is never
+sent to the model again. Lookups go through an in-process LRU first, then the
+``embedding_cache`` table; only the remaining misses are batched into the
+model. The table is bounded by ``EMBEDDING_CACHE_MAX_ROWS`` and loses its least
+recently used rows first; its size is checked only after each process has
+stored a slack's worth of new rows, from the planner's estimate on PostgreSQL.
+
+The store is an optimization only: if the database is unavailable or busy,
+texts are embedded as if nothing had been cached.
+"""
+import threading
+import time
+import unicodedata
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.services.chunker import WHITESPACE
+from app.utils.cache import LRUCache
+from app.utils.embeddings import decode_embedding, encode_embedding
+from app.utils.hashing import text_hash
+
+LOOKUP_BATCH = 500  # Keys per IN (...) lookup
+EVICTION_SLACK = 0.1  # Share of MAX_ROWS evicted beyond the excess, and stored between size checks
+
+
+def embedding_model_id() -> str:
+    """Identifies the vectors the configured model produces; quantized ONNX output differs slightly"""
+    if settings.INFERENCE_BACKEND == "onnx":
+        return f"{settings.EMBEDDING_MODEL}|onnx{'-int8' if settings.ONNX_QUANTIZE else ''}"
+    return f"{settings.EMBEDDING_MODEL}|{settings.INFERENCE_BACKEND}"
+
+
+def normalize_text(content: str) -> str:
+    """Texts equal after this normalization get the same embedding"""
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFC", content)).strip()
+
+
+class EmbeddingCache:
+    """Returns stored embeddings and encodes only the texts never seen before"""
+
+    def __init__(self, max_rows: int, memory_bytes: int, enabled: bool = True):
+        self.max_rows = max_rows
+        self.enabled = enabled
+        self.memory = LRUCache(max_bytes=memory_bytes)
+        self._lock = threading.Lock()
+        # Rows this process stored since the table size was last checked; check on the first store
+        self._unchecked_rows = self.eviction_slack
+        self.lookups = 0
+        self.memory_hits = 0
+        self.stored_hits = 0
+        self.misses = 0
+
+    @property
+    def eviction_slack(self) -> int:
+        return max(int(self.max_rows * EVICTION_SLACK), 1)
+
+    def key(self, content: str, model: str = None) -> str:
+        return text_hash(f"{model or embedding_model_id()}\n{normalize_text(content)}")
+
+    def embed(self, texts: Sequence[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Embeddings for ``texts`` in order; ``encode`` is called once, with the misses only"""
+        if not self.enabled or not texts:
+            return np.asarray(encode(list(texts)), dtype=np.float32)
+
+        model = embedding_model_id()
+        keys = [self.key(content, model) for content in texts]
+        first_text = {}
+        for key, content in zip(keys, texts):
+            first_text.setdefault(key, content)
+
+        vectors: Dict[str, np.ndarray] = {}
+        for key in first_text:
+            vector = self.memory.get(key)
+            if vector is not None:
+                vectors[key] = vector
+        memory_hits = len(vectors)
+
+        stored = self._load([key for key in first_text if key not in vectors], used=list(vectors))
+        for key, vector in stored.items():
+            vectors[key] = vector
+            self.memory.set(key, vector)
+
+        missing = [key for key in first_text if key not in vectors]
+        if missing:
+            encoded = np.asarray(encode([first_text[key] for key in missing]), dtype=np.float32)
+            for key, row in zip(missing, encoded):
+                # Copy, so a cached row does not keep the whole batch alive
+                vectors[key] = row.copy()
+                self.memory.set(key, vectors[key])
+            self._store(model, {key: vectors[key] for key in missing})
+
+        with self._lock:
+            self.lookups += len(first_text)
+            self.memory_hits += memory_hits
+            self.stored_hits += len(stored)
+            self.misses += len(missing)
+        return np.stack([vectors[key] for key in keys])
+
+    def _load(self, keys: List[str], used: List[str]) -> Dict[str, np.ndarray]:
+        """Stored embeddings for ``keys``; these and the ``used`` memory hits are marked recently used"""
+        if not keys and not used:
+            return {}
+        query = text("SELECT cache_key, embedding_vector FROM embedding_cache WHERE cache_key IN :keys") \
+            .bindparams(bindparam('keys', expanding=True))
+        found = {}
+        db = SessionLocal()
+        try:
+            for start in range(0, len(keys), LOOKUP_BATCH):
+                for row in db.execute(query, {'keys': keys[start:start + LOOKUP_BATCH]}):
+                    found[row.cache_key] = decode_embedding(row.embedding_vector)
+            if found or used:
+                now = time.time()
+                db.execute(text("""
+                    UPDATE embedding_cache SET hits = hits + 1, last_used_at = :now
+                    WHERE cache_key = :cache_key
+                """), [{'cache_key': key, 'now': now} for key in [*used, *found]])
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Embedding cache lookup failed: {e}")
+        finally:
+            db.close()
+        return found
+
+    def _store(self, model: str, vectors: Dict[str, np.ndarray]):
+        now = time.time()
+        db = SessionLocal()
+        try:
+            # Another worker may have stored the same text meanwhile
+            inserted = db.execute(text("""
+                INSERT INTO embedding_cache (cache_key, model, embedding_vector, hits, last_used_at)
+                VALUES (:cache_key, :model, :embedding_vector, 0, :now)
+                ON CONFLICT (cache_key) DO NOTHING
+            """), [
+                {'cache_key': key, 'model': model, 'embedding_vector': encode_embedding(vector), 'now': now}
+                for key, vector in vectors.items()
+            ])
+            with self._lock:
+                self._unchecked_rows += max(inserted.rowcount, 0)
+                check = self._unchecked_rows >= self.eviction_slack
+                if check:
+                    self._unchecked_rows = 0
+            if check:
+                self._evict(db)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Embedding cache write failed: {e}")
+        finally:
+            db.close()
+
+    def _evict(self, db: Session):
+        """Delete the least recently used rows once the table is over its limit"""
+        rows = self._row_count(db)
+        if rows <= self.max_rows:
+            return
+        excess = rows - self.max_rows + self.eviction_slack
+        db.execute(text("""
+            DELETE FROM embedding_cache WHERE cache_key IN (
+                SELECT cache_key FROM embedding_cache ORDER BY last_used_at LIMIT :excess
+            )
+        """), {'excess': excess})
+        print(f"🔄 Evicted {excess} least recently used embeddings from the cache")
+
+    def _row_count(self, db: Session) -> int:
+        """Rows in the table; PostgreSQL's statistics estimate avoids scanning it"""
+        if db.get_bind().dialect.name == "postgresql":
+            estimate = db.execute(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass('embedding_cache')"
+            )).scalar()
+            # -1 until the table is first vacuumed or analyzed
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        return int(db.execute(text("SELECT COUNT(*) FROM embedding_cache")).scalar())
+
+    def stats(self) -> dict:
+        """Hit rate of this process's lookups of distinct texts; a hit needs no call to the model"""
+        with self._lock:
+            hits = self.memory_hits + self.stored_hits
+            return {
+                "enabled": self.enabled,
+                "lookups": self.lookups,
+                "memory_hits": self.memory_hits,
+                "stored_hits": self.stored_hits,
+                "misses": self.misses,
+                "hit_rate": hits / (hits + self.misses) if hits + self.misses else 0.0,
+                "memory": self.memory.stats(),
+            }
+
+    def stored_stats(self, db: Session) -> dict:
+        """Size of the shared table, estimated on PostgreSQL so a metrics scrape never scans it;
+        hit rates are per process, see ``stats``"""
+        return {
+            "entries": self._row_count(db),
+            "max_entries": self.max_rows,
+        }
+
+
+# Global instance
+embedding_cache = EmbeddingCache(
+    max_rows=settings.EMBEDDING_CACHE_MAX_ROWS,
+    memory_bytes=settings.EMBEDDING_CACHE_MEMORY_BYTES,
+    enabled=settings.EMBEDDING_CACHE_ENABLED
+)
@@ -0,0 +1,123 @@
+"""Process pool that spreads ingestion-time embedding over every core.
+
+A large document is split into batches of ``INGEST_EMBEDDING_BATCH_SIZE``
+chunk texts which are encoded in parallel by ``INGEST_EMBEDDING_WORKERS``
+processes. Each worker loads the embedding model once, when it starts, and
+caps its intra-op threads so the workers together do not oversubscribe the
+CPU. Workers are spawned rather than forked: forking a process that already
+runs threads (uvicorn, the batchers) can deadlock inside torch.
+
+Every worker holds its own copy of the model, and every ingestion worker
+process (``INGESTION_WORKERS``) has its own pool, so up to
+``INGESTION_WORKERS * INGEST_EMBEDDING_WORKERS`` copies are loaded at once.
+The default of 1 embeds in-process; raise it only where memory allows.
+"""
+import contextlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+_environment_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _worker_environment(threads: int):
+    """Environment inherited by workers spawned meanwhile.
+
+    BLAS libraries read their thread counts when numpy / torch are first
+    imported, which in a spawned child happens before any initializer runs,
+    so the variables must already be set when the process starts. The
+    executor spawns workers while tasks are submitted.
+    """
+    variables = {variable: str(threads) for variable in THREAD_VARIABLES}
+    variables["TOKENIZERS_PARALLELISM"] = "false"
+    with _environment_lock:
+        previous = {variable: os.environ.get(variable) for variable in variables}
+        os.environ.update(variables)
+        try:
+            yield
+        finally:
+            for variable, value in previous.items():
+                if value is None:
+                    os.environ.pop(variable, None)
+                else:
+                    os.environ[variable] = value
+
+
+def _initialize_worker(threads: int):
+    settings.ONNX_THREADS = threads
+    if settings.INFERENCE_BACKEND == "torch":
+        import torch
+        torch.set_num_threads(threads)
+
+    from app.services.model_registry import model_registry
+    model_registry.get("embedding")
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    from app.services.model_registry import model_registry
+    model = model_registry.get("embedding")
+    return np.asarray(model.encode(texts, batch_size=len(texts)), dtype=np.float32)
+
+
+class EmbeddingPool:
+    """Encodes chunk texts in batches on a pool of worker processes"""
+
+    def __init__(self, workers: int = None, batch_size: int = None):
+        self.workers = (os.cpu_count() or 1) if workers == 0 else workers or 1
+        self.batch_size = batch_size or 64
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def threads_per_worker(self) -> int:
+        # Each ingestion worker process runs its own pool
+        processes = self.workers * max(settings.INGESTION_WORKERS, 1)
+        return settings.INGEST_TORCH_THREADS or max(1, (os.cpu_count() or 1) // processes)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_initialize_worker,
+                    initargs=(self.threads_per_worker,)
+                )
+            return self._executor
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embeddings for ``texts`` in order, one row per text"""
+        # Not worth the inter-process round trip for a single batch
+        if self.workers <= 1 or len(texts) <= self.batch_size:
+            return _encode_batch(texts)
+
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        try:
+            pool = self._pool()
+            with _worker_environment(self.threads_per_worker):
+                results = pool.map(_encode_batch, batches)
+            return np.concatenate(list(results))
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            print(f"⚠️ Embedding worker pool failed: {e}; embedding in-process")
+            self.shutdown()
+            return _encode_batch(texts)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Global instance
+embedding_pool = EmbeddingPool(settings.INGEST_EMBEDDING_WORKERS, settings.INGEST_EMBEDDING_BATCH_SIZE)
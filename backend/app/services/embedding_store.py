@@ -0,0 +1,348 @@
+"""Memory-mapped, append-only embedding shards on local disk.
+
+Every user gets one shard in ``vector_data_dir()``:
+
+    user_<id>.manifest       JSON {"generation": g, "dimension": d, "corpus_version": v}
+    user_<id>.<g>.f32        raw little-endian float32 rows, L2-normalized
+    user_<id>.<g>.ids        raw int64 (chunk_id, document_id) pairs, one per row
+    user_<id>.<g>.tomb       raw int64 row numbers that have been deleted
+    user_<id>.lock           writer lock shared by every process
+    user_<id>.<name>.npz     optional auxiliary indexes (IVF lists, quantized codes)
+
+Readers only ever ``np.memmap`` the files, so all uvicorn workers share the
+same page cache. Writers append under an exclusive ``flock``; deletions are
+tombstoned and a new generation is written once enough rows are dead.
+The manifest records the user's corpus version the rows reflect, so a
+reader can tell that a change made elsewhere has not reached the shard.
+"""
+import glob
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.vectors import normalize_rows
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+ID_DTYPE = np.dtype("<i8")
+VECTOR_DTYPE = np.dtype("<f4")
+
+# (chunk_ids, document_ids, vectors)
+EmbeddingBatch = Tuple[Sequence[int], Sequence[int], np.ndarray]
+
+
+def vector_data_dir() -> str:
+    """Directory holding the embedding shards, next to the upload directory by default"""
+    if settings.VECTOR_DATA_DIR:
+        return settings.VECTOR_DATA_DIR
+    upload_parent = os.path.dirname(os.path.abspath(settings.UPLOAD_DIR))
+    return os.path.join(upload_parent, "vector_data")
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+class ShardView:
+    """Read-only snapshot of a shard: memory-mapped rows plus a liveness mask"""
+
+    def __init__(self, generation: int, matrix: np.ndarray, chunk_ids: np.ndarray,
+                 document_ids: np.ndarray, alive: np.ndarray, corpus_version: int = 0):
+        self.generation = generation
+        self.corpus_version = corpus_version
+        self.matrix = matrix
+        self.chunk_ids = chunk_ids
+        self.document_ids = document_ids
+        self.alive = alive
+        self.all_alive = bool(alive.all())
+        self._lookup: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def rows(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def live_rows(self) -> int:
+        return int(self.alive.sum())
+
+    def rows_for(self, chunk_ids: Sequence[int]) -> np.ndarray:
+        """Live row number of each chunk id, or -1 for chunks not in the shard"""
+        if self._lookup is None:
+            live = np.flatnonzero(self.alive)
+            live_ids = np.asarray(self.chunk_ids[live])
+            order = np.argsort(live_ids, kind="stable")
+            self._lookup = (live_ids[order], live[order])
+        sorted_ids, rows = self._lookup
+        chunk_ids = np.asarray(chunk_ids, dtype=ID_DTYPE)
+        if sorted_ids.size == 0:
+            return np.full(chunk_ids.shape[0], -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(sorted_ids, chunk_ids), sorted_ids.size - 1)
+        return np.where(sorted_ids[positions] == chunk_ids, rows[positions], -1)
+
+
+class EmbeddingShard:
+    """On-disk embedding store for a single user"""
+
+    def __init__(self, directory: str, user_id: int, dimension: int):
+        self.directory = directory
+        self.user_id = user_id
+        self.dimension = dimension
+        self.base = os.path.join(directory, f"user_{user_id}")
+        self._thread_lock = threading.RLock()
+        self._signature = None
+        self._view: Optional[ShardView] = None
+
+    @property
+    def manifest_path(self) -> str:
+        return f"{self.base}.manifest"
+
+    @property
+    def lock_path(self) -> str:
+        return f"{self.base}.lock"
+
+    def auxiliary_path(self, name: str) -> str:
+        """Location of a derived index (e.g. "ivf", "int8") stored with the shard"""
+        return f"{self.base}.{name}.npz"
+
+    def _path(self, generation: int, extension: str) -> str:
+        return f"{self.base}.{generation}.{extension}"
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Exclusive writer lock across threads and processes"""
+        with self._thread_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.lock_path, "a+b") as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path, "r") as handle:
+                manifest = json.load(handle)
+        except (FileNotFoundError, ValueError):
+            return None
+        if manifest.get("dimension") != self.dimension:
+            # Written for another embedding model; treat as missing so it is rebuilt
+            return None
+        return manifest
+
+    def _write_manifest(self, generation: int, corpus_version: int):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump({"generation": generation, "dimension": self.dimension, "corpus_version": corpus_version},
+                      handle)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _row_count(self, generation: int) -> int:
+        vector_rows = _file_size(self._path(generation, "f32")) // (VECTOR_DTYPE.itemsize * self.dimension)
+        id_rows = _file_size(self._path(generation, "ids")) // (ID_DTYPE.itemsize * 2)
+        return min(vector_rows, id_rows)
+
+    def _read_ids(self, generation: int, rows: int) -> np.ndarray:
+        if rows == 0:
+            return np.empty((0, 2), dtype=ID_DTYPE)
+        return np.fromfile(self._path(generation, "ids"), dtype=ID_DTYPE, count=rows * 2).reshape(rows, 2)
+
+    def _read_tombstones(self, generation: int) -> np.ndarray:
+        path = self._path(generation, "tomb")
+        if not _file_size(path):
+            return np.empty(0, dtype=ID_DTYPE)
+        return np.fromfile(path, dtype=ID_DTYPE)
+
+    def _remove_generation(self, generation: int):
+        for extension in ("f32", "ids", "tomb"):
+            try:
+                os.remove(self._path(generation, extension))
+            except FileNotFoundError:
+                pass
+
+    def _write_generation(self, generation: int, batches: Iterable[EmbeddingBatch]) -> int:
+        rows = 0
+        with open(self._path(generation, "f32"), "wb") as vector_file, \
+                open(self._path(generation, "ids"), "wb") as id_file:
+            for chunk_ids, document_ids, vectors in batches:
+                if len(chunk_ids) == 0:
+                    continue
+                vector_file.write(normalize_rows(vectors).astype(VECTOR_DTYPE, copy=False).tobytes())
+                id_file.write(np.column_stack([chunk_ids, document_ids]).astype(ID_DTYPE).tobytes())
+                rows += len(chunk_ids)
+        open(self._path(generation, "tomb"), "wb").close()
+        return rows
+
+    def exists(self) -> bool:
+        return self._read_manifest() is not None
+
+    def build(self, batches: Iterable[EmbeddingBatch], replace: bool = False, corpus_version: int = 0) -> bool:
+        """Write a fresh generation from ``batches``, which reflect ``corpus_version``.
+
+        ``batches`` is only consumed while the writer lock is held, so a lazy
+        database query cannot race with concurrent appends. Unless ``replace``
+        is set, an existing shard is left untouched and False is returned.
+        """
+        with self._locked():
+            manifest = self._read_manifest()
+            if manifest is not None and not replace:
+                return False
+            old_generation = manifest["generation"] if manifest else None
+            generation = (old_generation or 0) + 1
+            self._write_generation(generation, batches)
+            self._write_manifest(generation, corpus_version)
+            if old_generation is not None:
+                self._remove_generation(old_generation)
+            return True
+
+    def _tombstone_document(self, generation: int, rows: int, document_id: int) -> int:
+        ids = self._read_ids(generation, rows)
+        tombstones = self._read_tombstones(generation)
+        doomed = np.setdiff1d(np.flatnonzero(ids[:, 1] == document_id), tombstones)
+        if doomed.size:
+            with open(self._path(generation, "tomb"), "ab") as handle:
+                handle.write(doomed.astype(ID_DTYPE).tobytes())
+        return int(doomed.size)
+
+    def append_document(self, document_id: int, chunk_ids: Sequence[int], vectors: np.ndarray) -> bool:
+        """Add (or replace) a document's rows; returns False if the shard does not exist"""
+        with self._locked():
+            manifest = self._read_manifest()
+            if manifest is None:
+                return False
+            generation = manifest["generation"]
+            rows = self._row_count(generation)
+            self._tombstone_document(generation, rows, document_id)
+
+            # Drop any partially written tail left behind by an interrupted append
+            vector_path = self._path(generation, "f32")
+            id_path = self._path(generation, "ids")
+            os.truncate(vector_path, rows * VECTOR_DTYPE.itemsize * self.dimension)
+            os.truncate(id_path, rows * ID_DTYPE.itemsize * 2)
+
+            if len(chunk_ids):
+                document_ids = np.full(len(chunk_ids), document_id, dtype=ID_DTYPE)
+                with open(vector_path, "ab") as handle:
+                    handle.write(normalize_rows(vectors).astype(VECTOR_DTYPE, copy=False).tobytes())
+                with open(id_path, "ab") as handle:
+                    handle.write(np.column_stack([chunk_ids, document_ids]).astype(ID_DTYPE).tobytes())
+            return True
+
+    def advance_corpus_version(self, version: int, expected: Optional[int] = None) -> bool:
+        """Record that the shard reflects ``version``: only if it is at ``expected`` when given,
+        otherwise if ``version`` is newer. Returns whether it was recorded."""
+        with self._locked():
+            manifest = self._read_manifest()
+            if manifest is None:
+                return False
+            current = manifest.get("corpus_version", 0)
+            if (current != expected) if expected is not None else (current >= version):
+                return False
+            self._write_manifest(manifest["generation"], version)
+            return True
+
+    def remove_document(self, document_id: int) -> int:
+        """Tombstone a document's rows, compacting when too many rows are dead"""
+        with self._locked():
+            manifest = self._read_manifest()
+            if manifest is None:
+                return 0
+            generation = manifest["generation"]
+            rows = self._row_count(generation)
+            removed = self._tombstone_document(generation, rows, document_id)
+            dead = np.unique(self._read_tombstones(generation)).size
+            if rows and dead / rows >= settings.VECTOR_SHARD_COMPACTION_RATIO:
+                self._compact(generation, rows)
+            return removed
+
+    def compact(self):
+        """Rewrite the shard without its tombstoned rows"""
+        with self._locked():
+            manifest = self._read_manifest()
+            if manifest is not None:
+                generation = manifest["generation"]
+                self._compact(generation, self._row_count(generation))
+
+    def _compact(self, generation: int, rows: int):
+        view = self._open(generation, rows, self._read_manifest().get("corpus_version", 0))
+        live_rows = np.flatnonzero(view.alive)
+        block = 8192
+
+        def live_batches() -> Iterator[EmbeddingBatch]:
+            for start in range(0, live_rows.size, block):
+                selected = live_rows[start:start + block]
+                yield view.chunk_ids[selected], view.document_ids[selected], view.matrix[selected]
+
+        new_generation = generation + 1
+        self._write_generation(new_generation, live_batches())
+        self._write_manifest(new_generation, view.corpus_version)
+        # Processes still holding the old memory maps keep reading the unlinked files
+        self._remove_generation(generation)
+
+    def destroy(self):
+        """Delete the shard so it is rebuilt from the database on next use"""
+        with self._locked():
+            manifest = self._read_manifest()
+            try:
+                os.remove(self.manifest_path)
+            except FileNotFoundError:
+                pass
+            if manifest is not None:
+                self._remove_generation(manifest["generation"])
+            for path in glob.glob(f"{glob.escape(self.base)}.*.npz"):
+                os.remove(path)
+            self._signature = None
+            self._view = None
+
+    def _open(self, generation: int, rows: int, corpus_version: int = 0) -> ShardView:
+        if rows == 0:
+            matrix = np.empty((0, self.dimension), dtype=VECTOR_DTYPE)
+            ids = np.empty((0, 2), dtype=ID_DTYPE)
+        else:
+            matrix = np.memmap(self._path(generation, "f32"), dtype=VECTOR_DTYPE, mode="r",
+                               shape=(rows, self.dimension))
+            ids = np.memmap(self._path(generation, "ids"), dtype=ID_DTYPE, mode="r", shape=(rows, 2))
+        alive = np.ones(rows, dtype=bool)
+        tombstones = self._read_tombstones(generation)
+        alive[tombstones[tombstones < rows]] = False
+        return ShardView(generation, matrix, ids[:, 0], ids[:, 1], alive, corpus_version)
+
+    def view(self) -> Optional[ShardView]:
+        """Current snapshot, re-mapped only when another writer changed the files"""
+        with self._thread_lock:
+            for _ in range(3):
+                manifest = self._read_manifest()
+                if manifest is None:
+                    return None
+                generation = manifest["generation"]
+                corpus_version = manifest.get("corpus_version", 0)
+                signature = (
+                    generation,
+                    corpus_version,
+                    _file_size(self._path(generation, "ids")),
+                    _file_size(self._path(generation, "f32")),
+                    _file_size(self._path(generation, "tomb")),
+                )
+                if signature == self._signature:
+                    return self._view
+                try:
+                    self._view = self._open(generation, self._row_count(generation), corpus_version)
+                except FileNotFoundError:
+                    # Compacted underneath us; read the new manifest and retry
+                    continue
+                self._signature = signature
+                return self._view
+            return None
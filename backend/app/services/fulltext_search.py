@@ -0,0 +1,66 @@
+"""Keyword search backed by the database's own full-text index.
+
+Uses the ``content_tsv`` column and GIN index on Postgres, ranked with
+``ts_rank_cd``, and the ``document_chunks_fts`` FTS5 table on SQLite, ranked
+with ``bm25()``. Both are created by ``app.db.migrations.create_fulltext_index``
+when ``KEYWORD_SEARCH_BACKEND`` is "database".
+"""
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.keyword_index import tokenize
+
+
+class FullTextSearch:
+    """Database-native alternative to the in-process ``KeywordIndex``"""
+
+    def search(self, db: Session, user_id: int, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """Return ``(chunk_id, rank)`` pairs, best first"""
+        # Tokens are plain alphanumerics, so they are safe to splice into a query expression
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            sql_query = text("""
+                SELECT
+                    dc.id as chunk_id,
+                    ts_rank_cd(dc.content_tsv, query) as rank
+                FROM document_chunks dc
+                JOIN documents d ON dc.document_id = d.id,
+                    to_tsquery('english', :terms) query
+                WHERE d.user_id = :user_id
+                AND d.status = 'completed'
+                AND dc.chunk_index >= 0
+                AND dc.content_tsv @@ query
+                ORDER BY rank DESC
+                LIMIT :limit
+            """)
+            params = {'terms': " | ".join(terms), 'user_id': user_id, 'limit': limit}
+        elif dialect == "sqlite":
+            sql_query = text("""
+                SELECT
+                    dc.id as chunk_id,
+                    -bm25(document_chunks_fts) as rank
+                FROM document_chunks_fts
+                JOIN document_chunks dc ON dc.id = document_chunks_fts.rowid
+                JOIN documents d ON dc.document_id = d.id
+                WHERE document_chunks_fts MATCH :terms
+                AND d.user_id = :user_id
+                AND d.status = 'completed'
+                AND dc.chunk_index >= 0
+                ORDER BY rank DESC
+                LIMIT :limit
+            """)
+            params = {'terms': " OR ".join(f'"{term}"' for term in terms), 'user_id': user_id, 'limit': limit}
+        else:
+            raise ValueError(f"Full-text search is not supported on {dialect}")
+
+        return [(row.chunk_id, float(row.rank)) for row in db.execute(sql_query, params)]
+
+
+# Global instance
+fulltext_search = FullTextSearch()
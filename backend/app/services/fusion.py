@@ -0,0 +1,41 @@
+"""Rank fusion for combining the results of independent retrieval legs.
+
+Every function takes ``{leg_name: [(chunk_id, score), ...]}`` with each list
+sorted best first, and returns one fused ``[(chunk_id, score), ...]`` list.
+"""
+from typing import Dict, List, Optional, Tuple
+
+ScoredChunks = List[Tuple[int, float]]
+
+
+def reciprocal_rank_fusion(
+    rankings: Dict[str, ScoredChunks],
+    k: int = 60,
+    weights: Optional[Dict[str, float]] = None
+) -> ScoredChunks:
+    """Sum of ``weight / (k + rank)`` over the legs that returned each chunk"""
+    fused: Dict[int, float] = {}
+    for leg, ranking in rankings.items():
+        weight = 1.0 if weights is None else weights.get(leg, 1.0)
+        for rank, (chunk_id, _) in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def weighted_score_fusion(
+    rankings: Dict[str, ScoredChunks],
+    weights: Optional[Dict[str, float]] = None
+) -> ScoredChunks:
+    """Weighted sum of each leg's scores after min-max normalization to [0, 1]"""
+    fused: Dict[int, float] = {}
+    for leg, ranking in rankings.items():
+        if not ranking:
+            continue
+        weight = 1.0 if weights is None else weights.get(leg, 1.0)
+        scores = [score for _, score in ranking]
+        low, high = min(scores), max(scores)
+        spread = high - low
+        for chunk_id, score in ranking:
+            normalized = (score - low) / spread if spread > 0 else 1.0
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + weight * normalized
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,285 @@
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import bindparam, insert, text
+from sqlalchemy.orm import Session
+
+from app.models.models import ChunkEmbedding, Document, DocumentChunk
+from app.services.corpus_version import bump_corpus_version
+from app.services.document_service import document_processor
+from app.services.keyword_index import keyword_index
+from app.services.vector_index import vector_index
+from app.utils.embeddings import encode_embedding, load_stored_embedding
+from app.utils.hashing import file_hash, text_hash
+
+HASH_LOOKUP_BATCH = 500  # Hashes per IN (...) lookup
+
+
+class IngestionError(Exception):
+    """Processing a document failed; the job queue decides whether to retry"""
+
+
+class IngestionService:
+    """Turns an uploaded document into searchable chunks and embeddings.
+
+    ``ingest_document`` is idempotent, so a job that is retried, or re-run
+    after its worker died, never duplicates chunks. Work already done is
+    reused through SHA-256 content hashes: a file identical to a processed
+    document gets a copy of its chunks, and when a document is reprocessed
+    only chunks whose text changed are rewritten and re-embedded.
+    """
+
+    def ingest_document(self, db: Session, document_id: int) -> bool:
+        """Process a document; returns False if there was nothing left to do"""
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if document is None:
+            # Deleted while queued
+            return False
+        if document.status == "completed":
+            # A previous attempt committed but may have died before updating the indexes
+            self._publish(db, document)
+            return False
+
+        if document.content_hash is None and os.path.exists(document.file_path):
+            document.content_hash = file_hash(document.file_path)
+
+        source_id = self._identical_document(db, document)
+        if source_id is not None and not self._has_chunks(db, document_id):
+            self._clone_chunks(db, source_id, document_id)
+        else:
+            self._write_chunks(db, document, self._extract_chunks(document))
+
+        # A new version uploaded meanwhile points the document at another file
+        completed = db.execute(text("""
+            UPDATE documents SET status = 'completed'
+            WHERE id = :document_id AND file_path = :file_path AND status = 'processing'
+        """), {'document_id': document_id, 'file_path': document.file_path})
+        if completed.rowcount != 1:
+            raise IngestionError("Document changed while it was being processed")
+        db.commit()
+        db.refresh(document)
+        self._publish(db, document)
+        return True
+
+    def _extract_chunks(self, document: Document) -> Iterator[List[dict]]:
+        """The document's chunks, hashed, in batches of ``INGEST_CHUNK_BATCH_SIZE``"""
+        batches = document_processor.iter_chunk_batches(
+            document_processor.iter_sections(document.file_path, document.file_type)
+        )
+        try:
+            for batch in batches:
+                for chunk_data in batch:
+                    chunk_data['content_hash'] = text_hash(chunk_data['content'])
+                yield batch
+        except Exception as e:
+            raise IngestionError(str(e)) from e
+
+    def _identical_document(self, db: Session, document: Document) -> Optional[int]:
+        """A processed document with the same file content, if there is one"""
+        if document.content_hash is None:
+            return None
+        return db.execute(text("""
+            SELECT id FROM documents
+            WHERE content_hash = :content_hash AND status = 'completed' AND id != :document_id
+            ORDER BY id
+            LIMIT 1
+        """), {'content_hash': document.content_hash, 'document_id': document.id}).scalar()
+
+    def _has_chunks(self, db: Session, document_id: int) -> bool:
+        return db.execute(text("""
+            SELECT 1 FROM document_chunks WHERE document_id = :document_id AND chunk_index >= 0 LIMIT 1
+        """), {'document_id': document_id}).first() is not None
+
+    def _clone_chunks(self, db: Session, source_id: int, document_id: int):
+        """Copy another document's chunks and embeddings inside the database"""
+        params = {'source_id': source_id, 'document_id': document_id}
+        db.execute(text("""
+            INSERT INTO document_chunks (document_id, content, chunk_index, doc_metadata, content_hash)
+            SELECT :document_id, content, chunk_index, doc_metadata, content_hash
+            FROM document_chunks
+            WHERE document_id = :source_id AND chunk_index >= 0
+        """), params)
+        db.execute(text("""
+            INSERT INTO chunk_embeddings (chunk_id, embedding_vector, embedding)
+            SELECT copy.id, ce.embedding_vector, ce.embedding
+            FROM document_chunks copy
+            JOIN document_chunks original
+                ON original.document_id = :source_id AND original.chunk_index = copy.chunk_index
+            JOIN chunk_embeddings ce ON ce.chunk_id = original.id
+            WHERE copy.document_id = :document_id
+        """), params)
+
+    def _write_chunks(self, db: Session, document: Document, batches: Iterable[List[dict]]):
+        """Bring the stored chunks in line with ``batches``, keeping rows whose content is unchanged.
+
+        Each batch is embedded, written and committed before the next is
+        extracted, so only one batch is held in memory. The document stays
+        "processing", hence unsearchable, until every batch is in; a retry
+        after a failure reuses the batches already stored through their hashes.
+        """
+        available = defaultdict(list)
+        rows = db.execute(text("""
+            SELECT id, chunk_index, doc_metadata, content_hash
+            FROM document_chunks
+            WHERE document_id = :document_id AND chunk_index >= 0
+            ORDER BY chunk_index
+        """), {'document_id': document.id}).fetchall()
+        for row in rows:
+            available[row.content_hash].append(row)
+
+        written = rewritten = 0
+        for chunks in batches:
+            new_chunks, moved = [], []
+            for chunk_data in chunks:
+                matches = available.get(chunk_data['content_hash'])
+                if not matches:
+                    new_chunks.append(chunk_data)
+                    continue
+                row = matches.pop(0)
+                if row.chunk_index != chunk_data['chunk_index'] or row.doc_metadata != chunk_data['metadata']:
+                    moved.append({'id': row.id, 'chunk_index': chunk_data['chunk_index'],
+                                  'doc_metadata': chunk_data['metadata']})
+
+            if new_chunks:
+                known = self._known_embeddings(db, document.user_id, [c['content_hash'] for c in new_chunks])
+                missing = [chunk_data for chunk_data in new_chunks if chunk_data['content_hash'] not in known]
+                if missing:
+                    try:
+                        embeddings = document_processor.generate_embeddings([c['content'] for c in missing])
+                    except Exception as e:
+                        raise IngestionError(str(e)) from e
+                    for chunk_data, embedding in zip(missing, embeddings):
+                        known[chunk_data['content_hash']] = embedding
+                for chunk_data in new_chunks:
+                    chunk_data['embedding'] = known[chunk_data['content_hash']]
+
+            # Write only after embedding: on SQLite the first write locks the database,
+            # and the embedding cache commits through its own connection
+            if moved:
+                db.execute(text("""
+                    UPDATE document_chunks SET chunk_index = :chunk_index, doc_metadata = :doc_metadata
+                    WHERE id = :id
+                """), moved)
+            self.insert_chunks(db, document.id, new_chunks)
+            db.commit()
+            written += len(chunks)
+            rewritten += len(new_chunks)
+
+        if not written:
+            raise IngestionError("No text could be extracted from the document")
+        stale = [row.id for remaining in available.values() for row in remaining]
+        self._delete_chunk_rows(db, stale)
+
+        if rows:
+            print(f"🔄 Document {document.id}: kept {len(rows) - len(stale)} chunks, "
+                  f"rewrote {rewritten}, removed {len(stale)}")
+
+    def _known_embeddings(self, db: Session, user_id: int, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Stored embeddings of the user's chunks with these content hashes, e.g. from an earlier version"""
+        query = text("""
+            SELECT dc.content_hash, ce.embedding_vector, ce.embedding
+            FROM document_chunks dc
+            JOIN documents d ON d.id = dc.document_id
+            JOIN chunk_embeddings ce ON ce.chunk_id = dc.id
+            WHERE d.user_id = :user_id AND dc.content_hash IN :hashes
+        """).bindparams(bindparam('hashes', expanding=True))
+        unique = list(dict.fromkeys(hashes))
+        known = {}
+        for start in range(0, len(unique), HASH_LOOKUP_BATCH):
+            rows = db.execute(query, {'user_id': user_id, 'hashes': unique[start:start + HASH_LOOKUP_BATCH]})
+            for row in rows:
+                if row.content_hash not in known:
+                    vector = load_stored_embedding(row.embedding_vector, row.embedding)
+                    if vector is not None:
+                        known[row.content_hash] = vector
+        return known
+
+    def insert_chunks(self, db: Session, document_id: int, chunks: Sequence[dict]) -> List[int]:
+        """Write a document's chunks and their embeddings in two bulk statements.
+
+        Chunk ids come back from ``INSERT ... RETURNING`` together with their
+        ``chunk_index``, so no per-chunk flush is needed and the rows can be sent
+        in multi-row batches. Nothing is committed here.
+        """
+        if not chunks:
+            return []
+        returned = db.execute(
+            insert(DocumentChunk).returning(DocumentChunk.chunk_index, DocumentChunk.id),
+            [
+                {
+                    'document_id': document_id,
+                    'content': chunk_data['content'],
+                    'chunk_index': chunk_data['chunk_index'],
+                    'doc_metadata': chunk_data['metadata'],
+                    'content_hash': chunk_data.get('content_hash') or text_hash(chunk_data['content']),
+                }
+                for chunk_data in chunks
+            ]
+        ).all()
+        # RETURNING order is not guaranteed for batched inserts; chunk_index is unique per document
+        ids_by_index = dict(returned)
+        chunk_ids = [ids_by_index[chunk_data['chunk_index']] for chunk_data in chunks]
+        db.execute(
+            insert(ChunkEmbedding),
+            [
+                {'chunk_id': chunk_id, 'embedding_vector': encode_embedding(chunk_data['embedding'])}
+                for chunk_id, chunk_data in zip(chunk_ids, chunks)
+            ]
+        )
+        return chunk_ids
+
+    def _delete_chunk_rows(self, db: Session, chunk_ids: Sequence[int]):
+        """Delete chunks with their embeddings.
+
+        Chunks cited by past answers are retired instead: they lose their
+        embedding and get a negative ``chunk_index``, so citations keep their
+        text while searches and later versions ignore them.
+        """
+        for start in range(0, len(chunk_ids), HASH_LOOKUP_BATCH):
+            params = {'chunk_ids': list(chunk_ids[start:start + HASH_LOOKUP_BATCH])}
+            for statement in (
+                "DELETE FROM chunk_embeddings WHERE chunk_id IN :chunk_ids",
+                """UPDATE document_chunks SET chunk_index = -id, content_hash = NULL
+                   WHERE id IN :chunk_ids AND id IN (SELECT chunk_id FROM citations)""",
+                """DELETE FROM document_chunks
+                   WHERE id IN :chunk_ids AND id NOT IN (SELECT chunk_id FROM citations)""",
+            ):
+                db.execute(text(statement).bindparams(bindparam('chunk_ids', expanding=True)), params)
+
+    def _delete_chunks(self, db: Session, document_id: int):
+        chunk_ids = db.execute(text("SELECT id FROM document_chunks WHERE document_id = :document_id"),
+                               {'document_id': document_id}).scalars().all()
+        self._delete_chunk_rows(db, chunk_ids)
+
+    def _publish(self, db: Session, document: Document):
+        """Make the document's committed chunks searchable, then bump the user's corpus version"""
+        rows = db.execute(text("""
+            SELECT dc.id, dc.content, ce.embedding_vector, ce.embedding
+            FROM document_chunks dc
+            JOIN chunk_embeddings ce ON ce.chunk_id = dc.id
+            WHERE dc.document_id = :document_id AND dc.chunk_index >= 0
+            ORDER BY dc.chunk_index
+        """), {'document_id': document.id}).fetchall()
+        rows = [(row, load_stored_embedding(row.embedding_vector, row.embedding)) for row in rows]
+        rows = [(row, vector) for row, vector in rows if vector is not None]
+        chunk_ids = [row.id for row, _ in rows]
+
+        # Replaces whatever the indexes held for the document before. In a worker
+        # process these are the worker's own indexes; the API process notices the
+        # version bump and loads the documents stamped with a newer version
+        if chunk_ids:
+            vector_index.add_document(document.user_id, document.id, chunk_ids, [vector for _, vector in rows])
+        keyword_index.add_document(document.user_id, document.id, [(row.id, row.content) for row, _ in rows])
+        # Only now can cached answers be invalidated without racing the index updates
+        version = bump_corpus_version(db, document.user_id)
+        db.execute(text("UPDATE documents SET corpus_version = :version WHERE id = :document_id"),
+                   {'version': version, 'document_id': document.id})
+        db.commit()
+        keyword_index.advance_version(document.user_id, version)
+        vector_index.advance_version(document.user_id, version)
+
+
+# Global instance
+ingestion_service = IngestionService()
@@ -0,0 +1,154 @@
+"""Ingestion worker processes that drain the durable job queue.
+
+Workers are started with the API (``INGESTION_WORKERS_IN_API``) or on their
+own, e.g. on dedicated machines:
+
+    python -m app.services.ingestion_worker --workers 4
+
+With ``INGESTION_WORKERS=0`` the API runs a single worker thread in-process
+instead of separate processes.
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+from typing import List, Optional
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.services.ingestion_service import ingestion_service
+from app.services.job_queue import ClaimedJob, job_queue, worker_name
+
+
+def _keep_lease(job: ClaimedJob, worker: str, done: threading.Event):
+    """Extend the job's visibility timeout until processing is done"""
+    interval = max(job_queue.visibility_timeout / 3, 1.0)
+    while not done.wait(interval):
+        db = SessionLocal()
+        try:
+            if not job_queue.extend_lease(db, job.id, worker):
+                return
+        except Exception as e:
+            print(f"⚠️ Could not extend lease of job {job.id}: {e}")
+        finally:
+            db.close()
+
+
+def process_next_job(worker: str) -> bool:
+    """Claim and run one job; returns False when the queue had nothing due"""
+    db = SessionLocal()
+    try:
+        job = job_queue.claim(db, worker)
+        if job is None:
+            job_queue.fail_exhausted(db)
+            return False
+
+        done = threading.Event()
+        threading.Thread(target=_keep_lease, args=(job, worker, done), daemon=True).start()
+        try:
+            ingestion_service.ingest_document(db, job.document_id)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Ingestion of document {job.document_id} failed (attempt {job.attempts}): {e}")
+            job_queue.fail(db, job, worker, str(e))
+        else:
+            job_queue.complete(db, job.id, worker)
+        finally:
+            done.set()
+        return True
+    finally:
+        db.close()
+
+
+def run_worker(poll_interval: float = None, stop: Optional[threading.Event] = None):
+    """Process jobs until ``stop`` is set (forever in a worker process)"""
+    poll_interval = poll_interval or settings.INGESTION_POLL_INTERVAL_SECONDS
+    worker = worker_name()
+    if threading.current_thread() is not threading.main_thread():
+        worker = f"{worker}:{threading.current_thread().name}"
+    print(f"✅ Ingestion worker {worker} started")
+    while stop is None or not stop.is_set():
+        try:
+            if not process_next_job(worker):
+                time.sleep(poll_interval)
+        except Exception as e:
+            # e.g. the database is unreachable; keep polling
+            print(f"⚠️ Ingestion worker error: {e}")
+            time.sleep(poll_interval)
+
+
+class IngestionWorkerPool:
+    """Worker processes owned by this process, restarted if they die"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._processes: List[multiprocessing.Process] = []
+        self._stop = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def recover(self):
+        db = SessionLocal()
+        try:
+            recovered = job_queue.recover(db)
+            if recovered:
+                print(f"🔄 Re-queued {recovered} abandoned ingestion jobs")
+        finally:
+            db.close()
+
+    def start(self):
+        self.recover()
+        if self.workers <= 0:
+            # Local fallback: one worker thread inside this process
+            threading.Thread(target=run_worker, kwargs={"stop": self._stop},
+                             name="ingestion-worker", daemon=True).start()
+            return
+
+        # Spawned, not forked (torch is not fork-safe once threads exist), and not
+        # daemonic so workers may start their own embedding process pool
+        context = multiprocessing.get_context("spawn")
+        self._processes = [context.Process(target=run_worker, name=f"ingestion-worker-{i}")
+                           for i in range(self.workers)]
+        for process in self._processes:
+            process.start()
+        self._monitor = threading.Thread(target=self._supervise, args=(context,),
+                                         name="ingestion-supervisor", daemon=True)
+        self._monitor.start()
+
+    def _supervise(self, context):
+        while not self._stop.wait(5.0):
+            for i, process in enumerate(self._processes):
+                if not process.is_alive():
+                    print(f"⚠️ {process.name} exited with code {process.exitcode}; restarting")
+                    # Its job becomes claimable again when the lease runs out
+                    self._processes[i] = context.Process(target=run_worker, name=process.name)
+                    self._processes[i].start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join(timeout)
+        self._processes = []
+
+
+# Global instance
+ingestion_workers = IngestionWorkerPool(settings.INGESTION_WORKERS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run document ingestion workers")
+    parser.add_argument("--workers", type=int, default=max(settings.INGESTION_WORKERS, 1))
+    args = parser.parse_args()
+
+    pool = IngestionWorkerPool(args.workers)
+    if args.workers == 1:
+        pool.recover()
+        run_worker()
+    else:
+        pool.start()
+        try:
+            for process in pool._processes:
+                process.join()
+        except KeyboardInterrupt:
+            pool.stop()
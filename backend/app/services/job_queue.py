@@ -0,0 +1,230 @@
+"""Durable document ingestion queue backed by the ``ingestion_jobs`` table.
+
+A job is claimed by one worker at a time for ``INGESTION_VISIBILITY_TIMEOUT_SECONDS``;
+the worker keeps extending that lease while it is processing. If the worker
+dies, the lease runs out and another worker picks the job up again. Failed
+attempts are retried with exponential backoff until ``INGESTION_MAX_ATTEMPTS``,
+after which the job and its document are marked failed.
+
+On PostgreSQL jobs are claimed with ``FOR UPDATE SKIP LOCKED``; other
+databases (SQLite) fall back to an optimistic compare-and-set update.
+"""
+import os
+import socket
+import time
+from typing import NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import IngestionJob
+
+CLAIMABLE = """
+    ((status = 'queued' AND available_at <= :now)
+     OR (status = 'running' AND locked_until < :now))
+    AND attempts < :max_attempts
+    AND NOT EXISTS (
+        -- One job per document at a time, e.g. when a new version is uploaded mid-processing
+        SELECT 1 FROM ingestion_jobs other
+        WHERE other.document_id = ingestion_jobs.document_id AND other.id != ingestion_jobs.id
+        AND other.status = 'running' AND other.locked_until >= :now
+    )
+"""
+
+
+class ClaimedJob(NamedTuple):
+    id: int
+    document_id: int
+    attempts: int
+
+
+def worker_name() -> str:
+    """Identity stored in ``locked_by``; lets a restarted host recognise its dead workers.
+
+    Worker threads append ``:<thread name>``, so the pid is always the field after the host.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Enqueue, claim, lease and settle ingestion jobs"""
+
+    def __init__(self, visibility_timeout: float, max_attempts: int, retry_base: float, retry_max: float):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+    def enqueue(self, db: Session, document_id: int, delay: float = 0.0) -> IngestionJob:
+        """Add a job in the caller's transaction, so it exists iff the caller commits"""
+        job = IngestionJob(document_id=document_id, status="queued", attempts=0,
+                           available_at=time.time() + delay)
+        db.add(job)
+        return job
+
+    def claim(self, db: Session, worker: str) -> Optional[ClaimedJob]:
+        """Take the next due job (or one whose lease expired) and commit the claim"""
+        now = time.time()
+        params = {
+            "now": now,
+            "until": now + self.visibility_timeout,
+            "worker": worker,
+            "max_attempts": self.max_attempts,
+        }
+        if db.bind.dialect.name == "postgresql":
+            row = db.execute(text(f"""
+                UPDATE ingestion_jobs
+                SET status = 'running', locked_by = :worker, locked_until = :until,
+                    attempts = attempts + 1
+                WHERE id = (
+                    SELECT id FROM ingestion_jobs
+                    WHERE {CLAIMABLE}
+                    ORDER BY available_at, id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, document_id, attempts
+            """), params).first()
+            db.commit()
+            return ClaimedJob(*row) if row else None
+
+        for _ in range(5):
+            candidate = db.execute(text(f"""
+                SELECT id FROM ingestion_jobs
+                WHERE {CLAIMABLE}
+                ORDER BY available_at, id
+                LIMIT 1
+            """), params).scalar()
+            if candidate is None:
+                db.commit()
+                return None
+            # Only succeeds if no other worker claimed the job in the meantime
+            row = db.execute(text(f"""
+                UPDATE ingestion_jobs
+                SET status = 'running', locked_by = :worker, locked_until = :until,
+                    attempts = attempts + 1
+                WHERE id = :id AND {CLAIMABLE}
+                RETURNING id, document_id, attempts
+            """), {**params, "id": candidate}).first()
+            db.commit()
+            if row:
+                return ClaimedJob(*row)
+        return None
+
+    def extend_lease(self, db: Session, job_id: int, worker: str) -> bool:
+        """Push the visibility timeout out again; False if the job is no longer ours"""
+        result = db.execute(text("""
+            UPDATE ingestion_jobs SET locked_until = :until
+            WHERE id = :id AND locked_by = :worker AND status = 'running'
+        """), {"id": job_id, "worker": worker, "until": time.time() + self.visibility_timeout})
+        db.commit()
+        return result.rowcount == 1
+
+    def complete(self, db: Session, job_id: int, worker: str):
+        db.execute(text("""
+            UPDATE ingestion_jobs
+            SET status = 'succeeded', locked_by = NULL, locked_until = NULL, last_error = NULL
+            WHERE id = :id AND locked_by = :worker
+        """), {"id": job_id, "worker": worker})
+        db.commit()
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(self.retry_base * 2 ** max(attempts - 1, 0), self.retry_max)
+
+    def fail(self, db: Session, job: ClaimedJob, worker: str, error: str):
+        """Schedule a retry with backoff, or give up once the attempts are used up"""
+        if job.attempts >= self.max_attempts:
+            self._give_up(db, job.id, job.document_id, error)
+            return
+        db.execute(text("""
+            UPDATE ingestion_jobs
+            SET status = 'queued', locked_by = NULL, locked_until = NULL,
+                available_at = :available_at, last_error = :error
+            WHERE id = :id AND locked_by = :worker
+        """), {
+            "id": job.id,
+            "worker": worker,
+            "error": error[:2000],
+            "available_at": time.time() + self.retry_delay(job.attempts),
+        })
+        db.commit()
+
+    def _give_up(self, db: Session, job_id: int, document_id: int, error: str):
+        db.execute(text("""
+            UPDATE ingestion_jobs
+            SET status = 'failed', locked_by = NULL, locked_until = NULL, last_error = :error
+            WHERE id = :id
+        """), {"id": job_id, "error": error[:2000]})
+        db.execute(text("""
+            UPDATE documents SET status = 'failed'
+            WHERE id = :document_id AND status = 'processing'
+        """), {"document_id": document_id})
+        db.commit()
+        print(f"❌ Giving up on document {document_id} after {self.max_attempts} attempts: {error}")
+
+    def fail_exhausted(self, db: Session) -> int:
+        """Fail jobs whose last allowed attempt was abandoned by a dead worker"""
+        rows = db.execute(text("""
+            SELECT id, document_id FROM ingestion_jobs
+            WHERE status = 'running' AND locked_until < :now AND attempts >= :max_attempts
+        """), {"now": time.time(), "max_attempts": self.max_attempts}).fetchall()
+        for row in rows:
+            self._give_up(db, row.id, row.document_id, "worker stopped responding")
+        return len(rows)
+
+    def recover(self, db: Session) -> int:
+        """Startup recovery: release jobs held by dead workers on this host and
+        enqueue documents left in "processing" without a live job"""
+        host = socket.gethostname()
+        recovered = 0
+        rows = db.execute(text("""
+            SELECT id, locked_by FROM ingestion_jobs
+            WHERE status = 'running' AND locked_by LIKE :host_prefix
+        """), {"host_prefix": f"{host}:%"}).fetchall()
+        for row in rows:
+            pid = row.locked_by[len(host) + 1:].split(":", 1)[0]
+            if pid.isdigit() and not _process_alive(int(pid)):
+                result = db.execute(text("""
+                    UPDATE ingestion_jobs
+                    SET status = 'queued', locked_by = NULL, locked_until = NULL, available_at = :now
+                    WHERE id = :id AND locked_by = :locked_by
+                """), {"id": row.id, "locked_by": row.locked_by, "now": time.time()})
+                recovered += result.rowcount
+
+        # Documents uploaded before the queue existed, or whose job was lost
+        orphans = db.execute(text("""
+            SELECT d.id FROM documents d
+            WHERE d.status = 'processing'
+            AND NOT EXISTS (
+                SELECT 1 FROM ingestion_jobs j
+                WHERE j.document_id = d.id AND j.status IN ('queued', 'running')
+            )
+        """)).scalars().all()
+        for document_id in orphans:
+            self.enqueue(db, document_id)
+        db.commit()
+        return recovered + len(orphans)
+
+    def stats(self, db: Session) -> dict:
+        rows = db.execute(text("SELECT status, COUNT(*) AS jobs FROM ingestion_jobs GROUP BY status")).fetchall()
+        return {row.status: row.jobs for row in rows}
+
+
+# Global instance
+job_queue = JobQueue(
+    visibility_timeout=settings.INGESTION_VISIBILITY_TIMEOUT_SECONDS,
+    max_attempts=settings.INGESTION_MAX_ATTEMPTS,
+    retry_base=settings.INGESTION_RETRY_BASE_SECONDS,
+    retry_max=settings.INGESTION_RETRY_MAX_SECONDS
+)
@@ -0,0 +1,373 @@
+"""In-process BM25 inverted index over ``DocumentChunk.content``.
+
+Each user has their own index. Postings for a term are three parallel
+``array.array`` columns (chunk id, term frequency, chunk length), so scoring
+a query touches only the postings of its terms and runs as a handful of
+vectorized NumPy operations.
+
+A published index is never modified: document changes build a copy that
+shares the untouched postings, and searches score whichever snapshot they
+picked up without holding a lock.
+"""
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.services.corpus_version import get_corpus_version
+from app.utils.vectors import top_k
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+DOCUMENT_BATCH = 500  # Document ids per IN (...) when loading changed documents
+FULL_RELOAD_SHARE = 0.5  # Rebuild from scratch when more than this share of documents changed
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves
+""".split())
+
+
+def tokenize(content: str) -> List[str]:
+    """Lowercase word tokens without stopwords or single characters"""
+    return [
+        token for token in TOKEN_PATTERN.findall(content.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+class _Postings:
+    """Compact postings list for one term"""
+
+    __slots__ = ("chunk_ids", "term_frequencies", "chunk_lengths")
+
+    def __init__(self):
+        self.chunk_ids = array("q")
+        self.term_frequencies = array("I")
+        self.chunk_lengths = array("I")
+
+    def append(self, chunk_id: int, term_frequency: int, chunk_length: int):
+        self.chunk_ids.append(chunk_id)
+        self.term_frequencies.append(term_frequency)
+        self.chunk_lengths.append(chunk_length)
+
+    def copy(self) -> "_Postings":
+        postings = _Postings()
+        postings.chunk_ids = array("q", self.chunk_ids)
+        postings.term_frequencies = array("I", self.term_frequencies)
+        postings.chunk_lengths = array("I", self.chunk_lengths)
+        return postings
+
+    def without(self, chunk_ids: Set[int]) -> "_Postings":
+        """A new postings list without these chunks"""
+        keep = ~np.isin(
+            np.frombuffer(self.chunk_ids, dtype=np.int64),
+            np.fromiter(chunk_ids, dtype=np.int64, count=len(chunk_ids))
+        )
+        postings = _Postings()
+        postings.chunk_ids = array("q", np.frombuffer(self.chunk_ids, dtype=np.int64)[keep].tobytes())
+        postings.term_frequencies = array("I", np.frombuffer(self.term_frequencies, dtype=np.uint32)[keep].tobytes())
+        postings.chunk_lengths = array("I", np.frombuffer(self.chunk_lengths, dtype=np.uint32)[keep].tobytes())
+        return postings
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+
+class _UserKeywordIndex:
+    """BM25 postings, corpus statistics and per-document bookkeeping for one user"""
+
+    def __init__(self):
+        self.postings: Dict[str, _Postings] = {}
+        # document_id -> (chunk ids, indexed terms, total token count)
+        self.documents: Dict[int, Tuple[Set[int], Set[str], int]] = {}
+        self.chunk_count = 0
+        self.total_length = 0
+        self.version = 0  # corpus version the index reflects
+
+    def copy(self) -> "_UserKeywordIndex":
+        """A copy sharing every postings list; changes to it must not modify them in place"""
+        index = _UserKeywordIndex()
+        index.postings = dict(self.postings)
+        index.documents = dict(self.documents)
+        index.chunk_count = self.chunk_count
+        index.total_length = self.total_length
+        index.version = self.version
+        return index
+
+    def add_document(self, document_id: int, chunks: Iterable[Tuple[int, str]], shared: bool = False):
+        """Index a document's chunks; with ``shared`` postings are copied before being extended"""
+        chunk_ids, terms, document_length = set(), set(), 0
+        copied: Set[str] = set()
+        for chunk_id, content in chunks:
+            tokens = tokenize(content)
+            for term, frequency in Counter(tokens).items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = _Postings()
+                    copied.add(term)
+                elif shared and term not in copied:
+                    postings = self.postings[term] = postings.copy()
+                    copied.add(term)
+                postings.append(chunk_id, frequency, len(tokens))
+                terms.add(term)
+            chunk_ids.add(chunk_id)
+            document_length += len(tokens)
+        self.documents[document_id] = (chunk_ids, terms, document_length)
+        self.chunk_count += len(chunk_ids)
+        self.total_length += document_length
+
+    def remove_document(self, document_id: int):
+        entry = self.documents.pop(document_id, None)
+        if entry is None:
+            return
+        chunk_ids, terms, document_length = entry
+        # Only the postings of this document's own terms need rewriting
+        for term in terms:
+            postings = self.postings[term].without(chunk_ids)
+            if postings:
+                self.postings[term] = postings
+            else:
+                del self.postings[term]
+        self.chunk_count -= len(chunk_ids)
+        self.total_length -= document_length
+
+    def search(self, query: str, limit: int, k1: float, b: float) -> List[Tuple[int, float]]:
+        if self.chunk_count == 0:
+            return []
+        average_length = max(self.total_length / self.chunk_count, 1.0)
+
+        ids, weights = [], []
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            document_frequency = len(postings)
+            idf = np.log(1 + (self.chunk_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            tf = np.frombuffer(postings.term_frequencies, dtype=np.uint32).astype(np.float32)
+            lengths = np.frombuffer(postings.chunk_lengths, dtype=np.uint32).astype(np.float32)
+            weights.append(idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths / average_length)))
+            ids.append(np.frombuffer(postings.chunk_ids, dtype=np.int64))
+
+        if not ids:
+            return []
+        chunk_ids, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        best = top_k(scores, limit)
+        return [(int(chunk_ids[i]), float(scores[i])) for i in best]
+
+
+class KeywordIndex:
+    """BM25 keyword search over each user's completed documents.
+
+    A user's index is built from ``document_chunks`` on first search and is
+    then kept current through ``add_document`` / ``remove_document``. Changes
+    made by other processes are noticed through the user's corpus version.
+    Ingestion workers run in their own processes, so in the API every
+    completed upload is picked up this way. A background thread then reads
+    only the chunks of documents published after the snapshot's version
+    (``documents.corpus_version``) and drops documents that are gone, while
+    searches keep using the previous snapshot (``is_current`` tells callers
+    their results may be stale). Only a user's very first search waits for a
+    full load.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._users: Dict[int, _UserKeywordIndex] = {}
+        # Guards the dicts only; loading one user's index never blocks another's searches
+        self._lock = threading.Lock()
+        self._load_locks: Dict[int, threading.Lock] = {}
+
+    def _load_lock(self, user_id: int) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(user_id, threading.Lock())
+
+    def _install(self, user_id: int, index: _UserKeywordIndex):
+        """Publish a loaded index unless a newer one got there first"""
+        with self._lock:
+            current = self._users.get(user_id)
+            if current is None or current.version <= index.version:
+                self._users[user_id] = index
+
+    def _load_user(self, db: Session, user_id: int) -> _UserKeywordIndex:
+        """Build a user's index from the chunks stored in the database"""
+        # Read the version first: a change landing during the load only causes another reload
+        version = get_corpus_version(db, user_id)
+        result = db.execute(text("""
+            SELECT
+                dc.id as chunk_id,
+                dc.document_id,
+                dc.content
+            FROM document_chunks dc
+            JOIN documents d ON dc.document_id = d.id
+            WHERE d.user_id = :user_id
+            AND d.status = 'completed'
+            AND dc.chunk_index >= 0
+            ORDER BY dc.document_id, dc.chunk_index
+        """).execution_options(yield_per=1000), {'user_id': user_id})
+
+        index = _UserKeywordIndex()
+        index.version = version
+        for document_id, chunks in self._group_by_document(result):
+            index.add_document(document_id, chunks)
+        return index
+
+    @staticmethod
+    def _group_by_document(rows) -> Iterable[Tuple[int, List[Tuple[int, str]]]]:
+        """``(document_id, [(chunk_id, content), ...])`` from rows ordered by document"""
+        document_id, chunks = None, []
+        for row in rows:
+            if row.document_id != document_id:
+                if chunks:
+                    yield document_id, chunks
+                document_id, chunks = row.document_id, []
+            chunks.append((row.chunk_id, row.content))
+        if chunks:
+            yield document_id, chunks
+
+    def _load_changes(self, db: Session, user_id: int, index: _UserKeywordIndex) -> _UserKeywordIndex:
+        """A copy of ``index`` brought up to date with only the documents changed since its version"""
+        version = get_corpus_version(db, user_id)
+        documents = db.execute(text("""
+            SELECT id, corpus_version FROM documents
+            WHERE user_id = :user_id AND status = 'completed'
+        """), {'user_id': user_id}).fetchall()
+        # Documents published before the migration have no version; they are indexed if missing
+        changed = [row.id for row in documents
+                   if row.id not in index.documents or (row.corpus_version or 0) > index.version]
+        if len(changed) > len(documents) * FULL_RELOAD_SHARE:
+            return self._load_user(db, user_id)
+
+        updated = index.copy()
+        current = {row.id for row in documents}
+        for document_id in [document_id for document_id in updated.documents if document_id not in current]:
+            updated.remove_document(document_id)
+        query = text("""
+            SELECT id as chunk_id, document_id, content
+            FROM document_chunks
+            WHERE document_id IN :document_ids AND chunk_index >= 0
+            ORDER BY document_id, chunk_index
+        """).bindparams(bindparam('document_ids', expanding=True))
+        for start in range(0, len(changed), DOCUMENT_BATCH):
+            rows = db.execute(query, {'document_ids': changed[start:start + DOCUMENT_BATCH]})
+            loaded = set()
+            for document_id, chunks in self._group_by_document(rows):
+                updated.remove_document(document_id)
+                updated.add_document(document_id, chunks, shared=True)
+                loaded.add(document_id)
+            # Published without any searchable chunks
+            for document_id in set(changed[start:start + DOCUMENT_BATCH]) - loaded:
+                updated.remove_document(document_id)
+        updated.version = version
+        return updated
+
+    def search(self, db: Session, user_id: int, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """Return ``(chunk_id, bm25_score)`` pairs, best first"""
+        version = get_corpus_version(db, user_id)
+        with self._lock:
+            index = self._users.get(user_id)
+        if index is None:
+            with self._load_lock(user_id):
+                with self._lock:
+                    index = self._users.get(user_id)
+                # Another search may have loaded it while this one waited
+                if index is None:
+                    index = self._load_user(db, user_id)
+                    self._install(user_id, index)
+        if index.version != version:
+            self._reload_in_background(user_id)
+        # A published index is never modified, so scoring needs no lock
+        return index.search(query, limit, self.k1, self.b)
+
+    def is_current(self, user_id: int, version: int) -> bool:
+        """Whether searches for the user are served from an index at ``version``"""
+        with self._lock:
+            index = self._users.get(user_id)
+        return index is not None and index.version == version
+
+    def _reload_in_background(self, user_id: int):
+        """Catch a user's index up on its own thread, unless a load is already running"""
+        lock = self._load_lock(user_id)
+        if not lock.acquire(blocking=False):
+            return
+
+        def reload():
+            db = SessionLocal()
+            try:
+                with self._lock:
+                    index = self._users.get(user_id)
+                if index is None:
+                    index = self._load_user(db, user_id)
+                else:
+                    index = self._load_changes(db, user_id, index)
+                self._install(user_id, index)
+            except Exception as e:
+                print(f"⚠️ Keyword index reload for user {user_id} failed: {e}")
+            finally:
+                db.close()
+                lock.release()
+
+        threading.Thread(target=reload, name=f"keyword-reload-{user_id}", daemon=True).start()
+
+    def _update(self, user_id: int, change: Callable[[_UserKeywordIndex], None]):
+        """Apply ``change`` to a copy of the user's index and publish it, retrying if it was replaced meanwhile"""
+        while True:
+            with self._lock:
+                index = self._users.get(user_id)
+            if index is None:
+                # Not loaded yet: the first search will read it from the database
+                return
+            updated = index.copy()
+            change(updated)
+            with self._lock:
+                if self._users.get(user_id) is index:
+                    self._users[user_id] = updated
+                    return
+
+    def add_document(self, user_id: int, document_id: int, chunks: Iterable[Tuple[int, str]]):
+        """Index a freshly processed document's ``(chunk_id, content)`` pairs"""
+        chunks = list(chunks)
+
+        def change(index: _UserKeywordIndex):
+            index.remove_document(document_id)
+            index.add_document(document_id, chunks, shared=True)
+        self._update(user_id, change)
+
+    def remove_document(self, user_id: int, document_id: int):
+        """Drop a document's chunks from the user's index"""
+        self._update(user_id, lambda index: index.remove_document(document_id))
+
+    def advance_version(self, user_id: int, version: int):
+        """Record that the corpus change which produced ``version`` has been applied here.
+
+        Only a direct successor of the index's version is accepted; any other
+        gap means another process changed the corpus and a reload is needed.
+        """
+        def change(index: _UserKeywordIndex):
+            if index.version == version - 1:
+                index.version = version
+        self._update(user_id, change)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Forget a user's index (or all of them) so it is reloaded on next search"""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+
+# Global instance
+keyword_index = KeywordIndex()
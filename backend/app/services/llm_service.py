@@ -1,16 +1,15 @@
-from transformers import pipeline
-import torch
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import warnings
 import re
+from app.core.config import settings
+from app.services.batching import MicroBatcher
+from app.services.model_registry import model_registry
 warnings.filterwarnings("ignore")
 
 class LocalLLMService:
     """Enhanced local LLM service for ChatGPT-like document understanding"""
     
     def __init__(self):
-        self.qa_pipeline = None
-        self.explanation_pipeline = None
         self.concept_explanations = {
             'cnn': 'Convolutional Neural Network - A deep learning algorithm designed for processing grid-like data such as images. CNNs use convolutional layers to automatically detect features.',
             'rnn': 'Recurrent Neural Network - A neural network designed for sequential data processing.',
@@ -33,42 +32,32 @@ class LocalLLMService:
             'mongodb': 'MongoDB - NoSQL database program that uses JSON-like documents.',
             'express': 'Express.js - Web application framework for Node.js.',
         }
-        self._initialize_model()
+        # Concurrent questions are answered in one batched pipeline call
+        self.qa_batcher = MicroBatcher(
+            "qa",
+            self._answer_batch,
+            max_batch=settings.QA_BATCH_MAX_SIZE,
+            max_wait_ms=settings.QA_BATCH_MAX_WAIT_MS,
+            enabled=settings.MICROBATCH_ENABLED
+        )
     
-    def _initialize_model(self):
-        """Initialize the Hugging Face models for Q&A and explanations"""
-        try:
-            print("🤖 Loading enhanced AI models for ChatGPT-like responses...")
-            
-            # Primary Q&A model for direct answers
-            self.qa_pipeline = pipeline(
-                "question-answering",
-                model="distilbert-base-uncased-distilled-squad",
-                device=0 if torch.cuda.is_available() else -1
-            )
-            
-            # Secondary model for generating explanations
-            try:
-                self.explanation_pipeline = pipeline(
-                    "text-generation",
-                    model="microsoft/DialoGPT-small",
-                    max_length=300,
-                    do_sample=True,
-                    temperature=0.7,
-                    device=0 if torch.cuda.is_available() else -1,
-                    return_full_text=False
-                )
-                print("✅ Enhanced AI models loaded successfully!")
-            except Exception as e:
-                print(f"⚠️ Explanation model failed to load: {e}")
-                self.explanation_pipeline = None
-                print("✅ Q&A model loaded - basic functionality available")
-            
-        except Exception as e:
-            print(f"❌ Model loading failed: {e}")
-            print("🔄 Will use intelligent fallback responses")
-            self.qa_pipeline = None
-            self.explanation_pipeline = None
+    @property
+    def qa_pipeline(self):
+        """DistilBERT-SQuAD pipeline from the shared model registry, or None if it cannot load"""
+        return model_registry.try_get("qa")
+    
+    @property
+    def explanation_pipeline(self):
+        """DialoGPT pipeline, loaded on demand and unloaded again when idle"""
+        return model_registry.try_get("explanation")
+    
+    def _answer_batch(self, items: List[Tuple[str, str]]) -> List[dict]:
+        """Run the QA pipeline over ``(question, context)`` pairs"""
+        questions = [question for question, _ in items]
+        contexts = [context for _, context in items]
+        results = model_registry.get("qa")(question=questions, context=contexts, batch_size=len(items))
+        # The pipeline unwraps single-item batches
+        return [results] if isinstance(results, dict) else results
     
     def is_available(self) -> bool:
         """Check if at least the Q&A model is available"""
@@ -76,29 +65,30 @@ class LocalLLMService:
     
     def generate_response(self, prompt: str, context: str = "") -> str:
         """Generate ChatGPT-like response with enhanced understanding"""
+        return self._respond(prompt, context)[0]
+    
+    def _respond(self, prompt: str, context: str) -> Tuple[str, bool]:
+        """The response, and whether it is a fallback because the QA model was unavailable or failed"""
         try:
             # If we have models and context, use AI
             if self.qa_pipeline and context.strip():
                 return self._generate_intelligent_response(prompt, context)
             
             # Otherwise use enhanced fallback
-            return self._enhanced_fallback_response(prompt, context)
+            return self._enhanced_fallback_response(prompt, context), True
             
         except Exception as e:
             print(f"Response generation error: {e}")
-            return self._enhanced_fallback_response(prompt, context)
+            return self._enhanced_fallback_response(prompt, context), True
     
-    def _generate_intelligent_response(self, question: str, context: str) -> str:
-        """Generate AI-powered response with concept explanations"""
+    def _generate_intelligent_response(self, question: str, context: str) -> Tuple[str, bool]:
+        """Generate AI-powered response with concept explanations; True if the QA call failed"""
         try:
             # Limit context length for better performance
             clean_context = context[:3000].strip()
             
             # Try Q&A pipeline first
-            result = self.qa_pipeline(
-                question=question,
-                context=clean_context
-            )
+            result = self.qa_batcher((question, clean_context))
             
             answer = result['answer']
             confidence = result['score']
@@ -106,14 +96,14 @@ class LocalLLMService:
             # If we got a good direct answer, enhance it
             if confidence > 0.05 and len(answer) > 10:
                 enhanced_response = self._enhance_answer_with_explanations(question, answer, clean_context)
-                return enhanced_response
+                return enhanced_response, False
             else:
                 # Generate a more comprehensive response using context analysis
-                return self._generate_contextual_response(question, clean_context)
+                return self._generate_contextual_response(question, clean_context), False
                 
         except Exception as e:
             print(f"AI response error: {e}")
-            return self._generate_contextual_response(question, context)
+            return self._generate_contextual_response(question, context), True
     
     def _enhance_answer_with_explanations(self, question: str, answer: str, context: str) -> str:
         """Enhance a basic answer with clean, structured explanations"""
@@ -164,18 +154,19 @@ class LocalLLMService:
         
         return enhanced_response
     
-    def generate_enhanced_response(self, question: str, context: str) -> str:
-        """Generate enhanced response with concept understanding - main method for RAG service"""
-        return self.generate_response(question, context)
+    def generate_enhanced_response(self, question: str, context: str) -> Tuple[str, bool]:
+        """Generate enhanced response with concept understanding - main method for RAG service.
+
+        Also returns whether the answer is a fallback (QA model warming up,
+        failed to load or errored), which callers should not cache.
+        """
+        return self._respond(question, context)
     
     def answer_question(self, question: str, context: str) -> str:
         """Direct Q&A method for testing"""
         try:
             if self.qa_pipeline and context.strip():
-                result = self.qa_pipeline(
-                    question=question,
-                    context=context[:2000]  # Limit context for better performance
-                )
+                result = self.qa_batcher((question, context[:2000]))  # Limit context for better performance
                 return result['answer']
             else:
                 return self._intelligent_fallback_answer(question, context)
@@ -0,0 +1,252 @@
+"""Process-wide registry of the ML models used by the services.
+
+Each model is registered with a loader and is only built the first time it
+is requested, so a worker that never answers questions never loads the QA
+pipeline. Models with an idle timeout are unloaded by a background thread
+once they have not been used for that long and are reloaded on next use.
+"""
+import gc
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+
+def _torch_device() -> int:
+    import torch
+    return 0 if torch.cuda.is_available() else -1
+
+
+def model_memory_bytes(model: Any) -> int:
+    """Bytes held by a model's weights: its own ``memory_bytes`` or torch parameters and buffers"""
+    if hasattr(model, "memory_bytes"):
+        return model.memory_bytes
+    module = model
+    if not hasattr(module, "parameters"):
+        module = getattr(model, "model", None)
+    if module is None or not hasattr(module, "parameters"):
+        return 0
+    tensors = list(module.parameters())
+    if hasattr(module, "buffers"):
+        tensors.extend(module.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class ModelUnavailable(RuntimeError):
+    """Raised when a model failed to load and is not due for another attempt"""
+
+
+class _ModelEntry:
+    def __init__(self, name: str, loader: Callable[[], Any], idle_timeout: Optional[float]):
+        self.name = name
+        self.loader = loader
+        self.idle_timeout = idle_timeout
+        self.model = None
+        self.memory_bytes = 0
+        self.load_seconds = 0.0
+        self.loads = 0
+        self.last_used = 0.0
+        self.error: Optional[str] = None
+        self.failed_at = 0.0
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Loads each registered model once per process, on first use"""
+
+    def __init__(self, check_interval: float = 30.0, retry_seconds: float = 300.0):
+        self.check_interval = check_interval
+        self.retry_seconds = retry_seconds
+        self._entries: Dict[str, _ModelEntry] = {}
+        self._reaper: Optional[threading.Thread] = None
+        self._reaper_lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any], idle_timeout: Optional[float] = None):
+        """Add a model; ``idle_timeout`` seconds without use unloads it (None keeps it loaded)"""
+        self._entries[name] = _ModelEntry(name, loader, idle_timeout or None)
+
+    def get(self, name: str) -> Any:
+        """Return the model, loading it on first use"""
+        entry = self._entries[name]
+        entry.last_used = time.monotonic()
+        model = entry.model
+        if model is not None:
+            return model
+
+        with entry.lock:
+            if entry.model is not None:
+                return entry.model
+            if entry.error is not None and time.monotonic() - entry.failed_at < self.retry_seconds:
+                raise ModelUnavailable(f"{name} model unavailable: {entry.error}")
+
+            started = time.monotonic()
+            try:
+                model = entry.loader()
+            except Exception as e:
+                entry.error = str(e)
+                entry.failed_at = time.monotonic()
+                print(f"❌ Failed to load {name} model: {e}")
+                raise ModelUnavailable(f"{name} model unavailable: {e}") from e
+
+            entry.load_seconds = time.monotonic() - started
+            entry.memory_bytes = model_memory_bytes(model)
+            entry.loads += 1
+            entry.error = None
+            entry.last_used = time.monotonic()
+            entry.model = model
+            print(f"✅ Loaded {name} model in {entry.load_seconds:.1f}s "
+                  f"({entry.memory_bytes / 1024 / 1024:.0f} MB)")
+
+        if entry.idle_timeout:
+            self._start_reaper()
+        return model
+
+    def try_get(self, name: str) -> Optional[Any]:
+        """Like ``get``, but returns None when the model cannot be loaded"""
+        try:
+            return self.get(name)
+        except ModelUnavailable:
+            return None
+
+    def is_loaded(self, name: str) -> bool:
+        return self._entries[name].model is not None
+
+    def unload(self, name: str):
+        """Drop a model; requests still holding a reference keep it alive until they finish"""
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.model is None:
+                return
+            entry.model = None
+            entry.memory_bytes = 0
+        gc.collect()
+        print(f"🔄 Unloaded idle {name} model")
+
+    def unload_idle(self):
+        now = time.monotonic()
+        for entry in list(self._entries.values()):
+            if (entry.model is not None and entry.idle_timeout
+                    and now - entry.last_used >= entry.idle_timeout):
+                self.unload(entry.name)
+
+    def _start_reaper(self):
+        with self._reaper_lock:
+            if self._reaper is not None:
+                return
+
+            def reap():
+                while True:
+                    time.sleep(self.check_interval)
+                    self.unload_idle()
+
+            self._reaper = threading.Thread(target=reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model load state and memory accounting"""
+        now = time.monotonic()
+        return {
+            name: {
+                "loaded": entry.model is not None,
+                "memory_bytes": entry.memory_bytes,
+                "load_seconds": round(entry.load_seconds, 3),
+                "loads": entry.loads,
+                "idle_seconds": round(now - entry.last_used, 1) if entry.last_used else None,
+                "idle_timeout": entry.idle_timeout,
+                "error": entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(entry.memory_bytes for entry in self._entries.values())
+
+
+_configured_max_seq_lengths: Dict[str, int] = {}
+
+
+def _configured_max_seq_length(model_name: str) -> Optional[int]:
+    """``max_seq_length`` from a sentence-transformers model's sentence_bert_config.json"""
+    if model_name not in _configured_max_seq_lengths:
+        try:
+            if os.path.isdir(model_name):
+                path = os.path.join(model_name, "sentence_bert_config.json")
+            else:
+                from huggingface_hub import hf_hub_download
+                path = hf_hub_download(model_name, "sentence_bert_config.json")
+            with open(path) as config:
+                _configured_max_seq_lengths[model_name] = int(json.load(config)["max_seq_length"])
+        except Exception:
+            # Not a sentence-transformers checkpoint, or offline; tried again next time
+            return None
+    return _configured_max_seq_lengths[model_name]
+
+
+def embedding_max_seq_length() -> Optional[int]:
+    """Tokens, special tokens included, after which the embedding model truncates its input"""
+    if model_registry.is_loaded("embedding"):
+        length = getattr(model_registry.get("embedding"), "max_seq_length", None)
+        if length:
+            return int(length)
+    return _configured_max_seq_length(settings.EMBEDDING_MODEL)
+
+
+def _load_embedding_model():
+    if settings.INFERENCE_BACKEND == "onnx":
+        from app.services.onnx_backend import OnnxEmbeddingModel
+        return OnnxEmbeddingModel.from_pretrained(
+            settings.EMBEDDING_MODEL,
+            quantize=settings.ONNX_QUANTIZE,
+            max_length=_configured_max_seq_length(settings.EMBEDDING_MODEL) or 256
+        )
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(settings.EMBEDDING_MODEL)
+
+
+def _load_tokenizer():
+    # Only the (fast) tokenizer, for sizing chunks; much lighter than the model
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(settings.EMBEDDING_MODEL)
+
+
+def _load_qa_pipeline():
+    if settings.INFERENCE_BACKEND == "onnx":
+        from app.services.onnx_backend import OnnxQuestionAnswering
+        return OnnxQuestionAnswering.from_pretrained(settings.QA_MODEL, quantize=settings.ONNX_QUANTIZE)
+    from transformers import pipeline
+    return pipeline(
+        "question-answering",
+        model=settings.QA_MODEL,
+        device=_torch_device()
+    )
+
+
+def _load_explanation_pipeline():
+    from transformers import pipeline
+    return pipeline(
+        "text-generation",
+        model=settings.EXPLANATION_MODEL,
+        max_length=300,
+        do_sample=True,
+        temperature=0.7,
+        device=_torch_device(),
+        return_full_text=False
+    )
+
+
+def _load_reranker():
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(settings.RERANK_MODEL, max_length=512)
+
+
+# Global instance
+model_registry = ModelRegistry(retry_seconds=settings.MODEL_LOAD_RETRY_SECONDS)
+model_registry.register("embedding", _load_embedding_model, settings.MODEL_IDLE_TIMEOUT_SECONDS)
+model_registry.register("tokenizer", _load_tokenizer)
+model_registry.register("qa", _load_qa_pipeline, settings.MODEL_IDLE_TIMEOUT_SECONDS)
+model_registry.register("explanation", _load_explanation_pipeline, settings.EXPLANATION_MODEL_IDLE_TIMEOUT_SECONDS)
+model_registry.register("reranker", _load_reranker, settings.MODEL_IDLE_TIMEOUT_SECONDS)
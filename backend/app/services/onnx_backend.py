@@ -0,0 +1,223 @@
+"""ONNX Runtime inference backend for the embedding and QA models.
+
+Selected with ``INFERENCE_BACKEND="onnx"``. The Hugging Face checkpoint is
+exported to ONNX once (this step needs torch) and cached under
+``onnx_cache_dir()``; with ``ONNX_QUANTIZE`` the weights are additionally
+dynamic-quantized to int8. At runtime only onnxruntime and the fast
+tokenizer are used.
+
+The wrappers mirror the small parts of the torch APIs the services call:
+``OnnxEmbeddingModel.encode`` behaves like ``SentenceTransformer.encode``
+(mean pooling) and ``OnnxQuestionAnswering`` is called like the
+``question-answering`` pipeline.
+"""
+import os
+import shutil
+from typing import Any, Dict, List, Sequence, Union
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.vectors import normalize_rows
+
+EMBEDDING_TASK = "embedding"
+QA_TASK = "qa"
+
+
+def onnx_cache_dir() -> str:
+    """Directory holding exported models, next to the upload directory by default"""
+    if settings.ONNX_CACHE_DIR:
+        return settings.ONNX_CACHE_DIR
+    upload_parent = os.path.dirname(os.path.abspath(settings.UPLOAD_DIR))
+    return os.path.join(upload_parent, "onnx_models")
+
+
+def _export(model_name: str, task: str, directory: str):
+    """Export a checkpoint and its tokenizer to ``directory/model.onnx``"""
+    import torch
+    from transformers import AutoModel, AutoModelForQuestionAnswering, AutoTokenizer
+
+    model_class = AutoModel if task == EMBEDDING_TASK else AutoModelForQuestionAnswering
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = model_class.from_pretrained(model_name, return_dict=False).eval()
+
+    sample = tokenizer(["export sample"], ["export sample"] if task == QA_TASK else None, return_tensors="pt")
+    input_names = [name for name in tokenizer.model_input_names if name in sample]
+    output_names = ["last_hidden_state"] if task == EMBEDDING_TASK else ["start_logits", "end_logits"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + output_names}
+
+    # Export into a private directory and rename it into place, so concurrent
+    # workers never load a half-written model
+    tmp_directory = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            os.path.join(tmp_directory, "model.onnx"),
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(tmp_directory)
+    try:
+        os.rename(tmp_directory, directory)
+    except OSError:
+        # Another worker finished first
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+
+
+def exported_model_path(model_name: str, task: str, quantize: bool) -> str:
+    """Path of the (possibly int8) ONNX file for a checkpoint, exporting it if needed"""
+    directory = os.path.join(onnx_cache_dir(), model_name.replace("/", "__"), task)
+    fp32_path = os.path.join(directory, "model.onnx")
+    if not os.path.exists(fp32_path):
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        print(f"🔄 Exporting {model_name} ({task}) to ONNX...")
+        _export(model_name, task, directory)
+    if not quantize:
+        return fp32_path
+
+    int8_path = os.path.join(directory, "model.int8.onnx")
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        tmp_path = f"{int8_path}.tmp-{os.getpid()}.onnx"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+def _session(path: str):
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if settings.ONNX_THREADS:
+        options.intra_op_num_threads = settings.ONNX_THREADS
+    return onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max())
+    return exp / exp.sum()
+
+
+class _OnnxModel:
+    def __init__(self, path: str):
+        from transformers import AutoTokenizer
+        self.path = path
+        self.session = _session(path)
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(path))
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.memory_bytes = os.path.getsize(path)
+
+    def _feeds(self, encoded) -> Dict[str, np.ndarray]:
+        return {name: encoded[name].astype(np.int64) for name in self.input_names}
+
+
+class OnnxEmbeddingModel(_OnnxModel):
+    """Mean-pooled sentence embeddings, compatible with ``SentenceTransformer.encode``"""
+
+    def __init__(self, path: str, max_length: int = 256):
+        super().__init__(path)
+        self.max_length = max_length
+
+    @property
+    def max_seq_length(self) -> int:
+        """Named like ``SentenceTransformer.max_seq_length``"""
+        return self.max_length
+
+    @classmethod
+    def from_pretrained(cls, model_name: str, quantize: bool = True, max_length: int = 256) -> "OnnxEmbeddingModel":
+        return cls(exported_model_path(model_name, EMBEDDING_TASK, quantize), max_length)
+
+    def encode(
+        self,
+        sentences: Union[str, Sequence[str]],
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        **kwargs
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        # Longest first, so each batch pads to similar lengths
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        pooled: List[np.ndarray] = [None] * len(texts)
+        for start in range(0, len(texts), batch_size):
+            indices = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in indices], padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np"
+            )
+            hidden = self.session.run(["last_hidden_state"], self._feeds(encoded))[0]
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            means = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            for i, vector in zip(indices, means):
+                pooled[i] = vector
+
+        embeddings = np.stack(pooled).astype(np.float32) if pooled else np.empty((0, 0), dtype=np.float32)
+        if normalize_embeddings and len(texts):
+            embeddings = normalize_rows(embeddings)
+        return embeddings[0] if single else embeddings
+
+
+class OnnxQuestionAnswering(_OnnxModel):
+    """Extractive QA, called like the transformers ``question-answering`` pipeline"""
+
+    def __init__(self, path: str, max_length: int = 384, doc_stride: int = 128):
+        super().__init__(path)
+        self.max_length = max_length
+        self.doc_stride = doc_stride
+
+    @classmethod
+    def from_pretrained(cls, model_name: str, quantize: bool = True) -> "OnnxQuestionAnswering":
+        return cls(exported_model_path(model_name, QA_TASK, quantize))
+
+    def __call__(
+        self,
+        question: Union[str, Sequence[str]],
+        context: Union[str, Sequence[str]],
+        batch_size: int = 8,
+        max_answer_len: int = 15,
+        **kwargs
+    ) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        single = isinstance(question, str)
+        questions = [question] if single else list(question)
+        contexts = [context] if single else list(context)
+        answers = []
+        for start in range(0, len(questions), batch_size):
+            answers.extend(self._answer(
+                questions[start:start + batch_size], contexts[start:start + batch_size], max_answer_len
+            ))
+        return answers[0] if single else answers
+
+    def _answer(self, questions: List[str], contexts: List[str], max_answer_len: int) -> List[Dict[str, Any]]:
+        # Long contexts are split into overlapping windows, as the pipeline does
+        encoded = self.tokenizer(
+            questions, contexts, truncation="only_second", max_length=self.max_length,
+            stride=self.doc_stride, return_overflowing_tokens=True, return_offsets_mapping=True,
+            padding=True, return_tensors="np"
+        )
+        start_logits, end_logits = self.session.run(["start_logits", "end_logits"], self._feeds(encoded))
+
+        best: List[Dict[str, Any]] = [None] * len(questions)
+        for feature, sample in enumerate(encoded["overflow_to_sample_mapping"]):
+            sample = int(sample)
+            in_context = np.array([sequence_id == 1 for sequence_id in encoded.sequence_ids(feature)])
+            start_probabilities = _softmax(np.where(in_context, start_logits[feature], -1e4))
+            end_probabilities = _softmax(np.where(in_context, end_logits[feature], -1e4))
+            # Spans with start <= end < start + max_answer_len
+            spans = np.tril(np.triu(np.outer(start_probabilities, end_probabilities)), max_answer_len - 1)
+            start_token, end_token = np.unravel_index(int(np.argmax(spans)), spans.shape)
+            score = float(spans[start_token, end_token])
+            if best[sample] is None or score > best[sample]["score"]:
+                offsets = encoded["offset_mapping"][feature]
+                start_char, end_char = int(offsets[start_token][0]), int(offsets[end_token][1])
+                best[sample] = {
+                    "score": score,
+                    "start": start_char,
+                    "end": end_char,
+                    "answer": contexts[sample][start_char:end_char],
+                }
+        return best
@@ -0,0 +1,151 @@
+"""Page-range PDF text extraction, in parallel for large PDFs.
+
+A PDF is split into ranges of ``PDF_PAGES_PER_TASK`` pages. PDFs with at
+least ``PDF_PARALLEL_MIN_PAGES`` pages have their ranges extracted by
+``PDF_EXTRACTION_WORKERS`` spawned processes, each opening its own PyMuPDF
+handle (fitz documents cannot be shared between processes). Ranges are
+yielded back in page order, with only a few in flight at a time so memory
+stays bounded. Pages for which PyMuPDF finds no text are retried with PyPDF2,
+page by page; each process parses the file with PyPDF2 at most once.
+
+The worker processes live as long as the ingestion worker that owns them, on
+top of its embedding pool, so the default is a small fixed number of them.
+"""
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+# PyPDF2 reader of the file this process last needed one for; parsing
+# re-reads the whole file, so a scanned PDF must not be parsed per range
+_reader_lock = threading.Lock()
+_reader_key: Optional[Tuple[str, float, int]] = None
+_reader: Any = None
+
+
+def _pypdf_reader(file_path: str):
+    global _reader_key, _reader
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime, stat.st_size)
+    with _reader_lock:
+        if _reader_key != key:
+            import PyPDF2
+            _reader, _reader_key = PyPDF2.PdfReader(file_path), key
+        return _reader
+
+
+def release_pypdf_reader():
+    """Drop the cached PyPDF2 reader, e.g. once a document is done"""
+    global _reader_key, _reader
+    with _reader_lock:
+        _reader_key, _reader = None, None
+
+
+def _fill_empty_pages(file_path: str, start: int, texts: List[str]) -> List[str]:
+    """Replace pages PyMuPDF returned no text for with PyPDF2's extraction"""
+    empty = [offset for offset, text in enumerate(texts) if not text.strip()]
+    if not empty:
+        return texts
+    pdf_reader = _pypdf_reader(file_path)
+    for offset in empty:
+        if start + offset < len(pdf_reader.pages):
+            texts[offset] = pdf_reader.pages[start + offset].extract_text() or ""
+    return texts
+
+
+def extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Text of pages ``[start, stop)`` (0-based) with a fitz handle of this process"""
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as doc:
+        texts = [doc[page_number].get_text() for page_number in range(start, stop)]
+    return _fill_empty_pages(file_path, start, texts)
+
+
+def pdf_page_count(file_path: str) -> int:
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+class PdfExtractionPool:
+    """Extracts PDF page ranges serially or on a pool of worker processes"""
+
+    def __init__(self, workers: int = None, pages_per_task: int = None, min_pages: int = None):
+        self.workers = (os.cpu_count() or 1) if workers == 0 else workers or 1
+        self.pages_per_task = pages_per_task or 25
+        self.min_pages = min_pages or 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        return [(start, min(start + self.pages_per_task, page_count))
+                for start in range(0, page_count, self.pages_per_task)]
+
+    def iter_pages(self, file_path: str) -> Iterator[Tuple[int, str]]:
+        """Yield ``(page_number, text)`` for every page in order, page numbers 1-based"""
+        page_count = pdf_page_count(file_path)
+        ranges = self.page_ranges(page_count)
+        if self.workers > 1 and page_count >= self.min_pages and len(ranges) > 1:
+            range_texts = self._extract_parallel(file_path, ranges)
+        else:
+            range_texts = (extract_page_range(file_path, start, stop) for start, stop in ranges)
+
+        try:
+            for (start, _), texts in zip(ranges, range_texts):
+                for offset, text in enumerate(texts):
+                    yield start + offset + 1, text
+        finally:
+            # Pool workers keep theirs until the next file; this process may be long-lived
+            release_pypdf_reader()
+
+    def _extract_parallel(self, file_path: str, ranges: List[Tuple[int, int]]) -> Iterator[List[str]]:
+        # A small window of ranges in flight keeps every worker busy without
+        # buffering pages the chunker has not caught up with
+        window = self.workers * 2
+        futures = deque()
+        next_range = 0
+        try:
+            executor = self._pool()
+            while next_range < len(ranges) or futures:
+                while next_range < len(ranges) and len(futures) < window:
+                    futures.append(executor.submit(extract_page_range, file_path, *ranges[next_range]))
+                    next_range += 1
+                yield futures[0].result()
+                futures.popleft()
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); finish the remaining ranges in-process
+            print(f"⚠️ PDF extraction worker pool failed: {e}; extracting in-process")
+            self.shutdown()
+            for start, stop in ranges[next_range - len(futures):]:
+                yield extract_page_range(file_path, start, stop)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Global instance
+pdf_extraction_pool = PdfExtractionPool(
+    settings.PDF_EXTRACTION_WORKERS,
+    settings.PDF_PAGES_PER_TASK,
+    settings.PDF_PARALLEL_MIN_PAGES
+)
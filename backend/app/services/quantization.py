@@ -0,0 +1,268 @@
+"""Compressed in-memory codes for embedding shards.
+
+Two quantizers are available:
+
+* ``ScalarQuantizer`` ("int8"): one byte per dimension with a per-dimension
+  offset and scale, 4x smaller than float32.
+* ``ProductQuantizer`` ("pq"): the vector is split into ``m`` subspaces and
+  each is replaced by the id of its nearest of 256 sub-centroids, so a
+  384-d vector with m=48 takes 48 bytes (32x smaller).
+
+Search is two-stage: every live row is scored on its codes, then the best
+``rescore`` candidates are re-scored exactly against the float32 rows in the
+memory-mapped shard. Only the codes need to stay resident in RAM.
+"""
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.utils.vectors import top_k
+
+SCORE_BLOCK = 8192
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Plain (Euclidean) k-means, returning the centroids"""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = min(k, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], size=k, replace=False)].copy()
+
+    for _ in range(iterations):
+        # argmin ||x - c||^2 == argmax (2 x.c - ||c||^2)
+        assignments = np.argmax(2 * vectors @ centroids.T - (centroids ** 2).sum(axis=1), axis=1)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=k)
+        present = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts[present])[:-1]])
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids[present] = sums / counts[present, None]
+        empty = counts == 0
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(vectors.shape[0], size=int(empty.sum()), replace=False)]
+
+    return centroids
+
+
+class ScalarQuantizer:
+    """int8 codes with a per-dimension affine transform"""
+
+    kind = "int8"
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    def fit(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        low = vectors.min(axis=0)
+        high = vectors.max(axis=0)
+        self.offset = low
+        self.scale = np.maximum(high - low, 1e-8) / 255.0
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes = np.rint((vectors - self.offset) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def layout(self, codes: np.ndarray) -> np.ndarray:
+        """Memory layout used to keep codes resident"""
+        return np.ascontiguousarray(codes)
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # x ~= (code + 128) * scale + offset, so
+        # x.q ~= code . (scale * q) + (128 * scale + offset) . q
+        weighted = (self.scale * query).astype(np.float32)
+        bias = float((128 * self.scale + self.offset) @ query)
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK):
+            block = codes[start:start + SCORE_BLOCK].astype(np.float32)
+            scores[start:start + SCORE_BLOCK] = block @ weighted
+        return scores + bias
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"offset": self.offset, "scale": self.scale}
+
+    @classmethod
+    def from_state(cls, state) -> "ScalarQuantizer":
+        quantizer = cls(state["offset"].shape[0])
+        quantizer.offset = state["offset"]
+        quantizer.scale = state["scale"]
+        return quantizer
+
+
+class ProductQuantizer:
+    """8-bit product quantization with asymmetric (float query) scoring"""
+
+    kind = "pq"
+
+    def __init__(self, dimension: int, subspaces: int):
+        if dimension % subspaces:
+            raise ValueError(f"PQ subspaces ({subspaces}) must divide the dimension ({dimension})")
+        self.dimension = dimension
+        self.subspaces = subspaces
+        self.subdimension = dimension // subspaces
+        self.codebooks: Optional[np.ndarray] = None  # (subspaces, 256, subdimension)
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        return np.asarray(vectors, dtype=np.float32).reshape(-1, self.subspaces, self.subdimension)
+
+    def fit(self, vectors: np.ndarray, iterations: int = 10, seed: int = 0):
+        parts = self._split(vectors)
+        codebooks = np.zeros((self.subspaces, 256, self.subdimension), dtype=np.float32)
+        for m in range(self.subspaces):
+            centroids = kmeans(parts[:, m, :], 256, iterations, seed + m)
+            codebooks[m, :centroids.shape[0]] = centroids
+        self.codebooks = codebooks
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._split(vectors)
+        codes = np.empty((parts.shape[0], self.subspaces), dtype=np.uint8)
+        squared_norms = (self.codebooks ** 2).sum(axis=2)
+        for m in range(self.subspaces):
+            distances = 2 * parts[:, m, :] @ self.codebooks[m].T - squared_norms[m]
+            codes[:, m] = np.argmax(distances, axis=1)
+        return codes
+
+    def layout(self, codes: np.ndarray) -> np.ndarray:
+        """Column-major, so each subspace's codes are contiguous for the table lookups"""
+        return np.asfortranarray(codes)
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # Lookup table of sub-centroid . sub-query, then sum the table entries per row
+        table = np.einsum("msd,md->ms", self.codebooks, self._split(query)[0])
+        scores = np.zeros(codes.shape[0], dtype=np.float32)
+        for m in range(self.subspaces):
+            scores += np.take(table[m], codes[:, m])
+        return scores
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    @classmethod
+    def from_state(cls, state) -> "ProductQuantizer":
+        codebooks = state["codebooks"]
+        quantizer = cls(codebooks.shape[0] * codebooks.shape[2], codebooks.shape[0])
+        quantizer.codebooks = codebooks
+        return quantizer
+
+
+QUANTIZERS = {
+    ScalarQuantizer.kind: ScalarQuantizer,
+    ProductQuantizer.kind: ProductQuantizer,
+}
+
+
+def make_quantizer(kind: str, dimension: int, subspaces: int = 48):
+    if kind == ScalarQuantizer.kind:
+        return ScalarQuantizer(dimension)
+    if kind == ProductQuantizer.kind:
+        return ProductQuantizer(dimension, subspaces)
+    raise ValueError(f"Unknown quantization: {kind}")
+
+
+class QuantizedIndex:
+    """Quantized codes for the rows of an embedding matrix, with exact re-scoring"""
+
+    def __init__(self, quantizer):
+        self.quantizer = quantizer
+        self.codes: Optional[np.ndarray] = None
+        self.trained_rows = 0
+        self.generation: Optional[int] = None
+
+    @property
+    def kind(self) -> str:
+        return self.quantizer.kind
+
+    @property
+    def dimension(self) -> int:
+        return self.quantizer.dimension
+
+    @property
+    def size(self) -> int:
+        return 0 if self.codes is None else self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self.codes is None else self.codes.nbytes
+
+    def train(self, vectors: np.ndarray, sample_size: int = 20000, seed: int = 0):
+        rows = vectors.shape[0]
+        if sample_size < rows:
+            rng = np.random.default_rng(seed)
+            sample = np.asarray(vectors[np.sort(rng.choice(rows, size=sample_size, replace=False))])
+        else:
+            sample = np.asarray(vectors)
+        self.quantizer.fit(sample)
+        self.trained_rows = rows
+
+    def _encode(self, vectors: np.ndarray, block: int = SCORE_BLOCK) -> np.ndarray:
+        parts = [
+            self.quantizer.encode(np.asarray(vectors[start:start + block]))
+            for start in range(0, vectors.shape[0], block)
+        ]
+        return np.concatenate(parts) if parts else None
+
+    def add(self, vectors: np.ndarray):
+        if vectors.shape[0] == 0:
+            return
+        codes = self._encode(vectors)
+        if self.codes is not None:
+            codes = np.concatenate([self.codes, codes])
+        self.codes = self.quantizer.layout(codes)
+
+    def reset(self, vectors: np.ndarray):
+        self.codes = self.quantizer.layout(self._encode(vectors)) if vectors.shape[0] else None
+
+    def search(
+        self,
+        matrix: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        rescore: int,
+        alive: np.ndarray = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate scoring on codes, then exact re-scoring of the best ``rescore`` rows"""
+        rows = min(self.size, matrix.shape[0])
+        if rows == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        approximate = self.quantizer.score(self.codes[:rows], query)
+        live = rows
+        if alive is not None:
+            approximate = np.where(alive[:rows], approximate, -np.inf)
+            live = int(alive[:rows].sum())
+
+        candidates = top_k(approximate, min(max(rescore, k), live))
+        candidates.sort()  # sequential access pattern for memory-mapped matrices
+        exact = np.asarray(matrix[candidates]) @ query
+        best = top_k(exact, k)
+        return candidates[best], exact[best]
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            kind=np.array(self.kind),
+            codes=self.codes if self.codes is not None else np.empty(0, dtype=np.int8),
+            trained_rows=np.int64(self.trained_rows),
+            generation=np.int64(-1 if self.generation is None else self.generation),
+            **self.quantizer.state()
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["QuantizedIndex"]:
+        try:
+            with np.load(path) as data:
+                quantizer = QUANTIZERS[str(data["kind"])].from_state(data)
+                index = cls(quantizer)
+                codes = data["codes"]
+                index.codes = quantizer.layout(codes) if codes.size else None
+                index.trained_rows = int(data["trained_rows"])
+                generation = int(data["generation"])
+                index.generation = None if generation < 0 else generation
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+        return index
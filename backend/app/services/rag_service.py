@@ -1,17 +1,54 @@
 from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
+import time
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from sentence_transformers import SentenceTransformer
+from sqlalchemy import text, bindparam
 import numpy as np
-from app.models.models import DocumentChunk, Document, ChunkEmbedding, User
+from app.models.models import DocumentChunk, Document
 from app.core.config import settings
+from app.db.database import SessionLocal
 from app.services.llm_service import llm_service
-import json
+from app.services.answer_cache import answer_cache
+from app.services.batching import MicroBatcher
+from app.services.corpus_version import get_corpus_version
+from app.services.fulltext_search import fulltext_search
+from app.services.fusion import reciprocal_rank_fusion, weighted_score_fusion
+from app.services.keyword_index import keyword_index
+from app.services.model_registry import model_registry
+from app.services.reranker import reranker
+from app.services.vector_index import vector_index
+from app.utils.cache import LRUCache
+from app.utils.vectors import maximal_marginal_relevance, normalize_rows
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a query for caching: lowercase with collapsed whitespace"""
+    return " ".join(query.lower().split())
+
+
+# Shared by every request so that concurrent retrieval legs are bounded
+_retrieval_pool = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
 
 
 class RAGService:
     def __init__(self):
-        self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        self.query_embedding_cache = LRUCache(
+            max_bytes=settings.QUERY_CACHE_MAX_BYTES,
+            ttl_seconds=settings.QUERY_CACHE_TTL_SECONDS
+        )
+        # Per retrieval leg: runs, timeouts, failures, and timed-out legs still occupying a thread
+        self.leg_stats = {
+            name: {"runs": 0, "timeouts": 0, "failures": 0, "abandoned_running": 0}
+            for name in ("dense", "lexical")
+        }
+        self._leg_stats_lock = threading.Lock()
+        self.embedding_batcher = MicroBatcher(
+            "query_embedding",
+            self._embed_batch,
+            max_batch=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+            enabled=settings.MICROBATCH_ENABLED
+        )
         self.system_prompt = """You are KnowledgeForge, a professional AI assistant that provides clean, well-structured answers based on uploaded documents.
 
 Instructions for responses:
@@ -30,99 +67,116 @@ Question: {question}
 
 Answer:"""
 
+    @property
+    def embedding_model(self):
+        """Sentence embedding model shared through the model registry"""
+        return model_registry.get("embedding")
+
+    def _embed_batch(self, queries: List[str]) -> List[np.ndarray]:
+        """Encode a batch of queries in one forward pass"""
+        embeddings = self.embedding_model.encode(queries, batch_size=len(queries), normalize_embeddings=True)
+        # Copies, so a cached query vector does not keep the whole batch alive
+        return [np.array(embedding) for embedding in embeddings]
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Encode a query into a normalized embedding vector, reusing cached encodings"""
+        normalized_query = normalize_query(query)
+        key = (settings.EMBEDDING_MODEL, normalized_query)
+        embedding = self.query_embedding_cache.get(key)
+        if embedding is None:
+            embedding = self.embedding_batcher(normalized_query)
+            embedding.setflags(write=False)  # shared between requests
+            self.query_embedding_cache.set(key, embedding)
+        return embedding
+
+    def _dense_scores(self, db: Session, query: str, user_id: int, limit: int, similarity_threshold: float) -> List[Tuple[int, float]]:
+        """Dense leg: ``(chunk_id, cosine_similarity)`` pairs above the threshold"""
+        return self._dense_leg(db, query, user_id, limit, similarity_threshold)[1]
+
+    def _dense_leg(
+        self, db: Session, query: str, user_id: int, limit: int, similarity_threshold: float
+    ) -> Tuple[Optional[np.ndarray], List[Tuple[int, float]]]:
+        """The query embedding and the dense leg's scores, so callers need not look the embedding up again"""
+        if not query.strip():
+            return None, []
+        embedding = self.embed_query(query)
+        scored_chunks = vector_index.search(db, user_id, embedding, limit)
+        return embedding, [(chunk_id, score) for chunk_id, score in scored_chunks if score >= similarity_threshold]
+    
+    def _keyword_scores(self, db: Session, query: str, user_id: int, limit: int) -> List[Tuple[int, float]]:
+        """Lexical leg: ``(chunk_id, score)`` pairs from the configured keyword backend"""
+        if settings.KEYWORD_SEARCH_BACKEND == "database":
+            return fulltext_search.search(db, user_id, query, limit)
+        return keyword_index.search(db, user_id, query, limit)
+    
     def search_similar_chunks(
         self, 
         db: Session, 
         query: str, 
         user_id: int, 
         limit: int = 10,
-        similarity_threshold: float = 0.7
+        similarity_threshold: Optional[float] = None
     ) -> List[Tuple[DocumentChunk, Document, float]]:
-        """Enhanced search for document chunks using improved text matching"""
+        """Dense search over the user's chunk embeddings using cosine similarity"""
         
-        # Extract keywords from query
-        keywords = [word.lower().strip() for word in query.lower().split() if len(word.strip()) > 2]
-        
-        if not keywords:
-            return []
+        if similarity_threshold is None:
+            similarity_threshold = settings.SIMILARITY_THRESHOLD
         
-        # First, try exact phrase matching
-        exact_phrase_results = self._search_exact_phrases(db, query, user_id, limit)
-        if exact_phrase_results:
-            return exact_phrase_results
+        scored_chunks = self._dense_scores(db, query, user_id, limit, similarity_threshold)
+        if scored_chunks:
+            return self._fetch_scored_chunks(db, scored_chunks, user_id)
         
-        # Then try improved keyword matching with scoring
-        return self._search_keywords_with_scoring(db, keywords, user_id, limit)
+        # Fall back to keyword matching for documents without usable embeddings
+        return self.search_keywords(db, query, user_id, limit)
     
-    def _search_exact_phrases(self, db: Session, query: str, user_id: int, limit: int) -> List[Tuple[DocumentChunk, Document, float]]:
-        """Search for exact phrases first"""
-        
-        # Look for key phrases in the query
-        key_phrases = []
-        query_lower = query.lower()
-        
-        # Extract multi-word phrases
-        if "real time emotion" in query_lower or "emotion recognition" in query_lower:
-            key_phrases.append("real-time emotion")
-            key_phrases.append("emotion recognition")
-        elif "machine learning" in query_lower:
-            key_phrases.append("machine learning")
-        elif "text to image" in query_lower or "text-to-image" in query_lower:
-            key_phrases.append("text-to-image")
-        
-        if not key_phrases:
+    def search_keywords(
+        self,
+        db: Session,
+        query: str,
+        user_id: int,
+        limit: int = 10
+    ) -> List[Tuple[DocumentChunk, Document, float]]:
+        """Keyword search over the user's chunks with the configured backend"""
+        scored_chunks = self._keyword_scores(db, query, user_id, limit)
+        if not scored_chunks:
             return []
-        
-        # Search for these exact phrases
-        phrase_conditions = []
-        params = {'user_id': user_id, 'limit': limit}
-        
-        for i, phrase in enumerate(key_phrases):
-            param_name = f'phrase_{i}'
-            phrase_conditions.append(f"LOWER(dc.content) LIKE :{param_name}")
-            params[param_name] = f"%{phrase}%"
-        
-        phrase_where = " OR ".join(phrase_conditions)
-        
-        sql_query = text(f"""
-            SELECT 
-                dc.id as chunk_id,
-                dc.content,
-                dc.chunk_index,
-                dc.doc_metadata,
-                d.id as doc_id,
-                d.title,
-                d.filename,
-                d.file_type,
-                0.9 as similarity
-            FROM document_chunks dc
-            JOIN documents d ON dc.document_id = d.id
-            WHERE d.user_id = :user_id 
-            AND d.status = 'completed'
-            AND ({phrase_where})
-            ORDER BY dc.chunk_index ASC
-            LIMIT :limit
-        """)
-        
-        results = db.execute(sql_query, params).fetchall()
-        return self._convert_results_to_objects(results, user_id)
+        return self._fetch_scored_chunks(db, scored_chunks, user_id)
     
-    def _search_keywords_with_scoring(self, db: Session, keywords: List[str], user_id: int, limit: int) -> List[Tuple[DocumentChunk, Document, float]]:
-        """Enhanced keyword search with better scoring"""
-        
-        # Build dynamic WHERE clause for multiple keywords
-        keyword_conditions = []
-        params = {'user_id': user_id, 'limit': limit}
-        
-        for i, keyword in enumerate(keywords):
-            param_name = f'keyword_{i}'
-            keyword_conditions.append(f"(LOWER(dc.content) LIKE :{param_name} OR LOWER(d.title) LIKE :{param_name})")
-            params[param_name] = f"%{keyword}%"
-        
-        keyword_where = " OR ".join(keyword_conditions)
+    def diversify(
+        self,
+        db: Session,
+        query: str,
+        user_id: int,
+        candidates: List[Tuple[DocumentChunk, Document, float]],
+        limit: int,
+        mmr_lambda: Optional[float] = None,
+        duplicate_threshold: Optional[float] = None
+    ) -> List[Tuple[DocumentChunk, Document, float]]:
+        """Pick ``limit`` candidates by maximal marginal relevance, skipping near-duplicates.
+
+        Relevance is the candidates' first-stage (fused) score, min-max
+        normalized, so keyword-only hits keep their rank. Candidates missing
+        from the vector index get zero vectors, which add no redundancy.
+        """
+        if mmr_lambda is None:
+            mmr_lambda = settings.MMR_LAMBDA
+        if duplicate_threshold is None:
+            duplicate_threshold = settings.DUPLICATE_SIMILARITY_THRESHOLD
+        if len(candidates) <= 1:
+            return candidates[:limit]
+        
+        vectors = vector_index.vectors(db, user_id, [chunk.id for chunk, _, _ in candidates])
+        scores = np.array([score for _, _, score in candidates], dtype=np.float32)
+        span = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / span if span > 0 else np.ones_like(scores)
+        selected = maximal_marginal_relevance(relevance, vectors, limit, mmr_lambda, duplicate_threshold)
+        return [candidates[i] for i in selected]
+    
+    def _fetch_scored_chunks(self, db: Session, scored_chunks: List[Tuple[int, float]], user_id: int) -> List[Tuple[DocumentChunk, Document, float]]:
+        """Load chunk rows for ``(chunk_id, score)`` pairs, keeping the score order"""
         
-        # Enhanced search with better ordering
-        sql_query = text(f"""
+        scores = dict(scored_chunks)
+        sql_query = text("""
             SELECT 
                 dc.id as chunk_id,
                 dc.content,
@@ -131,23 +185,20 @@ Answer:"""
                 d.id as doc_id,
                 d.title,
                 d.filename,
-                d.file_type,
-                CASE 
-                    WHEN LOWER(dc.content) LIKE '%project%' THEN 0.9
-                    WHEN LOWER(dc.content) LIKE '%built%' THEN 0.8
-                    ELSE 0.7
-                END as similarity
+                d.file_type
             FROM document_chunks dc
             JOIN documents d ON dc.document_id = d.id
             WHERE d.user_id = :user_id 
             AND d.status = 'completed'
-            AND ({keyword_where})
-            ORDER BY similarity DESC, LENGTH(dc.content) ASC
-            LIMIT :limit
-        """)
-        
-        results = db.execute(sql_query, params).fetchall()
-        return self._convert_results_to_objects(results, user_id)
+            AND dc.id IN :chunk_ids
+        """).bindparams(bindparam('chunk_ids', expanding=True))
+        
+        rows = db.execute(sql_query, {'user_id': user_id, 'chunk_ids': list(scores)}).fetchall()
+        rows = sorted(rows, key=lambda row: scores[row.chunk_id], reverse=True)
+        return [
+            (chunk, doc, scores[chunk.id])
+            for chunk, doc, _ in self._convert_results_to_objects(rows, user_id)
+        ]
     
     def _convert_results_to_objects(self, results, user_id: int) -> List[Tuple[DocumentChunk, Document, float]]:
         """Convert database results to objects"""
@@ -171,15 +222,19 @@ Answer:"""
                 user_id=user_id
             )
             
-            chunks_with_docs.append((chunk, doc, float(row.similarity)))
+            similarity = getattr(row, 'similarity', 0.0)
+            chunks_with_docs.append((chunk, doc, float(similarity)))
         
         return chunks_with_docs
 
-    def generate_response(self, query: str, context_chunks: List[Tuple[DocumentChunk, Document, float]]) -> str:
-        """Generate intelligent response using the enhanced LLM with concept understanding"""
+    def generate_response(self, query: str, context_chunks: List[Tuple[DocumentChunk, Document, float]]) -> Tuple[str, bool]:
+        """Generate intelligent response using the enhanced LLM with concept understanding.
+
+        Returns the response and whether it is a fallback produced without the QA model.
+        """
         
         if not context_chunks:
-            return "I couldn't find any relevant information in your uploaded documents to answer this question. Please make sure you have uploaded documents that contain information related to your query."
+            return "I couldn't find any relevant information in your uploaded documents to answer this question. Please make sure you have uploaded documents that contain information related to your query.", False
         
         # Prepare context from chunks
         context_parts = []
@@ -189,49 +244,84 @@ Answer:"""
         context = "\n\n".join(context_parts)
         
         # Use enhanced LLM to generate intelligent response with concept understanding
-        response = llm_service.generate_enhanced_response(query, context)
-        
-        return response
+        return llm_service.generate_enhanced_response(query, context)
 
     def chat(
         self, 
         db: Session, 
         user_id: int, 
         query: str, 
-        limit: int = 5
+        limit: int = 5,
+        mmr_lambda: Optional[float] = None,
+        duplicate_threshold: Optional[float] = None
     ) -> Dict[str, Any]:
         """Main chat function that handles the RAG pipeline"""
         
+        if mmr_lambda is None:
+            mmr_lambda = settings.MMR_LAMBDA
+        if duplicate_threshold is None:
+            duplicate_threshold = settings.DUPLICATE_SIMILARITY_THRESHOLD
+        
         try:
-            # Search for relevant chunks
-            similar_chunks = self.search_similar_chunks(db, query, user_id, limit)
+            # Read the version before retrieving so a cached answer is never older than its key
+            corpus_version = get_corpus_version(db, user_id)
+            cache_key = (normalize_query(query), limit, mmr_lambda, duplicate_threshold)
+            cached = answer_cache.get(user_id, cache_key, corpus_version)
+            if cached is not None:
+                return cached
+
+            # Search for relevant chunks, dropping near-duplicates (e.g. overlapping neighbours)
+            pool = max(limit, settings.MMR_CANDIDATES)
+            if settings.RERANK_ENABLED:
+                pool = max(pool, settings.RERANK_CANDIDATES)
+            candidates, degraded_legs, query_embedding = self.hybrid_search(db, query, user_id, pool)
+            rerank_scores = None
+            if settings.RERANK_ENABLED:
+                candidates = self.diversify(db, query, user_id, candidates, len(candidates), mmr_lambda, duplicate_threshold)
+                similar_chunks, rerank_scores = reranker.rerank(query, candidates, limit)
+            else:
+                similar_chunks = self.diversify(db, query, user_id, candidates, limit, mmr_lambda, duplicate_threshold)
             
             if not similar_chunks:
-                return {
+                result = {
                     "response": "I couldn't find any relevant information in your uploaded documents to answer this question.",
                     "sources": [],
                     "success": True
                 }
+                if not degraded_legs:
+                    answer_cache.set(user_id, cache_key, corpus_version, result)
+                return result
             
             # Generate response
-            response = self.generate_response(query, similar_chunks)
+            response, used_fallback = self.generate_response(query, similar_chunks)
             
-            # Prepare sources information
+            # Prepare sources information. similarity_score stays the 0-1 dense cosine and
+            # retrieval_score is the first-stage fused score; when the cross-encoder
+            # reordered the sources, the score it ordered them by is rerank_score
+            cosines = self.cosine_similarities(db, user_id, query_embedding, [chunk.id for chunk, _, _ in similar_chunks])
+            if rerank_scores is None:
+                rerank_scores = [None] * len(similar_chunks)
             sources = []
-            for chunk, document, similarity in similar_chunks:
+            for (chunk, document, score), cosine, rerank_score in zip(similar_chunks, cosines, rerank_scores):
                 sources.append({
                     "document_id": document.id,
                     "document_title": document.title,
                     "chunk_id": chunk.id,
-                    "similarity_score": similarity,
+                    "similarity_score": cosine,
+                    "retrieval_score": score,
+                    "rerank_score": rerank_score,
                     "content_preview": chunk.content[:200] + "..." if len(chunk.content) > 200 else chunk.content
                 })
             
-            return {
+            result = {
                 "response": response,
                 "sources": sources,
                 "success": True
             }
+            # Degraded answers (a retrieval leg dropped or stale, no QA model yet) are not kept for the TTL
+            if not degraded_legs and not used_fallback:
+                answer_cache.set(user_id, cache_key, corpus_version, result)
+            return result
             
         except Exception as e:
             return {
@@ -241,83 +331,118 @@ Answer:"""
                 "error": str(e)
             }
 
+    def cosine_similarities(
+        self, db: Session, user_id: int, embedding: Optional[np.ndarray], chunk_ids: List[int]
+    ) -> List[float]:
+        """Dense cosine similarity of each chunk to the query embedding; 0.0 for chunks without an
+        indexed vector, and for every chunk when there is no embedding (the dense leg failed)"""
+        if not chunk_ids or embedding is None:
+            return [0.0] * len(chunk_ids)
+        vectors = vector_index.vectors(db, user_id, chunk_ids)
+        return [float(score) for score in vectors @ normalize_rows(embedding)[0]]
+
+    def _run_leg(self, leg, timeout_ms: int, *args) -> Any:
+        """Run a retrieval leg on a worker thread with its own database session.
+
+        A late leg is dropped by the caller but cannot be interrupted, so on
+        PostgreSQL its queries are bounded by a statement timeout as well.
+        """
+        db = SessionLocal()
+        try:
+            if db.get_bind().dialect.name == "postgresql":
+                db.execute(text("SELECT set_config('statement_timeout', :timeout, true)"),
+                           {'timeout': str(int(timeout_ms))})
+            return leg(db, *args)
+        finally:
+            db.close()
+
+    def _count_leg(self, name: str, outcome: str, amount: int = 1):
+        with self._leg_stats_lock:
+            self.leg_stats[name][outcome] += amount
+
+    def retrieval_stats(self) -> Dict[str, Dict[str, int]]:
+        with self._leg_stats_lock:
+            return {name: dict(stats) for name, stats in self.leg_stats.items()}
+
     def hybrid_search(
         self,
         db: Session,
         query: str,
         user_id: int,
         limit: int = 10
-    ) -> List[Tuple[DocumentChunk, Document, float]]:
-        """Hybrid search combining vector similarity and keyword matching"""
-        
-        # Vector search
-        vector_results = self.search_similar_chunks(db, query, user_id, limit)
-        
-        # Keyword search (simple text matching for now)
-        keywords = query.lower().split()
-        keyword_query = text("""
-            SELECT 
-                dc.id as chunk_id,
-                dc.content,
-                dc.chunk_index,
-                dc.doc_metadata,
-                d.id as doc_id,
-                d.title,
-                d.filename,
-                d.file_type,
-                0.5 as similarity
-            FROM document_chunks dc
-            JOIN documents d ON dc.document_id = d.id
-            WHERE d.user_id = :user_id 
-            AND d.status = 'completed'
-            AND (
-                LOWER(dc.content) LIKE :keyword1
-                OR LOWER(dc.content) LIKE :keyword2
-            )
-            ORDER BY d.created_at DESC
-            LIMIT :limit
-        """)
-        
-        keyword_params = {'user_id': user_id, 'limit': limit}
-        for i, keyword in enumerate(keywords[:2]):  # Use first 2 keywords
-            keyword_params[f'keyword{i+1}'] = f'%{keyword}%'
-        
-        # Fill remaining keyword parameters
-        for i in range(len(keywords), 2):
-            keyword_params[f'keyword{i+1}'] = '%%'
-        
-        keyword_results = db.execute(keyword_query, keyword_params).fetchall()
-        
-        # Combine and deduplicate results
-        all_results = {}
-        
-        # Add vector results
-        for chunk, doc, similarity in vector_results:
-            all_results[chunk.id] = (chunk, doc, similarity)
-        
-        # Add keyword results (with lower scores to prioritize vector search)
-        for row in keyword_results:
-            if row.chunk_id not in all_results:
-                chunk = DocumentChunk(
-                    id=row.chunk_id,
-                    content=row.content,
-                    chunk_index=row.chunk_index,
-                    doc_metadata=row.doc_metadata,
-                    document_id=row.doc_id
-                )
-                doc = Document(
-                    id=row.doc_id,
-                    title=row.title,
-                    filename=row.filename,
-                    file_type=row.file_type,
-                    user_id=user_id
-                )
-                all_results[chunk.id] = (chunk, doc, 0.3)  # Lower score for keyword matches
-        
-        # Sort by similarity score
-        sorted_results = sorted(all_results.values(), key=lambda x: x[2], reverse=True)
-        
-        return sorted_results[:limit]
+    ) -> Tuple[List[Tuple[DocumentChunk, Document, float]], List[str], Optional[np.ndarray]]:
+        """Hybrid search: dense and lexical legs run concurrently and are fused.
+
+        Each leg has its own timeout; a leg that is late or fails is dropped
+        and the other leg's results are used on their own. Returns the results,
+        the names of the legs that were dropped or answered from an index
+        still catching up with the corpus, and the query embedding (None if
+        the dense leg was dropped).
+        """
+        candidates = max(limit, settings.HYBRID_CANDIDATES)
+        started = time.monotonic()
+        legs = {
+            "dense": (
+                _retrieval_pool.submit(
+                    self._run_leg, self._dense_leg, settings.DENSE_LEG_TIMEOUT_MS,
+                    query, user_id, candidates, settings.SIMILARITY_THRESHOLD
+                ),
+                settings.DENSE_LEG_TIMEOUT_MS,
+            ),
+            "lexical": (
+                _retrieval_pool.submit(
+                    self._run_leg, self._keyword_scores, settings.LEXICAL_LEG_TIMEOUT_MS,
+                    query, user_id, candidates
+                ),
+                settings.LEXICAL_LEG_TIMEOUT_MS,
+            ),
+        }
+        
+        rankings = {}
+        degraded = []
+        query_embedding = None
+        for name, (future, timeout_ms) in legs.items():
+            remaining = max(0.0, started + timeout_ms / 1000 - time.monotonic())
+            self._count_leg(name, "runs")
+            try:
+                result = future.result(timeout=remaining)
+                if name == "dense":
+                    query_embedding, result = result
+                rankings[name] = result
+            except FutureTimeoutError:
+                degraded.append(name)
+                self._count_leg(name, "timeouts")
+                if not future.cancel():
+                    # Already running: it keeps its pool thread until it finishes
+                    self._count_leg(name, "abandoned_running")
+                    future.add_done_callback(lambda _, name=name: self._count_leg(name, "abandoned_running", -1))
+                print(f"⚠️ {name} retrieval timed out after {timeout_ms} ms; continuing without it")
+            except Exception as e:
+                degraded.append(name)
+                self._count_leg(name, "failures")
+                print(f"⚠️ {name} retrieval failed: {e}")
+        
+        version = get_corpus_version(db, user_id)
+        if (
+            "lexical" in rankings
+            and settings.KEYWORD_SEARCH_BACKEND != "database"
+            and not keyword_index.is_current(user_id, version)
+        ):
+            # Served from the previous snapshot while the index reloads
+            degraded.append("lexical")
+        if "dense" in rankings and not vector_index.is_current(user_id, version):
+            # Served from the shard's current rows while it catches up
+            degraded.append("dense")
+        
+        weights = {"dense": settings.HYBRID_DENSE_WEIGHT, "lexical": 1 - settings.HYBRID_DENSE_WEIGHT}
+        if settings.HYBRID_FUSION == "weighted":
+            fused = weighted_score_fusion(rankings, weights)
+        else:
+            fused = reciprocal_rank_fusion(rankings, settings.HYBRID_RRF_K, weights)
+        
+        if not fused:
+            return [], degraded, query_embedding
+        return self._fetch_scored_chunks(db, fused[:limit], user_id), degraded, query_embedding
 
 
 # Global instance
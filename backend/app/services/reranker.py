@@ -0,0 +1,74 @@
+"""Second-stage reranking of retrieved chunks with a cross-encoder.
+
+The cross-encoder reads each (query, chunk) pair jointly, which ranks much
+better than comparing independently computed embeddings, but costs a
+transformer forward pass per pair. All candidates are scored in one batch
+on a dedicated thread; if that does not finish within the request's time
+budget, the first-stage order is kept.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.models import Document, DocumentChunk
+from app.services.model_registry import model_registry
+
+ScoredChunk = Tuple[DocumentChunk, Document, float]
+
+
+class CrossEncoderReranker:
+    """Reorders first-stage candidates by cross-encoder relevance"""
+
+    def __init__(self, workers: int = 1):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank")
+
+    @property
+    def model(self):
+        """The cross-encoder, loaded through the model registry on first use"""
+        return model_registry.get("reranker")
+
+    def score(self, query: str, passages: List[str]) -> np.ndarray:
+        """Relevance of each passage to the query, in one batched forward pass"""
+        pairs = [(query, passage) for passage in passages]
+        return np.asarray(self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False))
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[ScoredChunk],
+        limit: int,
+        budget_ms: Optional[int] = None
+    ) -> Tuple[List[ScoredChunk], Optional[List[float]]]:
+        """Best ``limit`` candidates by cross-encoder score, with those scores.
+
+        The candidates keep their first-stage scores. Over budget, or when
+        there is nothing to reorder, the first ``limit`` are returned with None.
+        """
+        if len(candidates) <= 1:
+            return candidates[:limit], None
+        budget_ms = settings.RERANK_BUDGET_MS if budget_ms is None else budget_ms
+
+        started = time.monotonic()
+        future = self._pool.submit(self.score, query, [chunk.content for chunk, _, _ in candidates])
+        try:
+            scores = future.result(timeout=budget_ms / 1000)
+        except FutureTimeoutError:
+            future.cancel()
+            print(f"⚠️ Reranking exceeded {budget_ms} ms; keeping first-stage order")
+            return candidates[:limit], None
+        except Exception as e:
+            print(f"⚠️ Reranking failed: {e}; keeping first-stage order")
+            return candidates[:limit], None
+
+        # Stable sort so ties keep their first-stage order
+        order = np.argsort(-scores, kind="stable")[:limit]
+        if settings.DEBUG:
+            print(f"✅ Reranked {len(candidates)} candidates in {(time.monotonic() - started) * 1000:.0f} ms")
+        return [candidates[i] for i in order], [float(scores[i]) for i in order]
+
+
+# Global instance
+reranker = CrossEncoderReranker()
@@ -0,0 +1,388 @@
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.services.ann_index import IVFIndex, default_nlist
+from app.services.embedding_store import EmbeddingBatch, EmbeddingShard, ShardView, vector_data_dir
+from app.services.corpus_version import get_corpus_version
+from app.services.quantization import QuantizedIndex, make_quantizer
+from app.utils.embeddings import load_stored_embedding
+from app.utils.vectors import normalize_rows, top_k
+
+DOCUMENT_BATCH = 500  # Document ids per IN (...) when loading changed documents
+FULL_RELOAD_SHARE = 0.5  # Rebuild the shard when more than this share of documents changed
+
+
+class VectorIndex:
+    """Dense retrieval index over per-user embedding shards.
+
+    A user's shard is built from ``chunk_embeddings`` the first time it is
+    searched and is then kept current through ``add_document`` /
+    ``remove_document``. Shards live on disk and are memory-mapped, so a
+    restarted worker can serve immediately and workers share page cache.
+    A shard records the corpus version it reflects; when a change made
+    elsewhere (e.g. an ingestion worker on another host) has not reached
+    it, a background thread appends the documents published since and
+    drops deleted ones, while searches keep using the current rows.
+
+    Derived indexes (IVF lists, quantized codes) are trained and rebuilt on
+    a background thread per user. Until one is ready, searches for that user
+    fall back to exact search, or keep using the previous index when it is
+    only being retrained for growth.
+    """
+
+    def __init__(self, data_dir: str = None, dimension: int = None):
+        self.data_dir = data_dir
+        self.dimension = dimension or settings.VECTOR_DIMENSION
+        self._shards: Dict[int, EmbeddingShard] = {}
+        self._ann: Dict[int, IVFIndex] = {}
+        self._codes: Dict[int, QuantizedIndex] = {}
+        self._lock = threading.Lock()
+        self._derived_locks: Dict[Tuple[str, int], threading.Lock] = {}
+        self._building: Set[Tuple[str, int]] = set()
+        # Derived indexes waiting to be written by a background saver, and the keys being saved
+        self._unsaved: Dict[Tuple[str, int], Tuple[Any, str]] = {}
+        self._saving: Set[Tuple[str, int]] = set()
+        self._catching_up: Set[int] = set()
+
+    def _shard(self, user_id: int) -> EmbeddingShard:
+        with self._lock:
+            shard = self._shards.get(user_id)
+            if shard is None:
+                shard = EmbeddingShard(self.data_dir or vector_data_dir(), user_id, self.dimension)
+                self._shards[user_id] = shard
+            return shard
+
+    def _iter_database_embeddings(self, db: Session, user_id: int, batch_size: int = 1000) -> Iterator[EmbeddingBatch]:
+        """Stream a user's stored embeddings from the database in batches"""
+        result = db.execute(text("""
+            SELECT
+                ce.chunk_id,
+                dc.document_id,
+                ce.embedding_vector,
+                ce.embedding
+            FROM chunk_embeddings ce
+            JOIN document_chunks dc ON ce.chunk_id = dc.id
+            JOIN documents d ON dc.document_id = d.id
+            WHERE d.user_id = :user_id
+            AND d.status = 'completed'
+            ORDER BY dc.document_id, dc.chunk_index
+        """).execution_options(yield_per=batch_size), {'user_id': user_id})
+
+        for rows in result.partitions(batch_size):
+            chunk_ids, document_ids, vectors = [], [], []
+            for row in rows:
+                vector = load_stored_embedding(row.embedding_vector, row.embedding)
+                if vector is None or vector.shape[0] != self.dimension:
+                    continue
+                chunk_ids.append(row.chunk_id)
+                document_ids.append(row.document_id)
+                vectors.append(vector)
+            if vectors:
+                yield chunk_ids, document_ids, np.stack(vectors)
+
+    def _view(self, db: Session, user_id: int) -> Optional[ShardView]:
+        shard = self._shard(user_id)
+        # Read the version first: a change landing during a build only causes a catch-up
+        version = get_corpus_version(db, user_id)
+        view = shard.view()
+        if view is None:
+            shard.build(self._iter_database_embeddings(db, user_id), corpus_version=version)
+            view = shard.view()
+        elif view.corpus_version < version:
+            self._catch_up_in_background(user_id)
+        return view
+
+    def _catch_up_in_background(self, user_id: int):
+        """Bring a stale shard up to date on its own thread, unless that is already running"""
+        with self._lock:
+            if user_id in self._catching_up:
+                return
+            self._catching_up.add(user_id)
+
+        def run():
+            db = SessionLocal()
+            try:
+                self._catch_up(db, user_id)
+            except Exception as e:
+                print(f"⚠️ Vector shard catch-up for user {user_id} failed: {e}")
+            finally:
+                db.close()
+                with self._lock:
+                    self._catching_up.discard(user_id)
+
+        threading.Thread(target=run, name=f"vector-catch-up-{user_id}", daemon=True).start()
+
+    def _catch_up(self, db: Session, user_id: int):
+        """Append the documents published after the shard's corpus version and drop deleted ones"""
+        shard = self._shard(user_id)
+        version = get_corpus_version(db, user_id)
+        view = shard.view()
+        if view is None or view.corpus_version >= version:
+            return
+        documents = db.execute(text("""
+            SELECT id, corpus_version FROM documents
+            WHERE user_id = :user_id AND status = 'completed'
+        """), {'user_id': user_id}).fetchall()
+        present = set(np.unique(np.asarray(view.document_ids)[view.alive]).tolist())
+        # Documents published before per-document versions existed are appended if missing
+        changed = [row.id for row in documents
+                   if row.id not in present or (row.corpus_version or 0) > view.corpus_version]
+        if len(changed) > len(documents) * FULL_RELOAD_SHARE:
+            shard.build(self._iter_database_embeddings(db, user_id), replace=True, corpus_version=version)
+            return
+
+        for document_id in present - {row.id for row in documents}:
+            shard.remove_document(document_id)
+        query = text("""
+            SELECT ce.chunk_id, dc.document_id, ce.embedding_vector, ce.embedding
+            FROM chunk_embeddings ce
+            JOIN document_chunks dc ON ce.chunk_id = dc.id
+            WHERE dc.document_id IN :document_ids
+            ORDER BY dc.document_id, dc.chunk_index
+        """).bindparams(bindparam('document_ids', expanding=True))
+        for start in range(0, len(changed), DOCUMENT_BATCH):
+            batch = changed[start:start + DOCUMENT_BATCH]
+            rows = defaultdict(lambda: ([], []))
+            for row in db.execute(query, {'document_ids': batch}):
+                vector = load_stored_embedding(row.embedding_vector, row.embedding)
+                if vector is not None and vector.shape[0] == self.dimension:
+                    rows[row.document_id][0].append(row.chunk_id)
+                    rows[row.document_id][1].append(vector)
+            for document_id in batch:
+                chunk_ids, vectors = rows.get(document_id, ([], []))
+                # Without vectors this only removes rows the document had before
+                shard.append_document(
+                    document_id, chunk_ids,
+                    np.stack(vectors) if vectors else np.empty((0, self.dimension), dtype=np.float32)
+                )
+        shard.advance_corpus_version(version)
+
+    def _derived_lock(self, name: str, user_id: int) -> threading.Lock:
+        with self._lock:
+            return self._derived_locks.setdefault((name, user_id), threading.Lock())
+
+    def _sync_index(self, name: str, cache: Dict[int, Any], user_id: int, view: ShardView,
+                    path: str, load: Callable, create: Callable, compatible: Callable) -> Optional[Any]:
+        """Bring a derived index (IVF lists, quantized codes) in line with the shard.
+
+        Only appending new rows happens inline. Training and full
+        re-assignment run in the background; None means there is no usable
+        index until they finish.
+        """
+        key = (name, user_id)
+        with self._derived_lock(name, user_id):
+            index = cache.get(user_id) or load(path)
+            if index is not None and not compatible(index):
+                index = None
+            if index is not None and index.generation != view.generation:
+                # Compaction renumbered the rows; the index is unusable until reassigned
+                cache.pop(user_id, None)
+                if key not in self._building:
+                    self._build_in_background(name, cache, user_id, view, path,
+                                              lambda: self._reset(load, create, compatible, path, view))
+                return None
+            if index is None or view.rows >= index.trained_rows * settings.IVF_RETRAIN_GROWTH:
+                if key not in self._building:
+                    self._build_in_background(name, cache, user_id, view, path,
+                                              lambda: self._train(create, view))
+                if index is None:
+                    return None
+            if index.size < view.rows:
+                index.add(view.matrix[index.size:])
+                self._save_in_background(name, user_id, index, path)
+            cache[user_id] = index
+            return index
+
+    @staticmethod
+    def _train(create: Callable, view: ShardView):
+        index = create(view.rows)
+        index.train(view.matrix)
+        index.add(view.matrix)
+        return index
+
+    @classmethod
+    def _reset(cls, load: Callable, create: Callable, compatible: Callable, path: str, view: ShardView):
+        """Reassign every row with the trained state, on a fresh copy since searches may hold the old one"""
+        index = load(path)
+        if index is None or not compatible(index):
+            return cls._train(create, view)
+        index.reset(view.matrix)
+        return index
+
+    def _build_in_background(self, name: str, cache: Dict[int, Any], user_id: int, view: ShardView,
+                             path: str, build: Callable):
+        """Build a derived index on its own thread and publish it; the caller holds the user's lock"""
+        key = (name, user_id)
+        self._building.add(key)
+
+        def run():
+            try:
+                index = build()
+                index.generation = view.generation
+                with self._derived_lock(name, user_id):
+                    # Rows appended meanwhile are added by the next search
+                    cache[user_id] = index
+                self._save_in_background(name, user_id, index, path)
+            except Exception as e:
+                print(f"⚠️ Building the {name} index for user {user_id} failed: {e}")
+            finally:
+                with self._derived_lock(name, user_id):
+                    self._building.discard(key)
+
+        threading.Thread(target=run, name=f"{name}-index-{user_id}", daemon=True).start()
+
+    def _save_in_background(self, name: str, user_id: int, index: Any, path: str):
+        """Persist a derived index off the request path; only the latest pending state is written.
+
+        ``add`` replaces an index's arrays rather than changing them, so
+        saving needs no lock. An unsaved tail is re-added from the shard
+        after a restart.
+        """
+        key = (name, user_id)
+        with self._lock:
+            self._unsaved[key] = (index, path)
+            if key in self._saving:
+                return
+            self._saving.add(key)
+
+        def run():
+            while True:
+                with self._lock:
+                    pending = self._unsaved.pop(key, None)
+                    if pending is None:
+                        self._saving.discard(key)
+                        return
+                try:
+                    pending[0].save(pending[1])
+                except Exception as e:
+                    print(f"⚠️ Saving the {name} index for user {user_id} failed: {e}")
+
+        threading.Thread(target=run, name=f"{name}-save-{user_id}", daemon=True).start()
+
+    def _ivf(self, user_id: int, view: ShardView) -> Optional[IVFIndex]:
+        return self._sync_index(
+            "ivf", self._ann, user_id, view,
+            self._shard(user_id).auxiliary_path("ivf"),
+            IVFIndex.load,
+            lambda rows: IVFIndex(self.dimension, settings.IVF_NLIST or default_nlist(rows)),
+            lambda index: index.dimension == self.dimension,
+        )
+
+    def _quantized(self, user_id: int, view: ShardView) -> Optional[QuantizedIndex]:
+        kind = settings.VECTOR_QUANTIZATION
+        return self._sync_index(
+            kind, self._codes, user_id, view,
+            self._shard(user_id).auxiliary_path(kind),
+            QuantizedIndex.load,
+            lambda rows: QuantizedIndex(make_quantizer(kind, self.dimension, settings.PQ_SUBSPACES)),
+            lambda index: index.kind == kind and index.dimension == self.dimension,
+        )
+
+    def search(
+        self,
+        db: Session,
+        user_id: int,
+        query_embedding: np.ndarray,
+        limit: int = 10,
+        nprobe: int = None
+    ) -> List[Tuple[int, float]]:
+        """Return ``(chunk_id, cosine_similarity)`` pairs, best first"""
+        view = self._view(db, user_id)
+        if view is None or view.rows == 0:
+            return []
+
+        query = normalize_rows(query_embedding)[0]
+        ivf = None
+        if settings.VECTOR_INDEX_TYPE == "ivf" and view.live_rows >= settings.ANN_MIN_ROWS:
+            ivf = self._ivf(user_id, view)
+        if ivf is not None:
+            rows, scores = ivf.search(
+                view.matrix,
+                query,
+                limit,
+                nprobe or settings.IVF_NPROBE,
+                None if view.all_alive else view.alive
+            )
+            return [(int(view.chunk_ids[row]), float(score)) for row, score in zip(rows, scores)]
+
+        quantized = None
+        # Small corpora are scored exactly; a codebook trained on a few rows is worthless
+        if settings.VECTOR_QUANTIZATION != "none" and view.live_rows >= settings.ANN_MIN_ROWS:
+            quantized = self._quantized(user_id, view)
+        if quantized is not None:
+            rows, scores = quantized.search(
+                view.matrix,
+                query,
+                limit,
+                max(settings.RESCORE_CANDIDATES, limit),
+                None if view.all_alive else view.alive
+            )
+            return [(int(view.chunk_ids[row]), float(score)) for row, score in zip(rows, scores)]
+
+        scores = np.asarray(view.matrix @ query)
+        if not view.all_alive:
+            scores = np.where(view.alive, scores, -np.inf)
+        best = top_k(scores, min(limit, view.live_rows))
+        return [(int(view.chunk_ids[i]), float(scores[i])) for i in best]
+
+    def vectors(self, db: Session, user_id: int, chunk_ids: Sequence[int]) -> np.ndarray:
+        """Normalized embeddings of the given chunks; zero rows for chunks not indexed"""
+        vectors = np.zeros((len(chunk_ids), self.dimension), dtype=np.float32)
+        view = self._view(db, user_id)
+        if view is None or view.rows == 0:
+            return vectors
+        rows = view.rows_for(chunk_ids)
+        found = np.flatnonzero(rows >= 0)
+        vectors[found] = view.matrix[rows[found]]
+        return vectors
+
+    def add_document(
+        self,
+        user_id: int,
+        document_id: int,
+        chunk_ids: Sequence[int],
+        embeddings: Sequence[Sequence[float]]
+    ):
+        """Append a freshly processed document to the user's shard"""
+        # If the shard does not exist yet, the first search builds it from the database
+        self._shard(user_id).append_document(
+            document_id, list(chunk_ids), np.asarray(embeddings, dtype=np.float32)
+        )
+
+    def remove_document(self, user_id: int, document_id: int):
+        """Drop every chunk of a document from the user's shard"""
+        self._shard(user_id).remove_document(document_id)
+
+    def advance_version(self, user_id: int, version: int):
+        """Record that the corpus change which produced ``version`` has been applied to the shard.
+
+        Only a direct successor of the shard's version is accepted; any other
+        gap means another process changed the corpus and a catch-up is needed.
+        """
+        self._shard(user_id).advance_corpus_version(version, expected=version - 1)
+
+    def is_current(self, user_id: int, version: int) -> bool:
+        """Whether the user's shard reflects corpus ``version``"""
+        view = self._shard(user_id).view()
+        return view is not None and view.corpus_version >= version
+
+    def invalidate(self, user_id: int):
+        """Discard a user's shard so it is rebuilt from the database on next search"""
+        self._shard(user_id).destroy()
+        self._ann.pop(user_id, None)
+        self._codes.pop(user_id, None)
+
+    def size(self, user_id: int) -> int:
+        view = self._shard(user_id).view()
+        return view.live_rows if view is not None else 0
+
+
+# Global instance
+vector_index = VectorIndex()
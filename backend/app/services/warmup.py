@@ -0,0 +1,111 @@
+"""Startup warm-up and readiness state of the model-backed services.
+
+Loading a model is not enough for steady-state latency: the first forward
+pass also initializes tokenizers, kernels and thread pools. ``ModelWarmup``
+loads every model a request needs and pushes one dummy input through it on
+a background thread, so ``/health`` answers immediately while ``/ready``
+only succeeds once real requests will not pay that cost.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.chunker import clamp_to_model
+from app.services.model_registry import model_registry
+
+WARMUP_TEXT = "KnowledgeForge warm-up request."
+
+
+def _warm_embedding(model):
+    model.encode([WARMUP_TEXT], normalize_embeddings=True)
+
+
+def _warm_qa(pipeline):
+    pipeline(question="What is this?", context=WARMUP_TEXT)
+
+
+def _warm_reranker(model):
+    model.predict([(WARMUP_TEXT, WARMUP_TEXT)], show_progress_bar=False)
+
+
+WARMERS: Dict[str, Callable[[Any], None]] = {
+    "embedding": _warm_embedding,
+    "qa": _warm_qa,
+    "reranker": _warm_reranker,
+}
+
+
+class ModelWarmup:
+    """Loads and exercises the models needed to serve requests"""
+
+    def __init__(self):
+        self.states: Dict[str, str] = {}  # pending, loading, warming, ready, failed
+        self.errors: Dict[str, str] = {}
+        self.warmup_seconds: Dict[str, float] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def required_models(self) -> List[str]:
+        models = ["embedding", "qa"]
+        if settings.RERANK_ENABLED:
+            models.append("reranker")
+        return models
+
+    def start(self):
+        """Warm up on a background thread; safe to call more than once"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            for name in self.required_models():
+                self.states[name] = "pending"
+            self._thread = threading.Thread(target=self.run, name="model-warmup", daemon=True)
+            self._thread.start()
+
+    def run(self):
+        for name in self.required_models():
+            started = time.monotonic()
+            try:
+                self.states[name] = "loading"
+                model = model_registry.get(name)
+                self.states[name] = "warming"
+                WARMERS[name](model)
+            except Exception as e:
+                self.states[name] = "failed"
+                self.errors[name] = str(e)
+                print(f"⚠️ Warm-up of {name} model failed: {e}")
+                continue
+            self.warmup_seconds[name] = time.monotonic() - started
+            self.states[name] = "ready"
+        # Warn about a chunk size the embedding model would truncate now, not at the first upload
+        clamp_to_model(settings.MAX_CHUNK_TOKENS)
+        print(f"✅ Model warm-up finished: {self.states}")
+
+    def state(self, name: str) -> str:
+        state = self.states.get(name, "pending")
+        if state in ("pending", "failed") and model_registry.is_loaded(name):
+            # Loaded by a request, which also warmed it up; the only way with WARMUP_ON_STARTUP off
+            return "ready"
+        return state
+
+    @property
+    def is_ready(self) -> bool:
+        return all(self.state(name) == "ready" for name in self.required_models())
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness plus per-model warm-up state and registry accounting"""
+        registry_stats = model_registry.stats()
+        models = {}
+        for name in self.required_models():
+            models[name] = {
+                "state": self.state(name),
+                "warmup_seconds": round(self.warmup_seconds[name], 3) if name in self.warmup_seconds else None,
+                **registry_stats[name],
+            }
+            if name in self.errors and models[name]["state"] == "failed":
+                models[name]["error"] = self.errors[name]
+        return {"ready": self.is_ready, "models": models}
+
+
+# Global instance
+model_warmup = ModelWarmup()
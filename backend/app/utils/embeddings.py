@@ -0,0 +1,71 @@
+"""Binary serialization of embedding vectors.
+
+An encoded embedding is a 12 byte header followed by the raw vector:
+
+    magic (4 bytes, b"KFEV") | dtype code (1 byte) | padding (3 bytes) | dimension (uint32 LE)
+
+Values are always stored little-endian so blobs are portable between hosts.
+"""
+import json
+import struct
+from typing import Iterable, Sequence, Union
+
+import numpy as np
+
+MAGIC = b"KFEV"
+HEADER = struct.Struct("<4sB3xI")
+HEADER_SIZE = HEADER.size
+
+# dtype code -> little-endian numpy dtype
+DTYPES = {
+    1: np.dtype("<f4"),
+}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+VectorLike = Union[np.ndarray, Sequence[float]]
+
+
+def encode_embedding(vector: VectorLike, dtype: str = "<f4") -> bytes:
+    """Serialize a 1-d vector into the binary embedding format"""
+    dtype = np.dtype(dtype)
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    array = np.asarray(vector, dtype=dtype).reshape(-1)
+    return HEADER.pack(MAGIC, DTYPE_CODES[dtype], array.shape[0]) + array.tobytes()
+
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    """Deserialize a binary embedding without copying the payload"""
+    if len(blob) < HEADER_SIZE:
+        raise ValueError("Embedding blob is too short")
+    magic, code, dimension = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Embedding blob has an unknown header")
+    if code not in DTYPES:
+        raise ValueError(f"Unknown embedding dtype code: {code}")
+    return np.frombuffer(blob, dtype=DTYPES[code], count=dimension, offset=HEADER_SIZE)
+
+
+def decode_embeddings(blobs: Iterable[bytes], dimension: int) -> np.ndarray:
+    """Decode many float32 blobs of the same dimension into one ``(n, dimension)`` matrix"""
+    payloads = []
+    expected_size = HEADER_SIZE + dimension * 4
+    for blob in blobs:
+        if len(blob) != expected_size:
+            raise ValueError(f"Expected a {dimension}-d float32 embedding")
+        magic, code, blob_dimension = HEADER.unpack_from(blob)
+        if magic != MAGIC or DTYPES.get(code) != np.dtype("<f4") or blob_dimension != dimension:
+            raise ValueError(f"Expected a {dimension}-d float32 embedding")
+        payloads.append(memoryview(blob)[HEADER_SIZE:])
+    if not payloads:
+        return np.empty((0, dimension), dtype=np.float32)
+    return np.frombuffer(b"".join(payloads), dtype="<f4").reshape(-1, dimension)
+
+
+def load_stored_embedding(vector_blob: bytes = None, legacy_json: str = None) -> np.ndarray:
+    """Read an embedding from either the binary column or the legacy JSON column"""
+    if vector_blob:
+        return decode_embedding(vector_blob)
+    if legacy_json:
+        return np.asarray(json.loads(legacy_json), dtype=np.float32)
+    return None
@@ -0,0 +1,20 @@
+"""SHA-256 content hashes used to recognise files and chunks seen before."""
+import hashlib
+
+
+def text_hash(content: str) -> str:
+    """Hex SHA-256 of a text's UTF-8 encoding"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def bytes_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Hex SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
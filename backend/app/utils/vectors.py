@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so that a dot product is a cosine similarity"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def maximal_marginal_relevance(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    diversity_lambda: float,
+    duplicate_threshold: float = 1.0
+) -> np.ndarray:
+    """Greedy MMR selection over a candidate set, best first.
+
+    Each step picks the candidate maximizing
+    ``lambda * relevance - (1 - lambda) * max similarity to those already picked``;
+    candidates at least ``duplicate_threshold`` similar to a pick are dropped.
+    """
+    candidates = relevance.shape[0]
+    similarity = vectors @ vectors.T  # one pairwise matrix for the whole candidate set
+    redundancy = np.zeros(candidates, dtype=np.float32)
+    available = np.ones(candidates, dtype=bool)
+    selected = []
+    while len(selected) < k and available.any():
+        scores = diversity_lambda * relevance - (1 - diversity_lambda) * redundancy
+        best = int(np.argmax(np.where(available, scores, -np.inf)))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        available &= redundancy < duplicate_threshold
+    return np.array(selected, dtype=np.int64)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark the IVF approximate index against exact cosine search.
+
+Reports recall@10 against brute force and p50/p99 query latency on
+synthetic, clustered 384-d vectors (real sentence embeddings are clustered
+by topic, which is what makes IVF work; uniform noise would not be).
+
+    python -m benchmarks.bench_ann --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ann_index import IVFIndex, default_nlist
+from app.utils.vectors import normalize_rows, top_k
+
+
+def synthetic_embeddings(rows: int, dimension: int, topics: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around ``topics`` random directions"""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((topics, dimension), dtype=np.float32))
+    vectors = np.empty((rows, dimension), dtype=np.float32)
+    block = 100000
+    for start in range(0, rows, block):
+        count = min(block, rows - start)
+        labels = rng.integers(0, topics, size=count)
+        noise = rng.standard_normal((count, dimension), dtype=np.float32) * 0.06
+        vectors[start:start + count] = normalize_rows(centers[labels] + noise)
+    return vectors
+
+
+def percentiles(latencies):
+    values = np.asarray(latencies) * 1000
+    return float(np.percentile(values, 50)), float(np.percentile(values, 99))
+
+
+def run(rows: int, dimension: int, queries: int, k: int, nprobes, nlist: int):
+    print(f"\n=== {rows:,} vectors x {dimension}d ===")
+    matrix = synthetic_embeddings(rows, dimension, topics=max(16, rows // 500))
+    rng = np.random.default_rng(1)
+    query_vectors = normalize_rows(
+        matrix[rng.integers(0, rows, size=queries)]
+        + rng.standard_normal((queries, dimension), dtype=np.float32) * 0.05
+    )
+
+    exact_results, exact_latencies = [], []
+    for query in query_vectors:
+        start = time.perf_counter()
+        exact_results.append(set(top_k(matrix @ query, k).tolist()))
+        exact_latencies.append(time.perf_counter() - start)
+    p50, p99 = percentiles(exact_latencies)
+    print(f"exact          recall@{k}=1.000  p50={p50:7.2f} ms  p99={p99:7.2f} ms")
+
+    nlist = nlist or default_nlist(rows)
+    start = time.perf_counter()
+    index = IVFIndex(dimension, nlist)
+    index.train(matrix)
+    index.add(matrix)
+    print(f"ivf build      nlist={index.nlist}  {time.perf_counter() - start:.1f} s")
+
+    for nprobe in nprobes:
+        hits, latencies = 0, []
+        for query, expected in zip(query_vectors, exact_results):
+            start = time.perf_counter()
+            found, _ = index.search(matrix, query, k, nprobe)
+            latencies.append(time.perf_counter() - start)
+            hits += len(expected.intersection(found.tolist()))
+        p50, p99 = percentiles(latencies)
+        recall = hits / (k * queries)
+        print(f"ivf nprobe={nprobe:<4} recall@{k}={recall:.3f}  p50={p50:7.2f} ms  p99={p99:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="0 picks 4 * sqrt(rows)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    args = parser.parse_args()
+
+    for rows in args.sizes:
+        run(rows, args.dimension, args.queries, args.k, args.nprobe, args.nlist)
+
+
+if __name__ == "__main__":
+    main()
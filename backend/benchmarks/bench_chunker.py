@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark the token-aware chunker on 1 MB, 10 MB and 100 MB inputs.
+
+Input is synthetic prose fed in 1 MB sections, the way text files are
+streamed during ingestion. Reports throughput, chunk count, mean tokens per
+chunk and (with --memory) peak traced memory. Results can be saved and later
+compared against, failing when throughput regresses:
+
+    python -m benchmarks.bench_chunker --save chunker.json
+    python -m benchmarks.bench_chunker --baseline chunker.json --tolerance 0.2
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.chunker import TokenChunker, approximate_token_offsets, embedding_token_offsets
+from app.services.model_registry import model_registry
+
+MB = 1024 * 1024
+VOCABULARY = (
+    "the of and to in retrieval document knowledge base embedding vector query answer "
+    "chunk token model index search latency throughput memory page section paragraph "
+    "PostgreSQL SQLite transformer attention 2024 v1.2 e.g. naïve café (see above) "
+    "re-ranking state-of-the-art \"quoted\" well-known"
+).split()
+
+
+def synthetic_blocks(seed: int = 0, distinct: int = 8):
+    """A few distinct 1 MB blocks of prose, so generating text is not what gets measured"""
+    rng = np.random.default_rng(seed)
+    blocks = []
+    for _ in range(distinct):
+        parts, size = [], 0
+        while size < MB:
+            words = rng.choice(VOCABULARY, size=int(rng.integers(4, 40)))
+            sentence = " ".join(words).capitalize() + str(rng.choice([".", ".", ".", "?", "!", "..."]))
+            if rng.random() < 0.08:
+                sentence += "\n\n"
+            parts.append(sentence)
+            size += len(sentence) + 1
+        blocks.append(" ".join(parts)[:MB])
+    return blocks
+
+
+def sections(blocks, megabytes: int):
+    for page, block in enumerate(itertools.islice(itertools.cycle(blocks), megabytes), start=1):
+        yield page, block
+
+
+def run(blocks, megabytes: int, token_offsets, memory: bool) -> dict:
+    chunker = TokenChunker(settings.MAX_CHUNK_TOKENS, settings.CHUNK_OVERLAP_TOKENS, token_offsets)
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    chunks = tokens = 0
+    for chunk in chunker.iter_chunks(sections(blocks, megabytes)):
+        chunks += 1
+        tokens += json.loads(chunk['metadata'])['tokens']
+    elapsed = time.perf_counter() - start
+    result = {
+        "seconds": round(elapsed, 3),
+        "mb_per_second": round(megabytes / elapsed, 3),
+        "chunks": chunks,
+        "mean_tokens": round(tokens / max(chunks, 1), 1),
+    }
+    if memory:
+        result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / MB, 1)
+        tracemalloc.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100], help="input sizes in MB")
+    parser.add_argument("--tokenizer", choices=["model", "approximate"], default="model")
+    parser.add_argument("--memory", action="store_true", help="trace peak memory (slows the run down)")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved earlier")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative throughput drop")
+    args = parser.parse_args()
+
+    token_offsets = approximate_token_offsets
+    if args.tokenizer == "model":
+        if model_registry.try_get("tokenizer") is None:
+            print("⚠️ Embedding tokenizer unavailable; using the approximate tokenizer")
+        else:
+            token_offsets = embedding_token_offsets
+
+    blocks = synthetic_blocks()
+    print(f"max {settings.MAX_CHUNK_TOKENS} tokens, overlap {settings.CHUNK_OVERLAP_TOKENS}, tokenizer {args.tokenizer}")
+    results = {}
+    for megabytes in args.sizes:
+        result = results[str(megabytes)] = run(blocks, megabytes, token_offsets, args.memory)
+        line = (f"{megabytes:4d} MB  {result['seconds']:8.2f} s  {result['mb_per_second']:6.2f} MB/s  "
+                f"{result['chunks']:8d} chunks  {result['mean_tokens']:6.1f} tokens/chunk")
+        if "peak_mb" in result:
+            line += f"  peak {result['peak_mb']:.1f} MB"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as handle:
+            json.dump({"tokenizer": args.tokenizer, "results": results}, handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)["results"]
+        regressions = [
+            f"{size} MB: {results[size]['mb_per_second']} MB/s vs {baseline[size]['mb_per_second']} MB/s"
+            for size in results
+            if size in baseline
+            and results[size]['mb_per_second'] < baseline[size]['mb_per_second'] * (1 - args.tolerance)
+        ]
+        if regressions:
+            print("❌ Throughput regressed:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("✅ No throughput regression")
+
+
+if __name__ == "__main__":
+    main()
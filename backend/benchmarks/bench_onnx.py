@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark the torch and ONNX Runtime (fp32 / int8) inference backends.
+
+For the embedding model reports sentences/second at batch size 1 and
+``--batch-size``; for the QA model p50/p99 latency of single questions.
+Model weight sizes are reported alongside.
+
+    python -m benchmarks.bench_onnx --threads 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.model_registry import model_memory_bytes
+from app.services.onnx_backend import OnnxEmbeddingModel, OnnxQuestionAnswering
+from benchmarks.bench_ann import percentiles
+from benchmarks.onnx_parity import QA_PAIRS, SENTENCES
+
+
+def embedding_throughput(model, batch_size: int, sentences: int) -> float:
+    texts = [SENTENCES[i % len(SENTENCES)] + f" #{i}" for i in range(sentences)]
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    started = time.perf_counter()
+    for start in range(0, sentences, batch_size):
+        model.encode(texts[start:start + batch_size], batch_size=batch_size)
+    return sentences / (time.perf_counter() - started)
+
+
+def qa_latencies(pipeline, repeats: int):
+    pipeline(question=QA_PAIRS[0][0], context=QA_PAIRS[0][1])  # warm-up
+    latencies = []
+    for _ in range(repeats):
+        for question, context in QA_PAIRS:
+            started = time.perf_counter()
+            pipeline(question=question, context=context)
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=10, help="passes over the QA samples")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads for both backends (0 = default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+        settings.ONNX_THREADS = args.threads
+
+    from sentence_transformers import SentenceTransformer
+    from transformers import pipeline
+
+    backends = {
+        "torch": (
+            lambda: SentenceTransformer(settings.EMBEDDING_MODEL),
+            lambda: pipeline("question-answering", model=settings.QA_MODEL, device=-1),
+        ),
+        "onnx fp32": (
+            lambda: OnnxEmbeddingModel.from_pretrained(settings.EMBEDDING_MODEL, quantize=False),
+            lambda: OnnxQuestionAnswering.from_pretrained(settings.QA_MODEL, quantize=False),
+        ),
+        "onnx int8": (
+            lambda: OnnxEmbeddingModel.from_pretrained(settings.EMBEDDING_MODEL, quantize=True),
+            lambda: OnnxQuestionAnswering.from_pretrained(settings.QA_MODEL, quantize=True),
+        ),
+    }
+
+    print(f"{'backend':<10} {'weights':>9} {'emb/s b=1':>10} {'emb/s b=' + str(args.batch_size):>11} "
+          f"{'qa p50':>9} {'qa p99':>9}")
+    for name, (load_embedding, load_qa) in backends.items():
+        embedding_model = load_embedding()
+        qa_pipeline = load_qa()
+        weights = model_memory_bytes(embedding_model) + model_memory_bytes(qa_pipeline)
+        single = embedding_throughput(embedding_model, 1, min(args.sentences, 128))
+        batched = embedding_throughput(embedding_model, args.batch_size, args.sentences)
+        p50, p99 = percentiles(qa_latencies(qa_pipeline, args.repeats))
+        print(f"{name:<10} {weights / 1024 / 1024:7.0f}MB {single:10.0f} {batched:11.0f} "
+              f"{p50:7.1f}ms {p99:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
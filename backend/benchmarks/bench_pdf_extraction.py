@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark parallel page-range PDF extraction against a single process.
+
+Synthetic PDFs of increasing page count are written with PyMuPDF, then
+extracted serially and with each worker count. Reports wall time, pages per
+second and the speedup over serial extraction. Worker start-up is included,
+as it is for the first document a fresh ingestion worker processes.
+
+    python -m benchmarks.bench_pdf_extraction --pages 50 200 1000 4000 --workers 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.pdf_extraction import PdfExtractionPool
+
+PARAGRAPH = (
+    "Knowledge bases answer questions from documents. Each page of this synthetic "
+    "report repeats a few sentences so that text extraction has realistic work to do. "
+)
+
+
+def write_pdf(path: str, pages: int, lines_per_page: int = 45):
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        text = "\n".join(f"{page_number + 1}.{line} {PARAGRAPH[:90]}" for line in range(lines_per_page))
+        page.insert_text((36, 48), text, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def time_extraction(pool: PdfExtractionPool, path: str) -> float:
+    start = time.perf_counter()
+    pages = sum(1 for _ in pool.iter_pages(path))
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    return pages, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200, 1000, 4000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument("--pages-per-task", type=int, default=25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for page_count in args.pages:
+            path = os.path.join(directory, f"synthetic-{page_count}.pdf")
+            write_pdf(path, page_count)
+            print(f"\n=== {page_count:,} pages ({os.path.getsize(path) / 1024 / 1024:.1f} MB) ===")
+
+            pages, serial = time_extraction(PdfExtractionPool(1, args.pages_per_task), path)
+            print(f"serial      {serial:8.2f} s  {pages / serial:8.0f} pages/s")
+            for workers in sorted(set(args.workers)):
+                if workers <= 1:
+                    continue
+                pool = PdfExtractionPool(workers, args.pages_per_task, min_pages=1)
+                pages, elapsed = time_extraction(pool, path)
+                print(f"{workers:2d} workers  {elapsed:8.2f} s  {pages / elapsed:8.0f} pages/s  "
+                      f"speedup {serial / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark quantized two-stage search against exact float32 search.
+
+For each quantizer, reports resident bytes per vector, recall@10 against
+brute force and p50/p99 latency, with and without exact re-scoring.
+
+    python -m benchmarks.bench_quantization --sizes 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.quantization import QuantizedIndex, make_quantizer
+from app.utils.vectors import normalize_rows, top_k
+from benchmarks.bench_ann import percentiles, synthetic_embeddings
+
+
+def run(rows: int, dimension: int, queries: int, k: int, rescores, subspaces: int):
+    print(f"\n=== {rows:,} vectors x {dimension}d ===")
+    matrix = synthetic_embeddings(rows, dimension, topics=max(16, rows // 500))
+    rng = np.random.default_rng(1)
+    query_vectors = normalize_rows(
+        matrix[rng.integers(0, rows, size=queries)]
+        + rng.standard_normal((queries, dimension), dtype=np.float32) * 0.05
+    )
+
+    exact_results, latencies = [], []
+    for query in query_vectors:
+        start = time.perf_counter()
+        exact_results.append(set(top_k(matrix @ query, k).tolist()))
+        latencies.append(time.perf_counter() - start)
+    p50, p99 = percentiles(latencies)
+    print(f"float32               {dimension * 4:5d} B/vec  recall@{k}=1.000  p50={p50:7.2f} ms  p99={p99:7.2f} ms")
+
+    for kind in ("int8", "pq"):
+        start = time.perf_counter()
+        index = QuantizedIndex(make_quantizer(kind, dimension, subspaces))
+        index.train(matrix)
+        index.add(matrix)
+        build = time.perf_counter() - start
+        bytes_per_vector = index.nbytes / rows
+        print(f"{kind} build {build:.1f} s")
+
+        for rescore in rescores:
+            hits, latencies = 0, []
+            for query, expected in zip(query_vectors, exact_results):
+                start = time.perf_counter()
+                if rescore:
+                    found, _ = index.search(matrix, query, k, rescore)
+                else:
+                    found = top_k(index.quantizer.score(index.codes, query), k)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected.intersection(found.tolist()))
+            p50, p99 = percentiles(latencies)
+            label = f"{kind} rescore={rescore}"
+            print(f"{label:<21} {bytes_per_vector:5.0f} B/vec  recall@{k}={hits / (k * queries):.3f}  "
+                  f"p50={p50:7.2f} ms  p99={p99:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, nargs="+", default=[0, 50, 200],
+                        help="candidates re-scored exactly; 0 means codes only")
+    parser.add_argument("--subspaces", type=int, default=48)
+    args = parser.parse_args()
+
+    for rows in args.sizes:
+        run(rows, args.dimension, args.queries, args.k, args.rescore, args.subspaces)
+
+
+if __name__ == "__main__":
+    main()
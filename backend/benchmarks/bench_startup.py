@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Measure API cold start.
+
+Two numbers are reported:
+
+* ``python -X importtime -c "import main"``: total import time of the app
+  module and the slowest modules by cumulative import time.
+* Wall-clock time from launching ``uvicorn main:app`` until ``/health``
+  first answers (this includes the startup event, i.e. ``init_db``).
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_times(module: str):
+    """Cumulative import time in microseconds per module, from ``-X importtime``"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2))
+    return times
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_health(timeout: float) -> float:
+    """Seconds from spawning uvicorn until /health returns 200"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"/health did not answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=3, help="repetitions of each measurement")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for /health")
+    args = parser.parse_args()
+
+    totals, slowest = [], None
+    for _ in range(args.runs):
+        times = import_times(args.module)
+        totals.append(times.get(args.module, 0) / 1e6)
+        slowest = times
+    print(f"import {args.module}: best {min(totals) * 1000:.0f} ms, worst {max(totals) * 1000:.0f} ms")
+    print("\nslowest imports (cumulative, last run):")
+    for name, micros in sorted(slowest.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {micros / 1000:9.1f} ms  {name}")
+
+    heavy = [name for name in ("torch", "transformers", "sentence_transformers", "fitz") if name in slowest]
+    if heavy:
+        print(f"\n⚠️ heavy modules on the import path: {', '.join(heavy)}")
+
+    health = [time_to_health(args.timeout) for _ in range(args.runs)]
+    print(f"\nfirst /health: best {min(health) * 1000:.0f} ms, worst {max(health) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
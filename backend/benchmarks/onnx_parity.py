@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Check that the ONNX Runtime backend agrees with the torch models.
+
+* Embeddings: cosine similarity between the torch and ONNX vector of each
+  sample sentence (every one must reach ``--min-cosine``).
+* QA: share of questions whose ONNX answer span overlaps the torch
+  pipeline's span (must reach ``--min-agreement``); exact matches are
+  reported too.
+
+Exits non-zero when a threshold is missed, so it can gate a deployment.
+
+    python -m benchmarks.onnx_parity            # int8
+    python -m benchmarks.onnx_parity --fp32
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.onnx_backend import OnnxEmbeddingModel, OnnxQuestionAnswering
+from app.utils.vectors import normalize_rows
+
+SENTENCES = [
+    "KnowledgeForge answers questions about your uploaded documents.",
+    "Convolutional neural networks detect local features in images.",
+    "The invoice is due within thirty days of delivery.",
+    "PostgreSQL supports full-text search with tsvector columns and GIN indexes.",
+    "Short.",
+    "Reciprocal rank fusion combines several ranked lists without calibrating their scores. " * 8,
+    "El aprendizaje automático permite a los ordenadores aprender de los datos.",
+    "Quarterly revenue grew 12% while operating costs fell.",
+]
+
+QA_PAIRS = [
+    ("When is the invoice due?",
+     "The invoice was issued on March 3. Payment is due within thirty days of delivery, "
+     "and late payments incur a 2% monthly fee."),
+    ("What does a CNN detect?",
+     "Convolutional neural networks use convolutional layers to automatically detect features "
+     "such as edges and textures in images."),
+    ("How much did revenue grow?",
+     "In the last quarter revenue grew 12% to 4.1 million dollars while operating costs fell 3%."),
+    ("Who founded the company?",
+     "The company was founded in 2009 by Maria Lopez and Daniel Chen in Austin, Texas."),
+    ("Which index type does PostgreSQL use for full-text search?",
+     "PostgreSQL stores lexemes in a tsvector column. A GIN index on that column makes "
+     "full-text queries fast even on millions of rows."),
+    ("What is the boiling point of water at sea level?",
+     "At sea level water boils at 100 degrees Celsius; at higher altitudes it boils at lower temperatures. "
+     + "Unrelated filler text about the weather and the seasons. " * 40),
+]
+
+
+def spans_overlap(a, b) -> bool:
+    return a["start"] < b["end"] and b["start"] < a["end"]
+
+
+def check_embeddings(quantize: bool, min_cosine: float) -> bool:
+    from sentence_transformers import SentenceTransformer
+    reference = normalize_rows(SentenceTransformer(settings.EMBEDDING_MODEL).encode(SENTENCES))
+    candidate = normalize_rows(
+        OnnxEmbeddingModel.from_pretrained(settings.EMBEDDING_MODEL, quantize=quantize).encode(SENTENCES)
+    )
+    cosines = (reference * candidate).sum(axis=1)
+    print(f"embeddings: min cosine {cosines.min():.4f}, mean {cosines.mean():.4f} "
+          f"(threshold {min_cosine})")
+    return bool(cosines.min() >= min_cosine)
+
+
+def check_qa(quantize: bool, min_agreement: float) -> bool:
+    from transformers import pipeline
+    reference = pipeline("question-answering", model=settings.QA_MODEL, device=-1)
+    candidate = OnnxQuestionAnswering.from_pretrained(settings.QA_MODEL, quantize=quantize)
+
+    overlaps = exact = 0
+    for question, context in QA_PAIRS:
+        expected = reference(question=question, context=context)
+        actual = candidate(question=question, context=context)
+        overlaps += spans_overlap(expected, actual)
+        exact += (expected["start"], expected["end"]) == (actual["start"], actual["end"])
+        print(f"  {question!r}: torch={expected['answer']!r} onnx={actual['answer']!r}")
+    agreement = overlaps / len(QA_PAIRS)
+    print(f"qa: span overlap {agreement:.0%}, exact {exact / len(QA_PAIRS):.0%} (threshold {min_agreement:.0%})")
+    return agreement >= min_agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fp32", action="store_true", help="check the unquantized export")
+    parser.add_argument("--min-cosine", type=float, default=None,
+                        help="default 0.999 for fp32, 0.98 for int8")
+    parser.add_argument("--min-agreement", type=float, default=0.8)
+    args = parser.parse_args()
+
+    quantize = not args.fp32
+    min_cosine = args.min_cosine if args.min_cosine is not None else (0.98 if quantize else 0.999)
+    print(f"=== ONNX {'int8' if quantize else 'fp32'} vs torch ===")
+    passed = check_embeddings(quantize, min_cosine)
+    passed = check_qa(quantize, args.min_agreement) and passed
+    print("✅ parity OK" if passed else "❌ parity check failed")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
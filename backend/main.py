@@ -1,10 +1,19 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from app.core.config import settings
 from app.api.main import api_router
 from app.db.init_db import init_db
+from app.services.answer_cache import answer_cache
+from app.services.batching import batching_stats
+from app.services.embedding_cache import embedding_cache
+from app.db.database import SessionLocal
+from app.services.ingestion_worker import ingestion_workers
+from app.services.job_queue import job_queue
+from app.services.model_registry import model_registry
+from app.services.rag_service import rag_service
+from app.services.warmup import model_warmup
 import os
 
 app = FastAPI(
@@ -33,30 +42,6 @@ if not os.path.exists(settings.UPLOAD_DIR):
 
 app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
 
-# Serve React frontend static files
-frontend_dist_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend", "dist")
-if os.path.exists(frontend_dist_path):
-    app.mount("/static", StaticFiles(directory=frontend_dist_path), name="static")
-    
-    @app.get("/{full_path:path}")
-    async def serve_react_app(request: Request, full_path: str):
-        """Serve React app for all non-API routes"""
-        # If it's an API route, let it pass through
-        if full_path.startswith("api/") or full_path.startswith("uploads/"):
-            return {"error": "Not found"}
-        
-        # If requesting a static file that exists, serve it
-        file_path = os.path.join(frontend_dist_path, full_path)
-        if os.path.isfile(file_path):
-            return FileResponse(file_path)
-        
-        # Otherwise, serve index.html for React routing
-        index_path = os.path.join(frontend_dist_path, "index.html")
-        if os.path.exists(index_path):
-            return FileResponse(index_path)
-        
-        return {"error": "Frontend not built"}
-
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
@@ -66,6 +51,22 @@ async def startup_event():
     except Exception as e:
         print(f"⚠️ Database initialization failed: {e}")
         print("📝 Continuing without database - some features may be limited")
+    
+    if settings.WARMUP_ON_STARTUP:
+        # Runs in the background so /health answers while models load
+        model_warmup.start()
+    
+    if settings.INGESTION_WORKERS_IN_API:
+        try:
+            # Re-queues work abandoned by a previous run, then starts the workers
+            ingestion_workers.start()
+        except Exception as e:
+            print(f"⚠️ Ingestion workers not started: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the ingestion workers; their running jobs are retried after the lease expires"""
+    ingestion_workers.stop()
 
 @app.get("/")
 async def root():
@@ -80,6 +81,70 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """Cache, micro-batching, retrieval and model statistics of this worker process, plus queue depth"""
+    return {
+        "query_embedding_cache": rag_service.query_embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "batching": batching_stats(),
+        "retrieval_legs": rag_service.retrieval_stats(),
+        "models": model_registry.stats(),
+        "ingestion_jobs": ingestion_job_stats(),
+        "embedding_cache": embedding_cache_stats(),
+    }
+
+def ingestion_job_stats() -> dict:
+    """Ingestion jobs per status, shared by every process"""
+    db = SessionLocal()
+    try:
+        return job_queue.stats(db)
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        db.close()
+
+def embedding_cache_stats() -> dict:
+    """This process's embedding cache hit rate, plus the stored totals shared by every process"""
+    db = SessionLocal()
+    try:
+        return {**embedding_cache.stats(), "stored": embedding_cache.stored_stats(db)}
+    except Exception as e:
+        return {**embedding_cache.stats(), "stored": {"error": str(e)}}
+    finally:
+        db.close()
+
+@app.get("/ready")
+async def readiness_check():
+    """Ready once every model needed for chat is loaded and warmed up"""
+    status = model_warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+# Serve React frontend static files; registered last so the catch-all
+# route cannot shadow /health, /metrics, /ready or the root route
+frontend_dist_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend", "dist")
+if os.path.exists(frontend_dist_path):
+    app.mount("/static", StaticFiles(directory=frontend_dist_path), name="static")
+    
+    @app.get("/{full_path:path}")
+    async def serve_react_app(request: Request, full_path: str):
+        """Serve React app for all non-API routes"""
+        # If it's an API route, let it pass through
+        if full_path.startswith("api/") or full_path.startswith("uploads/"):
+            return {"error": "Not found"}
+        
+        # If requesting a static file that exists, serve it
+        file_path = os.path.join(frontend_dist_path, full_path)
+        if os.path.isfile(file_path):
+            return FileResponse(file_path)
+        
+        # Otherwise, serve index.html for React routing
+        index_path = os.path.join(frontend_dist_path, "index.html")
+        if os.path.exists(index_path):
+            return FileResponse(index_path)
+        
+        return {"error": "Frontend not built"}
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
@@ -0,0 +1,102 @@
+"""Shared fixtures: a throwaway SQLite database and offline stand-ins for the models.
+
+Settings are read when ``app.core.config`` is first imported, so the
+environment is pointed at temporary locations before anything from ``app``
+is loaded.
+"""
+import hashlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+_data_dir = tempfile.mkdtemp(prefix="knowledgeforge-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_data_dir, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_data_dir, "uploads")
+os.environ["VECTOR_DATA_DIR"] = os.path.join(_data_dir, "vector_data")
+os.environ["KEYWORD_SEARCH_BACKEND"] = "bm25"
+os.environ["INGEST_EMBEDDING_WORKERS"] = "1"
+os.environ["PDF_EXTRACTION_WORKERS"] = "1"
+os.environ["WARMUP_ON_STARTUP"] = "False"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings  # noqa: E402
+from app.db.database import SessionLocal, engine  # noqa: E402
+from app.db.migrations import run_migrations  # noqa: E402
+from app.models.models import Base, Document, User  # noqa: E402
+
+
+def fake_embeddings(texts):
+    """Deterministic unit vectors derived from each text's hash"""
+    rows = []
+    for content in texts:
+        seed = int.from_bytes(hashlib.sha256(content.encode("utf-8")).digest()[:8], "little")
+        rows.append(np.random.default_rng(seed).normal(size=settings.VECTOR_DIMENSION))
+    rows = np.asarray(rows, dtype=np.float32).reshape(len(texts), settings.VECTOR_DIMENSION)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def fake_encode():
+    return fake_embeddings
+
+
+@pytest.fixture(autouse=True)
+def offline_models(monkeypatch):
+    """Chunk with the approximate tokenizer and embed with ``fake_embeddings``; no model is loaded"""
+    from app.services import chunker
+    from app.services.embedding_pool import embedding_pool
+    from app.services.model_registry import model_registry
+
+    monkeypatch.setattr(model_registry, "try_get", lambda name: None)
+    monkeypatch.setattr(chunker, "embedding_max_seq_length", lambda: None)
+    monkeypatch.setattr(embedding_pool, "encode", fake_embeddings)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A session on an empty schema; process-wide indexes start empty too"""
+    from app.services.embedding_cache import embedding_cache
+    from app.services.keyword_index import keyword_index
+    from app.services.vector_index import vector_index
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    keyword_index.invalidate()
+    monkeypatch.setattr(vector_index, "data_dir", str(tmp_path / "vector_data"))
+    monkeypatch.setattr(vector_index, "_shards", {})
+    monkeypatch.setattr(vector_index, "_ann", {})
+    monkeypatch.setattr(vector_index, "_codes", {})
+    embedding_cache.memory.clear()
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    user = User(email="reader@example.com", hashed_password="not-a-hash", full_name="Test Reader")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def make_document(db, user, tmp_path):
+    """Write a text file and add a document for it, still "processing" """
+    def make(content: str, name: str = "notes.txt") -> Document:
+        path = tmp_path / name
+        path.write_text(content, encoding="utf-8")
+        document = Document(user_id=user.id, title=name, filename=name, file_path=str(path),
+                            file_type="txt", file_size=path.stat().st_size, status="processing")
+        db.add(document)
+        db.commit()
+        return document
+    return make
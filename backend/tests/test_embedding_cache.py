@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+from app.services import embedding_cache as embedding_cache_module
+from app.services.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock that advances one second per reading, so recency is never tied"""
+    now = SimpleNamespace(value=1000.0)
+
+    def tick():
+        now.value += 1
+        return now.value
+    monkeypatch.setattr(embedding_cache_module, "time", SimpleNamespace(time=tick))
+    return now
+
+
+@pytest.fixture
+def encoded(fake_encode):
+    """Texts sent to the model, and an ``encode`` that records them"""
+    texts = []
+
+    def encode(batch):
+        texts.extend(batch)
+        return fake_encode(batch)
+    return texts, encode
+
+
+def stored_texts(db, cache, texts):
+    keys = {cache.key(content): content for content in texts}
+    rows = db.execute(text("SELECT cache_key FROM embedding_cache")).scalars().all()
+    return {keys[key] for key in rows if key in keys}
+
+
+def test_only_misses_reach_the_model(db, encoded, fake_encode):
+    texts, encode = encoded
+    cache = EmbeddingCache(max_rows=100, memory_bytes=1024 * 1024)
+
+    first = cache.embed(["alpha", "beta", "alpha"], encode)
+    assert texts == ["alpha", "beta"]
+    np.testing.assert_array_equal(first, fake_encode(["alpha", "beta", "alpha"]))
+
+    # Whitespace differences share an entry; a fresh process finds it in the table
+    other_process = EmbeddingCache(max_rows=100, memory_bytes=1024 * 1024)
+    second = other_process.embed(["  alpha\n", "gamma", "beta"], encode)
+    assert texts == ["alpha", "beta", "gamma"]
+    np.testing.assert_array_equal(second, fake_encode(["alpha", "gamma", "beta"]))
+    assert other_process.stats()["stored_hits"] == 2 and other_process.stats()["misses"] == 1
+
+
+def test_disabled_cache_always_encodes(db, encoded):
+    texts, encode = encoded
+    cache = EmbeddingCache(max_rows=100, memory_bytes=1024 * 1024, enabled=False)
+
+    cache.embed(["alpha"], encode)
+    cache.embed(["alpha"], encode)
+
+    assert texts == ["alpha", "alpha"]
+    assert cache.stored_stats(db)["entries"] == 0
+
+
+def test_least_recently_used_rows_are_evicted(db, clock, encoded):
+    _, encode = encoded
+    cache = EmbeddingCache(max_rows=10, memory_bytes=0)
+    old = [f"old {i}" for i in range(10)]
+    cache.embed(old, encode)
+    # Reading marks rows as used
+    cache.embed(old[:3], encode)
+
+    new = [f"new {i}" for i in range(4)]
+    cache.embed(new, encode)
+
+    assert cache.stored_stats(db) == {"entries": 10 - cache.eviction_slack, "max_entries": 10}
+    assert stored_texts(db, cache, old + new) == set(old[:3]) | set(old[8:]) | set(new)
+
+
+def test_table_size_is_checked_once_per_slack(db, clock, encoded, monkeypatch):
+    _, encode = encoded
+    cache = EmbeddingCache(max_rows=100, memory_bytes=0)
+    checks = []
+    row_count = cache._row_count
+    monkeypatch.setattr(cache, "_row_count", lambda session: checks.append(1) or row_count(session))
+
+    cache.embed(["first"], encode)
+    assert len(checks) == 1
+    cache.embed([f"text {i}" for i in range(9)], encode)
+    cache.embed(["text 0", "text 1"], encode)
+    assert len(checks) == 1
+    cache.embed(["text 9"], encode)
+    assert len(checks) == 2
@@ -0,0 +1,187 @@
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.models.models import ChunkEmbedding, Citation, Conversation, Document, DocumentChunk, Message
+from app.services.embedding_pool import embedding_pool
+from app.services.ingestion_service import IngestionError, ingestion_service
+from app.services.keyword_index import keyword_index
+from app.utils.embeddings import decode_embedding
+from app.utils.hashing import text_hash
+
+
+def sentences(count, changed=None):
+    """Two sentences per 32-token chunk; ``changed`` replaces one sentence's topic"""
+    return " ".join(
+        f"Sentence number {i} describes topic {'99' if i == changed else i} in detail." for i in range(count)
+    )
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_CHUNK_TOKENS", 32)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP_TOKENS", 0)
+
+
+@pytest.fixture
+def encoded(monkeypatch, fake_encode):
+    """Texts sent to the embedding model"""
+    texts = []
+
+    def encode(batch):
+        texts.extend(batch)
+        return fake_encode(batch)
+    monkeypatch.setattr(embedding_pool, "encode", encode)
+    return texts
+
+
+def chunks_of(db, document_id):
+    """``chunk_index -> (id, content)`` of the document's live chunks"""
+    rows = db.execute(text("""
+        SELECT id, chunk_index, content FROM document_chunks
+        WHERE document_id = :document_id AND chunk_index >= 0
+    """), {'document_id': document_id}).fetchall()
+    return {row.chunk_index: (row.id, row.content) for row in rows}
+
+
+def stored_embedding(db, chunk_id):
+    row = db.query(ChunkEmbedding).filter(ChunkEmbedding.chunk_id == chunk_id).first()
+    return None if row is None else decode_embedding(row.embedding_vector)
+
+
+def reprocess(db, document, content):
+    with open(document.file_path, "w", encoding="utf-8") as file:
+        file.write(content)
+    document.status = "processing"
+    db.commit()
+    ingestion_service.ingest_document(db, document.id)
+
+
+def cite(db, user, document, chunk_id):
+    conversation = Conversation(user_id=user.id, title="Questions")
+    db.add(conversation)
+    db.flush()
+    message = Message(conversation_id=conversation.id, role="assistant", content="Answer")
+    db.add(message)
+    db.flush()
+    db.add(Citation(message_id=message.id, document_id=document.id, chunk_id=chunk_id, relevance_score=0.5))
+    db.commit()
+
+
+def test_insert_chunks_maps_ids_back_to_input_order(db, make_document, fake_encode):
+    document = make_document("unused")
+    contents = [f"chunk {i}" for i in range(7)]
+    embeddings = fake_encode(contents)
+    chunks = [
+        {'content': contents[i], 'chunk_index': i, 'metadata': f'{{"n": {i}}}', 'embedding': embeddings[i]}
+        for i in (4, 0, 6, 2, 1, 5, 3)
+    ]
+
+    chunk_ids = ingestion_service.insert_chunks(db, document.id, chunks)
+    db.commit()
+
+    assert len(set(chunk_ids)) == len(chunks)
+    for chunk_id, chunk_data in zip(chunk_ids, chunks):
+        row = db.get(DocumentChunk, chunk_id)
+        assert (row.chunk_index, row.content) == (chunk_data['chunk_index'], chunk_data['content'])
+        assert row.content_hash == text_hash(chunk_data['content'])
+        np.testing.assert_array_equal(stored_embedding(db, chunk_id), chunk_data['embedding'])
+    assert ingestion_service.insert_chunks(db, document.id, []) == []
+
+
+def test_document_is_written_in_batches(db, user, make_document, monkeypatch, encoded, fake_encode):
+    monkeypatch.setattr(settings, "INGEST_CHUNK_BATCH_SIZE", 4)
+    document = make_document(sentences(30))
+
+    assert ingestion_service.ingest_document(db, document.id)
+
+    chunks = chunks_of(db, document.id)
+    assert sorted(chunks) == list(range(15))
+    for chunk_id, content in chunks.values():
+        np.testing.assert_allclose(stored_embedding(db, chunk_id), fake_encode([content])[0], rtol=1e-6)
+    assert len(encoded) == 15
+    db.refresh(document)
+    assert document.status == "completed"
+    assert document.corpus_version == user.corpus_version == 1
+    assert [chunk_id for chunk_id, _ in keyword_index.search(db, user.id, "topic 13")][:1] == [chunks[6][0]]
+
+
+def test_reprocessing_rewrites_only_changed_chunks(db, make_document, encoded):
+    document = make_document(sentences(30))
+    ingestion_service.ingest_document(db, document.id)
+    before = chunks_of(db, document.id)
+    encoded.clear()
+
+    reprocess(db, document, sentences(30, changed=5))
+
+    after = chunks_of(db, document.id)
+    assert sorted(after) == sorted(before)
+    assert {i: after[i][0] for i in after if i != 2} == {i: before[i][0] for i in before if i != 2}
+    assert after[2][0] != before[2][0] and "topic 99" in after[2][1]
+    assert encoded == [after[2][1]]
+    assert db.get(DocumentChunk, before[2][0]) is None
+
+
+def test_cited_chunks_are_retired_not_deleted(db, user, make_document):
+    document = make_document(sentences(30))
+    ingestion_service.ingest_document(db, document.id)
+    before = chunks_of(db, document.id)
+    replaced_id, replaced_content = before[2]
+    cite(db, user, document, replaced_id)
+    cite(db, user, document, before[3][0])
+
+    reprocess(db, document, sentences(30, changed=5))
+
+    db.expire_all()
+    retired = db.get(DocumentChunk, replaced_id)
+    assert retired.chunk_index == -replaced_id
+    assert retired.content == replaced_content and retired.content_hash is None
+    assert stored_embedding(db, replaced_id) is None
+    assert chunks_of(db, document.id)[3][0] == before[3][0]
+    found = [chunk_id for chunk_id, _ in keyword_index.search(db, user.id, "topic 99 topic 4")]
+    assert replaced_id not in found and chunks_of(db, document.id)[2][0] in found
+
+    # A later version never reuses a retired chunk, even for identical text
+    reprocess(db, document, sentences(30))
+    assert chunks_of(db, document.id)[2][0] not in (replaced_id, before[2][0])
+    assert db.get(DocumentChunk, replaced_id).chunk_index == -replaced_id
+
+
+def test_shortened_document_loses_its_stale_chunks(db, make_document):
+    document = make_document(sentences(30))
+    ingestion_service.ingest_document(db, document.id)
+    before = chunks_of(db, document.id)
+
+    reprocess(db, document, sentences(26))
+
+    assert chunks_of(db, document.id) == {i: before[i] for i in range(13)}
+    assert db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).count() == 13
+    for i in (13, 14):
+        assert stored_embedding(db, before[i][0]) is None
+
+
+def test_retry_reuses_the_batches_already_written(db, make_document, monkeypatch, encoded, fake_encode):
+    monkeypatch.setattr(settings, "INGEST_CHUNK_BATCH_SIZE", 5)
+    document = make_document(sentences(30))
+
+    def fail_on_second_batch(batch):
+        if encoded:
+            raise RuntimeError("out of memory")
+        encoded.extend(batch)
+        return fake_encode(batch)
+    monkeypatch.setattr(embedding_pool, "encode", fail_on_second_batch)
+
+    with pytest.raises(IngestionError):
+        ingestion_service.ingest_document(db, document.id)
+    db.rollback()
+    assert sorted(chunks_of(db, document.id)) == list(range(5))
+    assert db.get(Document, document.id).status == "processing"
+
+    encoded.clear()
+    monkeypatch.setattr(embedding_pool, "encode", lambda batch: encoded.extend(batch) or fake_encode(batch))
+    ingestion_service.ingest_document(db, document.id)
+
+    chunks = chunks_of(db, document.id)
+    assert sorted(chunks) == list(range(15))
+    assert sorted(encoded) == sorted(chunks[i][1] for i in range(5, 15))
@@ -0,0 +1,188 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+from sqlalchemy import text
+
+from app.models.models import IngestionJob
+from app.services.job_queue import JobQueue
+
+WORKER = f"{socket.gethostname()}:{os.getpid()}:worker-1"
+OTHER_WORKER = "elsewhere:1:worker-1"
+
+
+@pytest.fixture
+def queue():
+    return JobQueue(visibility_timeout=60, max_attempts=3, retry_base=10, retry_max=25)
+
+
+@pytest.fixture
+def document(make_document):
+    return make_document("Queued for ingestion.")
+
+
+def job_row(db, job_id):
+    db.expire_all()
+    return db.get(IngestionJob, job_id)
+
+
+def expire(db, job_id, **values):
+    """Move a job's lease or due time into the past"""
+    values = {"available_at": time.time() - 1, "locked_until": time.time() - 1, **values}
+    db.execute(text("UPDATE ingestion_jobs SET available_at = :available_at, locked_until = :locked_until "
+                    "WHERE id = :id"), {**values, "id": job_id})
+    db.commit()
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_claim_takes_each_due_job_once(db, queue, document):
+    job = queue.enqueue(db, document.id)
+    queue.enqueue(db, document.id, delay=60)
+    db.commit()
+
+    claimed = queue.claim(db, WORKER)
+
+    assert claimed == (job.id, document.id, 1)
+    assert queue.claim(db, OTHER_WORKER) is None
+    row = job_row(db, job.id)
+    assert row.status == "running" and row.locked_by == WORKER
+    assert row.locked_until > time.time()
+
+
+def test_one_running_job_per_document(db, queue, document, make_document):
+    first = queue.enqueue(db, document.id)
+    second = queue.enqueue(db, document.id)
+    other = queue.enqueue(db, make_document("Another file.", "other.txt").id)
+    db.commit()
+
+    assert queue.claim(db, WORKER).id == first.id
+    assert queue.claim(db, OTHER_WORKER).id == other.id
+    assert queue.claim(db, OTHER_WORKER) is None
+
+    queue.complete(db, first.id, WORKER)
+    assert queue.claim(db, OTHER_WORKER).id == second.id
+
+
+def test_only_the_lease_holder_extends_or_completes(db, queue, document):
+    job = queue.enqueue(db, document.id)
+    db.commit()
+    queue.claim(db, WORKER)
+    expire(db, job.id)
+
+    assert not queue.extend_lease(db, job.id, OTHER_WORKER)
+    assert queue.extend_lease(db, job.id, WORKER)
+    assert job_row(db, job.id).locked_until > time.time() + 50
+
+    queue.complete(db, job.id, OTHER_WORKER)
+    assert job_row(db, job.id).status == "running"
+    queue.complete(db, job.id, WORKER)
+    assert job_row(db, job.id).status == "succeeded"
+
+
+def test_expired_lease_is_claimed_by_another_worker(db, queue, document):
+    job = queue.enqueue(db, document.id)
+    db.commit()
+    queue.claim(db, WORKER)
+    assert queue.claim(db, OTHER_WORKER) is None
+
+    expire(db, job.id)
+    reclaimed = queue.claim(db, OTHER_WORKER)
+
+    assert reclaimed == (job.id, document.id, 2)
+    # The first worker lost the job and cannot settle it any more
+    assert not queue.extend_lease(db, job.id, WORKER)
+    queue.complete(db, job.id, WORKER)
+    assert job_row(db, job.id).locked_by == OTHER_WORKER
+
+
+def test_retry_delay_doubles_up_to_the_maximum(queue):
+    assert [queue.retry_delay(attempts) for attempts in (1, 2, 3, 4)] == [10, 20, 25, 25]
+
+
+def test_failed_attempt_is_retried_after_backoff(db, queue, document):
+    job = queue.enqueue(db, document.id)
+    db.commit()
+    claimed = queue.claim(db, WORKER)
+
+    before = time.time()
+    queue.fail(db, claimed, WORKER, "embedding model timed out")
+
+    row = job_row(db, job.id)
+    assert row.status == "queued" and row.locked_by is None
+    assert row.last_error == "embedding model timed out"
+    assert row.available_at >= before + 10
+    assert queue.claim(db, WORKER) is None
+
+    expire(db, job.id, locked_until=None)
+    assert queue.claim(db, WORKER) == (job.id, document.id, 2)
+
+
+def test_gives_up_after_the_last_attempt(db, queue, document):
+    job = queue.enqueue(db, document.id)
+    db.commit()
+    for attempt in range(1, 4):
+        claimed = queue.claim(db, WORKER)
+        assert claimed.attempts == attempt
+        queue.fail(db, claimed, WORKER, f"failure {attempt}")
+        expire(db, job.id, locked_until=None)
+
+    assert queue.claim(db, WORKER) is None
+    row = job_row(db, job.id)
+    assert row.status == "failed" and row.last_error == "failure 3"
+    db.refresh(document)
+    assert document.status == "failed"
+
+
+def test_abandoned_last_attempt_is_failed(db, queue, document):
+    job = queue.enqueue(db, document.id)
+    db.commit()
+    queue.claim(db, WORKER)
+    db.execute(text("UPDATE ingestion_jobs SET attempts = 3 WHERE id = :id"), {"id": job.id})
+    db.commit()
+
+    assert queue.fail_exhausted(db) == 0
+    expire(db, job.id)
+    assert queue.claim(db, OTHER_WORKER) is None
+    assert queue.fail_exhausted(db) == 1
+
+    assert job_row(db, job.id).status == "failed"
+    db.refresh(document)
+    assert document.status == "failed"
+
+
+def test_recover_releases_jobs_of_dead_workers_on_this_host(db, queue, document, make_document):
+    host = socket.gethostname()
+    held = {
+        "dead_thread": f"{host}:{dead_pid()}:worker-2",
+        "dead_process": f"{host}:{dead_pid()}",
+        "alive": WORKER,
+        "other_host": f"not-{host}:{dead_pid()}",
+    }
+    jobs = {}
+    for name, locked_by in held.items():
+        job = queue.enqueue(db, make_document(name, f"{name}.txt").id)
+        db.flush()
+        jobs[name] = job.id
+        db.execute(text("""
+            UPDATE ingestion_jobs SET status = 'running', attempts = 1, locked_by = :locked_by,
+            locked_until = :until WHERE id = :id
+        """), {"locked_by": locked_by, "until": time.time() + 60, "id": job.id})
+    db.commit()
+
+    # ``document`` is still processing but has no job at all
+    assert queue.recover(db) == 3
+
+    statuses = {name: job_row(db, job_id).status for name, job_id in jobs.items()}
+    assert statuses == {"dead_thread": "queued", "dead_process": "queued",
+                        "alive": "running", "other_host": "running"}
+    orphan_jobs = db.query(IngestionJob).filter(IngestionJob.document_id == document.id).all()
+    assert [job.status for job in orphan_jobs] == ["queued"]
+    assert queue.recover(db) == 0
@@ -0,0 +1,148 @@
+import math
+
+import pytest
+from sqlalchemy import text
+
+from app.services.corpus_version import bump_corpus_version, get_corpus_version
+from app.services.ingestion_service import ingestion_service
+from app.services.keyword_index import KeywordIndex, _UserKeywordIndex, keyword_index, tokenize
+
+K1, B = 1.2, 0.75
+
+
+def bm25(tf, length, average_length, document_frequency, chunk_count):
+    idf = math.log(1 + (chunk_count - document_frequency + 0.5) / (document_frequency + 0.5))
+    return idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length))
+
+
+def build(documents):
+    index = _UserKeywordIndex()
+    for document_id, chunks in documents.items():
+        index.add_document(document_id, chunks)
+    return index
+
+
+def test_tokenize_drops_stopwords_and_single_characters():
+    assert tokenize("The Apple, a B-tree and 42 pears!") == ["apple", "tree", "42", "pears"]
+
+
+def test_bm25_scores_match_the_formula():
+    index = build({1: [(10, "apple banana"), (11, "apple cherry cherry")], 2: [(20, "durian")]})
+    average_length = (2 + 3 + 1) / 3
+
+    results = dict(index.search("cherry apple", 10, K1, B))
+
+    apple = bm25(1, 2, average_length, 2, 3)
+    assert results[10] == pytest.approx(apple, rel=1e-5)
+    assert results[11] == pytest.approx(bm25(1, 3, average_length, 2, 3) + bm25(2, 3, average_length, 1, 3), rel=1e-5)
+    assert 20 not in results
+
+
+def test_rarer_terms_and_shorter_chunks_rank_higher():
+    index = build({1: [(1, "common rare"), (2, "common"), (3, "common filler words here padding")]})
+
+    ranked = [chunk_id for chunk_id, _ in index.search("common rare", 10, K1, B)]
+
+    assert ranked == [1, 2, 3]
+    assert index.search("missing", 10, K1, B) == []
+    assert _UserKeywordIndex().search("common", 10, K1, B) == []
+
+
+def test_incremental_changes_match_a_fresh_build():
+    documents = {
+        1: [(1, "solar panels convert sunlight"), (2, "wind turbines convert wind")],
+        2: [(3, "solar farms and wind farms"), (4, "batteries store energy")],
+        3: [(5, "sunlight energy storage"), (6, "grid batteries")],
+    }
+    incremental = build(documents)
+    incremental.remove_document(2)
+    incremental.add_document(4, [(7, "solar batteries")], shared=True)
+    incremental.remove_document(1)
+    incremental.add_document(1, documents[1], shared=True)
+
+    fresh = build({1: documents[1], 3: documents[3], 4: [(7, "solar batteries")]})
+
+    assert incremental.chunk_count == fresh.chunk_count
+    assert incremental.total_length == fresh.total_length
+    assert set(incremental.postings) == set(fresh.postings)
+    for query in ["solar", "wind energy", "batteries sunlight", "farms"]:
+        expected = fresh.search(query, 10, K1, B)
+        actual = incremental.search(query, 10, K1, B)
+        assert [chunk_id for chunk_id, _ in actual] == [chunk_id for chunk_id, _ in expected]
+        assert [score for _, score in actual] == pytest.approx([score for _, score in expected])
+
+
+def test_published_snapshots_are_never_modified():
+    index = KeywordIndex()
+    index._install(7, build({1: [(1, "apple pie"), (2, "apple tart")]}))
+    snapshot = index._users[7]
+    before = snapshot.search("apple", 10, K1, B)
+
+    index.add_document(7, 2, [(3, "apple crumble"), (4, "apple apple")])
+    index.remove_document(7, 1)
+
+    assert snapshot.search("apple", 10, K1, B) == before
+    assert snapshot.documents.keys() == {1}
+    assert [chunk_id for chunk_id, _ in index._users[7].search("apple", 10, K1, B)] == [4, 3]
+
+
+def test_advance_version_accepts_only_the_next_version():
+    index = KeywordIndex()
+    index._install(7, build({}))
+
+    index.advance_version(7, 2)
+    assert not index.is_current(7, 2)
+    index.advance_version(7, 1)
+    assert index.is_current(7, 1)
+
+
+def _searchable_chunk_ids(db, user_id):
+    return db.execute(text("""
+        SELECT dc.id FROM document_chunks dc JOIN documents d ON d.id = dc.document_id
+        WHERE d.user_id = :user_id AND d.status = 'completed' AND dc.chunk_index >= 0
+    """), {'user_id': user_id}).scalars().all()
+
+
+def test_catch_up_loads_only_changed_documents(db, user, make_document, monkeypatch):
+    contents = ["alpha reactors hum", "beta reactors glow", "gamma rays scatter",
+                "delta rivers flood", "epsilon reactors cool"]
+    ids = [make_document(content, f"doc{i}.txt").id for i, content in enumerate(contents)]
+    for document_id in ids[:4]:
+        ingestion_service.ingest_document(db, document_id)
+    snapshot = keyword_index._load_user(db, user.id)
+
+    # Changes made by another process: one document published, one deleted
+    ingestion_service.ingest_document(db, ids[4])
+    ingestion_service._delete_chunks(db, ids[1])
+    db.execute(text("DELETE FROM documents WHERE id = :id"), {'id': ids[1]})
+    bump_corpus_version(db, user.id)
+    db.commit()
+
+    loaded = []
+    group_by_document = KeywordIndex._group_by_document
+
+    def group(rows):
+        for document_id, chunks in group_by_document(rows):
+            loaded.append(document_id)
+            yield document_id, chunks
+    with monkeypatch.context() as patch:
+        patch.setattr(keyword_index, "_load_user", lambda *args: pytest.fail("reloaded everything"))
+        patch.setattr(KeywordIndex, "_group_by_document", staticmethod(group))
+        updated = keyword_index._load_changes(db, user.id, snapshot)
+
+    assert loaded == [ids[4]]
+    assert updated.version == get_corpus_version(db, user.id)
+    assert set(updated.documents) == {ids[0], ids[2], ids[3], ids[4]}
+    assert set(snapshot.documents) == set(ids[:4])
+    fresh = keyword_index._load_user(db, user.id)
+    assert updated.search("reactors", 10, K1, B) == pytest.approx(fresh.search("reactors", 10, K1, B))
+
+
+def test_search_serves_published_documents(db, user, make_document):
+    document = make_document("Photosynthesis turns sunlight into chemical energy.")
+    ingestion_service.ingest_document(db, document.id)
+
+    results = keyword_index.search(db, user.id, "photosynthesis")
+
+    assert [chunk_id for chunk_id, _ in results] == _searchable_chunk_ids(db, user.id)
+    assert keyword_index.is_current(user.id, get_corpus_version(db, user.id))